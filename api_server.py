@@ -1,17 +1,32 @@
 import os
 import json
-import subprocess
+import time
 import logging
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+import uuid
+import base64
+import mimetypes
+from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 from dotenv import load_dotenv
+from shared_state import SharedState, make_cache_key
+from svg_optimizer import ENCODINGS, choose_encoding, precompress
+from diagram_backend import BackendUnavailableError, ToolError, create_backend
+from render_limits import RenderLimitError
 
 # Get deployment mode from environment
 DEPLOYMENT_MODE = os.environ.get("DEPLOYMENT_MODE", "development")
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO" if DEPLOYMENT_MODE == "production" else "DEBUG")
+ENABLE_CACHING = os.environ.get("ENABLE_CACHING", "false").lower() == "true"
+CACHE_EXPIRY_SECONDS = int(os.environ.get("CACHE_EXPIRY_SECONDS", 3600))
+ENABLE_REQUEST_LOGGING = os.environ.get("ENABLE_REQUEST_LOGGING", "true").lower() == "true"
+# Worker processes: one in development, one per core in production unless overridden
+API_WORKERS = int(os.environ.get("API_WORKERS") or ((os.cpu_count() or 1) if DEPLOYMENT_MODE == "production" else 1))
+# Seconds to let in-flight requests finish after SIGTERM before workers are stopped
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.environ.get("GRACEFUL_SHUTDOWN_TIMEOUT", 30))
 
 # Configure logging
 logging_level = getattr(logging, LOG_LEVEL)
@@ -30,6 +45,24 @@ app = FastAPI(
     version="1.0.0"
 )
 
+DIAGRAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diagrams")
+os.makedirs(DIAGRAMS_DIR, exist_ok=True)
+
+# File extensions of saved artifacts, where they differ from the format name
+ARTIFACT_EXTENSIONS = {"json-layout": "layout.json", "geometry": "geometry.json"}
+# Text artifacts get precompressed copies for Content-Encoding negotiation
+TEXT_FORMATS = {"svg", "dot", "json-layout", "geometry"}
+mimetypes.add_type("text/vnd.graphviz", ".dot")
+mimetypes.add_type("image/webp", ".webp")
+# HTTP status of a failed tool by its error code; other failures are 500
+TOOL_ERROR_STATUS_CODES = {RenderLimitError.code: 422}
+
+# Cache, catalog and job records live in SQLite so every worker process sees them
+shared_state = SharedState()
+
+# Where the diagram tools run, chosen by DIAGRAM_BACKEND; one per worker process
+backend = create_backend(workers=API_WORKERS)
+
 # Add CORS middleware to allow the web client to connect
 app.add_middleware(
     CORSMiddleware,
@@ -39,98 +72,272 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    if not ENABLE_REQUEST_LOGGING:
+        return await call_next(request)
+    start_time = time.time()
+    logger.info(f"Request started: {request.method} {request.url.path}")
+    response = await call_next(request)
+    process_time = time.time() - start_time
+    logger.info(f"Request completed: {request.method} {request.url.path} - Status: {response.status_code} - Time: {process_time:.3f}s")
+    return response
+
+class UpdateDiagramRequest(BaseModel):
+    previous_diagram_id: str
+    architecture_json: dict
+    output_format: Union[str, List[str]] = "png"
+    layout_direction: str = "TB"
+    layout_timeout: Optional[float] = None
+    raster_options: Optional[dict] = None
+
+class EditDiagramRequest(BaseModel):
+    previous_diagram_id: str
+    change_description: str
+    output_format: Union[str, List[str]] = "png"
+    layout_direction: str = "TB"
+    layout_timeout: Optional[float] = None
+    raster_options: Optional[dict] = None
+
 class DiagramRequest(BaseModel):
     architecture_description: str
-    output_format: str = "png"
+    output_format: Union[str, List[str]] = "png"
     layout_direction: str = "TB"
+    layout_engine: str = "auto"
+    layout_timeout: Optional[float] = None
+    raster_options: Optional[dict] = None
 
 @app.get("/")
 async def root():
     """Root endpoint to verify the API server is running."""
-    return {"status": "API server is running", "endpoints": ["/generate-diagram"]}
+    return {
+        "status": "API server is running",
+        "endpoints": ["/generate-diagram", "/update-diagram", "/edit-diagram", "/jobs/{job_id}", "/diagrams",
+                      "/diagrams/{filename}", "/health"],
+        "mode": DEPLOYMENT_MODE,
+        "backend": backend.name
+    }
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint for container orchestration systems."""
+    return {"status": "healthy", "mode": DEPLOYMENT_MODE, "backend": backend.status()}
+
+def save_diagram(image_data: Union[str, bytes], image_format: str, stem: Optional[str] = None) -> str:
+    """Write a diagram (base64 or raw bytes) into the diagrams directory and record it in the shared catalog."""
+    image_bytes = image_data if isinstance(image_data, bytes) else base64.b64decode(image_data)
+    extension = ARTIFACT_EXTENSIONS.get(image_format, image_format)
+    filename = f"{stem or 'diagram_' + uuid.uuid4().hex}.{extension}"
+    filepath = os.path.join(DIAGRAMS_DIR, filename)
+    # Write to a temporary name first so other workers never serve a partial file
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(image_bytes)
+    os.replace(tmp_path, filepath)
+    if image_format in TEXT_FORMATS:
+        precompress(filepath)
+    shared_state.add_diagram(filename, image_format, len(image_bytes))
+    return filename
+
+def save_artifacts(artifacts: dict) -> dict:
+    """Save every format of one render under a shared name; returns {format: filename}."""
+    stem = f"diagram_{uuid.uuid4().hex}"
+    return {image_format: save_diagram(image_data, image_format, stem) for image_format, image_data in artifacts.items()}
 
+def save_result(result: dict) -> dict:
+    """Save and catalog every artifact of a tool result, listing their filenames in it; returns {format: filename}."""
+    filenames = save_artifacts(result.get("artifacts") or {result["image_format"]: result["image_data"]})
+    result["filenames"] = filenames
+    return filenames
+
+def encode_artifacts(result: dict) -> dict:
+    """Base64 encode the artifacts that came through the artifact spool as raw bytes, for the JSON response."""
+    artifacts = result.get("artifacts")
+    if artifacts:
+        result["artifacts"] = {
+            image_format: base64.b64encode(data).decode("utf-8") if isinstance(data, bytes) else data
+            for image_format, data in artifacts.items()
+        }
+        result["image_data"] = result["artifacts"][result["image_format"]]
+    return result
+
+def load_cached_diagram(cache_key: str) -> Optional[dict]:
+    """Return the response payload of a cached render with all of its artifacts, or None."""
+    entry = shared_state.cache_get(cache_key, max_age=CACHE_EXPIRY_SECONDS)
+    if entry is None:
+        return None
+    artifacts = {}
+    for image_format, filename in entry["artifacts"].items():
+        filepath = os.path.join(DIAGRAMS_DIR, filename)
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, "rb") as f:
+            artifacts[image_format] = base64.b64encode(f.read()).decode("utf-8")
+    payload = {
+        "image_data": artifacts[entry["image_format"]],
+        "image_format": entry["image_format"],
+        "artifacts": artifacts,
+        "filenames": entry["artifacts"],
+        "diagram_id": entry["diagram_id"]
+    }
+    if "geometry" in artifacts:
+        payload["geometry"] = json.loads(base64.b64decode(artifacts["geometry"]))
+    return payload
+
+# Declared without async so FastAPI runs it in the threadpool; the blocking
+# tool calls below would otherwise stall every other request in this worker.
 @app.post("/generate-diagram")
-async def generate_diagram(request: DiagramRequest):
+def generate_diagram(request: DiagramRequest):
     """API endpoint to generate a diagram from a natural language description."""
     logger.info(f"Received request with output_format={request.output_format}, layout_direction={request.layout_direction}")
     # Validate the input
     if not request.architecture_description.strip():
         logger.error("Empty architecture description received")
         raise HTTPException(status_code=400, detail="Architecture description cannot be empty")
-    # Path to the MCP server script
-    mcp_server_path = os.path.join(os.path.dirname(__file__), "azure_diagram_server_fixed.py")
-    fallback_server_path = os.path.join(os.path.dirname(__file__), "fallback_mcp_server_fixed.py")
-    logger.info(f"MCP server path: {mcp_server_path}")
-    # Create an MCP request
-    mcp_request = {
-        "method": "call_tool",
-        "params": {
-            "name": "generate_azure_diagram_from_text",
-            "arguments": {
-                "architecture_description": request.architecture_description,
-                "output_format": request.output_format,
-                "layout_direction": request.layout_direction
-            }        }
-    }
-    
+    cache_key = make_cache_key(
+        architecture_description=request.architecture_description.strip(),
+        output_format=request.output_format,
+        layout_direction=request.layout_direction,
+        layout_engine=request.layout_engine,
+        raster_options=request.raster_options
+    )
+    if ENABLE_CACHING:
+        cached = load_cached_diagram(cache_key)
+        if cached is not None:
+            logger.info("Serving diagram from shared cache")
+            cached["cached"] = True
+            return cached
+    sweep_state()
+    job_id = uuid.uuid4().hex
+    shared_state.start_job(job_id)
+    # Every way out of the job records a terminal state, so /jobs never reports a failed job as running
     try:
-        # First try the main MCP server
-        logger.info("Starting MCP server process")
-        process = subprocess.Popen(
-            ["python", mcp_server_path],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        # Send the request to the MCP server
-        stdin_data = json.dumps(mcp_request) + "\n"
-        logger.info("Sending request to MCP server")
-        stdout_data, stderr_data = process.communicate(stdin_data)
-        if process.returncode != 0 or "error" in stderr_data:
-            logger.warning(f"Main MCP server failed with error: {stderr_data}")
-            logger.info("Falling back to simplified MCP server")
-            # Try with the fallback server
-            fallback_process = subprocess.Popen(
-                ["python", fallback_server_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            fallback_stdout, fallback_stderr = fallback_process.communicate(stdin_data)
-            if fallback_process.returncode != 0:
-                logger.error(f"Fallback MCP server error: {fallback_stderr}")
-                raise HTTPException(status_code=500, detail=f"Both MCP servers failed. Error: {fallback_stderr}")
-            stdout_data = fallback_stdout
-        # Parse the response
-        logger.info("Parsing MCP server response")
-        try:
-            mcp_response = json.loads(stdout_data)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse MCP server response: {stdout_data}")
-            raise HTTPException(status_code=500, detail=f"Failed to parse MCP server response: {stdout_data[:200]}...")
-        if "error" in mcp_response:
-            logger.error(f"MCP error: {mcp_response['error']}")
-            raise HTTPException(status_code=500, detail=f"MCP error: {mcp_response['error']}")
-        # Extract the image data
-        logger.info("Extracting image data from MCP response")
-        try:
-            image_data = mcp_response["result"]["data"]
-            image_format = mcp_response["result"]["format"]
-        except KeyError as e:
-            logger.error(f"Failed to extract image data from MCP response: {e}")
-            logger.error(f"MCP response: {mcp_response}")
-            raise HTTPException(status_code=500, detail=f"Failed to extract image data from MCP response: {str(e)}")
-        # Return the image data
-        logger.info(f"Successfully generated diagram in {image_format} format")
-        return {
-            "image_data": image_data,  # This is base64 encoded
-            "image_format": image_format
-        }
+        result = run_diagram_job(request)
+        filenames = save_result(result)
+        filename = filenames[result["image_format"]]
+        if ENABLE_CACHING:
+            # Every format of a multi-format render is cached together under one key
+            shared_state.cache_put(cache_key, filename, result["image_format"], result.get("diagram_id"), filenames)
+    except HTTPException as e:
+        shared_state.finish_job(job_id, error=str(e.detail))
+        raise
     except Exception as e:
-        logger.exception(f"Server error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+        shared_state.finish_job(job_id, error=str(e))
+        raise
+    shared_state.finish_job(job_id, filename=filename)
+    result["job_id"] = job_id
+    return encode_artifacts(result)
+
+def sweep_state() -> None:
+    """Apply the retention period to the shared state and delete the files of expired diagrams."""
+    for filename in shared_state.maybe_sweep():
+        filepath = os.path.join(DIAGRAMS_DIR, filename)
+        for path in [filepath] + [filepath + suffix for _, suffix in ENCODINGS]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+def run_diagram_job(request: DiagramRequest) -> dict:
+    """Run the MCP server for a single request and return the image payload."""
+    arguments = {
+        "architecture_description": request.architecture_description,
+        "output_format": request.output_format,
+        "layout_direction": request.layout_direction,
+        "layout_engine": request.layout_engine,
+        "layout_timeout": request.layout_timeout,
+        "raster_options": request.raster_options
+    }
+    return call_diagram_tool("generate_azure_diagram_from_text", arguments)
+
+def tool_error(e: ToolError) -> HTTPException:
+    """HTTP error for a tool that ran and failed."""
+    return HTTPException(status_code=TOOL_ERROR_STATUS_CODES.get(e.code, 500), detail=str(e))
+
+def call_diagram_tool(tool_name: str, arguments: dict) -> dict:
+    """Run a diagram tool on the configured backend, mapping its failures to HTTP errors."""
+    try:
+        return backend.call_tool(tool_name, arguments)
+    except ToolError as e:
+        raise tool_error(e)
+    except TimeoutError as e:
+        logger.error(f"{tool_name} timed out: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except BackendUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/update-diagram")
+def update_diagram(request: UpdateDiagramRequest):
+    """
+    Re-render an edited architecture JSON against a previous diagram id.
+    Skips the LLM extraction and keeps unchanged nodes where they were.
+    """
+    logger.info(f"Received update for diagram {request.previous_diagram_id}")
+    result = call_diagram_tool("update_azure_diagram", request.model_dump())
+    save_result(result)
+    return encode_artifacts(result)
+
+@app.post("/edit-diagram")
+def edit_diagram(request: EditDiagramRequest):
+    """
+    Apply a natural language change to a previous diagram.
+    Only the previous JSON and the change text go to the LLM, which returns a JSON Patch.
+    """
+    if not request.change_description.strip():
+        raise HTTPException(status_code=400, detail="Change description cannot be empty")
+    logger.info(f"Received edit for diagram {request.previous_diagram_id}")
+    result = call_diagram_tool("edit_azure_diagram_from_text", request.model_dump())
+    save_result(result)
+    return encode_artifacts(result)
+
+@app.get("/diagrams")
+def list_diagrams():
+    """List saved diagram artifacts, newest first."""
+    return {"diagrams": [{**entry, "path": f"/diagrams/{entry['filename']}"} for entry in shared_state.list_diagrams()]}
+
+@app.get("/diagrams/{filename}")
+def get_diagram_by_filename(filename: str, request: Request):
+    """
+    Serve a saved diagram artifact. SVG and other text formats are served from
+    their precompressed brotli or gzip copy when the client accepts it.
+    """
+    # Security check to prevent directory traversal and access to hidden files
+    if ".." in filename or "/" in filename or "\\" in filename or filename.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    filepath = os.path.join(DIAGRAMS_DIR, filename)
+    # Only artifacts the server saved itself are served
+    if shared_state.get_diagram(filename) is None or not os.path.isfile(filepath):
+        raise HTTPException(status_code=404, detail="Diagram not found")
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    path, encoding = choose_encoding(filepath, request.headers.get("accept-encoding", ""))
+    headers = {"Content-Disposition": f"inline; filename={filename}", "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return the status of a diagram job, whichever worker handled it."""
+    job = shared_state.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.on_event("startup")
+def start_backend():
+    """Start the diagram backend's workers before the first request."""
+    logger.info(f"Worker {os.getpid()} using the {backend.name} diagram backend")
+    backend.start()
+
+@app.on_event("shutdown")
+async def drain_jobs():
+    """Record jobs that did not finish within the graceful shutdown window."""
+    interrupted = shared_state.interrupt_running_jobs()
+    if interrupted:
+        logger.warning(f"Worker {os.getpid()} stopped with {interrupted} unfinished job(s)")
+    else:
+        logger.info(f"Worker {os.getpid()} drained all in-flight jobs")
+    backend.close()
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -141,29 +348,32 @@ async def global_exception_handler(request, exc):
     )
 
 @app.get("/diagram")
-async def get_diagram():
+def get_diagram(request: Request):
     """
     Serve the latest generated diagram image.
     """
-    from fastapi.responses import FileResponse
-    import os
-    
-    diagram_path = os.path.join(os.path.dirname(__file__), "test_diagram.png")
-    if not os.path.exists(diagram_path):
+    latest = shared_state.latest_diagram(image_formats=("png", "webp", "svg"))
+    if latest is None:
         raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    return FileResponse(
-        diagram_path, 
-        media_type="image/png",
-        headers={"Content-Disposition": "inline; filename=azure_diagram.png"}
-    )
+    return get_diagram_by_filename(latest["filename"], request)
 
-if __name__ == "__main__":
-    import os
+def main() -> None:
     # Use 0.0.0.0 in Docker to listen on all interfaces
     # Use 127.0.0.1 for local development
     host = os.environ.get("API_HOST", "127.0.0.1")
     port = int(os.environ.get("API_PORT", 8000))
     
-    logger.info(f"Starting API server at http://{host}:{port}")
-    uvicorn.run(app, host=host, port=port)
+    logger.info(f"Starting API server in {DEPLOYMENT_MODE} mode at http://{host}:{port} with {API_WORKERS} worker(s)")
+    # An import string is required for uvicorn to spawn worker processes.
+    # On SIGTERM uvicorn stops accepting connections and waits up to
+    # GRACEFUL_SHUTDOWN_TIMEOUT seconds for in-flight requests to finish.
+    uvicorn.run(
+        "api_server:app",
+        host=host,
+        port=port,
+        workers=API_WORKERS,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT
+    )
+
+if __name__ == "__main__":
+    main()
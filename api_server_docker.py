@@ -1,285 +1,9 @@
-import os
-import json
-import subprocess
-import logging
-import time
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import uvicorn
-from dotenv import load_dotenv
+"""
+Entry point kept for existing scripts and deployments.
+The API server is api_server.py; this module re-exports its app.
+"""
 
-# Get deployment mode from environment
-DEPLOYMENT_MODE = os.environ.get("DEPLOYMENT_MODE", "development")
-LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO" if DEPLOYMENT_MODE == "production" else "DEBUG")
-ENABLE_REQUEST_LOGGING = os.environ.get("ENABLE_REQUEST_LOGGING", "true").lower() == "true"
-
-# Configure logging
-logging_level = getattr(logging, LOG_LEVEL)
-logging.basicConfig(
-    level=logging_level,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger("api_server")
-
-logger.info(f"Starting API server in {DEPLOYMENT_MODE} mode")
-
-# Load environment variables from .env file
-load_dotenv()
-
-app = FastAPI(
-    title="Azure Architecture Diagram Generator API",
-    description="API for generating Azure architecture diagrams from natural language descriptions",
-    version="1.0.0"
-)
-
-# Add CORS middleware to allow the web client to connect
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify the actual origin
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Add request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    if ENABLE_REQUEST_LOGGING:
-        start_time = time.time()
-        logger.info(f"Request started: {request.method} {request.url.path}")
-        
-        response = await call_next(request)
-        
-        process_time = time.time() - start_time
-        logger.info(f"Request completed: {request.method} {request.url.path} - Status: {response.status_code} - Time: {process_time:.3f}s")
-        
-        return response
-    else:
-        return await call_next(request)
-
-class DiagramRequest(BaseModel):
-    architecture_description: str
-    output_format: str = "png"
-    layout_direction: str = "TB"
-
-@app.get("/")
-async def root():
-    """Root endpoint to verify the API server is running."""
-    return {"status": "API server is running", "endpoints": ["/generate-diagram"], "mode": DEPLOYMENT_MODE}
-
-@app.post("/generate-diagram")
-async def generate_diagram(request: DiagramRequest):
-    """API endpoint to generate a diagram from a natural language description."""
-    
-    logger.info(f"Received request with output_format={request.output_format}, layout_direction={request.layout_direction}")
-      # Validate the input
-    if not request.architecture_description.strip():
-        logger.error("Empty architecture description received")
-        raise HTTPException(status_code=400, detail="Architecture description cannot be empty")
-    
-    # Path to the MCP server script
-    mcp_server_path = os.path.join(os.path.dirname(__file__), "azure_diagram_server.py")
-    fallback_server_path = os.path.join(os.path.dirname(__file__), "fallback_mcp_server.py")
-    logger.info(f"MCP server path: {mcp_server_path}")
-    
-    # Create an MCP request
-    mcp_request = {
-        "method": "call_tool",
-        "params": {
-            "name": "generate_azure_diagram_from_text",
-            "arguments": {
-                "architecture_description": request.architecture_description,
-                "output_format": request.output_format,
-                "layout_direction": request.layout_direction
-            }
-        }
-    }
-    
-    try:
-        # First try the main MCP server
-        logger.info("Starting MCP server process")
-        process = subprocess.Popen(
-            ["python", mcp_server_path],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        # Send the request to the MCP server
-        stdin_data = json.dumps(mcp_request) + "\n"
-        logger.info("Sending request to MCP server")
-        stdout_data, stderr_data = process.communicate(stdin_data)
-        
-        if process.returncode != 0 or "error" in stderr_data:
-            logger.warning(f"Main MCP server failed with error: {stderr_data}")
-            logger.info("Falling back to simplified MCP server")
-            
-            # Try with the fallback server
-            fallback_process = subprocess.Popen(
-                ["python", fallback_server_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            fallback_stdout, fallback_stderr = fallback_process.communicate(stdin_data)
-            
-            if fallback_process.returncode != 0:
-                logger.error(f"Fallback MCP server error: {fallback_stderr}")
-                raise HTTPException(status_code=500, detail=f"Both MCP servers failed. Error: {fallback_stderr}")
-            
-            stdout_data = fallback_stdout
-            
-        # Parse the response
-        logger.info("Parsing MCP server response")
-        try:
-            mcp_response = json.loads(stdout_data)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse MCP server response: {stdout_data}")
-            raise HTTPException(status_code=500, detail=f"Failed to parse MCP server response: {stdout_data[:200]}...")
-        
-        if "error" in mcp_response:
-            logger.error(f"MCP error: {mcp_response['error']}")
-            raise HTTPException(status_code=500, detail=f"MCP error: {mcp_response['error']}")
-          # Extract the image data
-        logger.info("Extracting image data from MCP response")
-        try:
-            image_data = mcp_response["result"]["data"]
-            image_format = mcp_response["result"]["format"]
-            
-            # Save the image to the diagrams directory
-            try:
-                import base64
-                from datetime import datetime
-                
-                # Create diagrams directory if it doesn't exist
-                diagrams_dir = os.path.join(os.path.dirname(__file__), "diagrams")
-                os.makedirs(diagrams_dir, exist_ok=True)
-                
-                # Generate a unique filename
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"diagram_{timestamp}.{image_format}"
-                filepath = os.path.join(diagrams_dir, filename)
-                
-                # Save the file
-                with open(filepath, "wb") as f:
-                    f.write(base64.b64decode(image_data))
-                
-                # Also save as test_diagram.png for compatibility with existing code
-                with open("test_diagram.png", "wb") as f:
-                    f.write(base64.b64decode(image_data))
-                    
-                logger.info(f"Saved diagram to {filepath}")
-            except Exception as e:
-                logger.warning(f"Failed to save diagram to file: {e}")
-        except KeyError as e:
-            logger.error(f"Failed to extract image data from MCP response: {e}")
-            logger.error(f"MCP response: {mcp_response}")
-            raise HTTPException(status_code=500, detail=f"Failed to extract image data from MCP response: {str(e)}")
-        
-        # Return the image data
-        logger.info(f"Successfully generated diagram in {image_format} format")
-        return {
-            "image_data": image_data,  # This is base64 encoded
-            "image_format": image_format
-        }
-        
-    except Exception as e:
-        logger.exception(f"Server error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
-
-@app.exception_handler(Exception)
-async def global_exception_handler(request, exc):
-    logger.exception(f"Unhandled exception: {str(exc)}")
-    return JSONResponse(
-        status_code=500,
-        content={"detail": f"An unexpected error occurred: {str(exc)}"}
-    )
-
-@app.get("/diagram")
-async def get_diagram():
-    """
-    Serve the latest generated diagram image.
-    """
-    diagram_path = os.path.join(os.path.dirname(__file__), "test_diagram.png")
-    if not os.path.exists(diagram_path):
-        raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    return FileResponse(
-        diagram_path, 
-        media_type="image/png",
-        headers={"Content-Disposition": "inline; filename=azure_diagram.png"}
-    )
-
-@app.get("/health")
-async def health_check():
-    """
-    Health check endpoint for container orchestration systems.
-    """
-    return {"status": "healthy", "mode": DEPLOYMENT_MODE}
-
-@app.get("/diagrams")
-async def list_diagrams():
-    """
-    List all generated diagrams.
-    """
-    diagrams_dir = os.path.join(os.path.dirname(__file__), "diagrams")
-    os.makedirs(diagrams_dir, exist_ok=True)
-    
-    # Get all image files in the diagrams directory
-    image_files = []
-    for filename in os.listdir(diagrams_dir):
-        if filename.endswith((".png", ".svg")):
-            file_path = os.path.join(diagrams_dir, filename)
-            stat = os.stat(file_path)
-            image_files.append({
-                "filename": filename,
-                "path": f"/diagrams/{filename}",
-                "size": stat.st_size,
-                "created": stat.st_ctime
-            })
-    
-    # Sort by creation time (newest first)
-    image_files.sort(key=lambda x: x["created"], reverse=True)
-    
-    return {"diagrams": image_files}
-
-@app.get("/diagrams/{filename}")
-async def get_diagram_by_filename(filename: str):
-    """
-    Serve a specific diagram by filename.
-    """
-    # Security check to prevent directory traversal
-    if ".." in filename or "/" in filename or "\\" in filename:
-        raise HTTPException(status_code=400, detail="Invalid filename")
-    
-    diagrams_dir = os.path.join(os.path.dirname(__file__), "diagrams")
-    diagram_path = os.path.join(diagrams_dir, filename)
-    
-    if not os.path.exists(diagram_path):
-        raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    # Determine media type based on extension
-    media_type = "image/png"
-    if filename.endswith(".svg"):
-        media_type = "image/svg+xml"
-    
-    return FileResponse(
-        diagram_path, 
-        media_type=media_type,
-        headers={"Content-Disposition": f"inline; filename={filename}"}
-    )
+from api_server import app, main
 
 if __name__ == "__main__":
-    import os
-    # Use 0.0.0.0 in Docker to listen on all interfaces
-    # Use 127.0.0.1 for local development
-    host = os.environ.get("API_HOST", "127.0.0.1")
-    port = int(os.environ.get("API_PORT", 8000))
-    
-    logger.info(f"Starting API server at http://{host}:{port}")
-    uvicorn.run(app, host=host, port=port)
+    main()
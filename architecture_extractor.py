@@ -0,0 +1,523 @@
+"""
+Architecture extraction with Azure OpenAI.
+
+Turns a natural language description into the structured architecture JSON
+that diagram_renderer draws. Simple descriptions are handled by the rule-based
+local_extractor first; Azure OpenAI is only called when its confidence is too
+low. The extraction prompt is compiled once per process and the completion is
+constrained with a JSON schema built from the renderer's resource types.
+Completions are streamed and parsed incrementally:
+resources, relationships and clusters are validated against the
+architecture_schema models as they arrive, and the document is complete when
+its closing brace arrives, without a second parse of the full text. For iterative
+edits, process_edit_with_azure_openai sends only the previous JSON and the
+changed text and asks the model for a JSON Patch, which is applied locally.
+"""
+
+import os
+import json
+import copy
+import time
+import logging
+import requests
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from architecture_schema import Cluster, Relationship, Resource
+from diagram_renderer import AZURE_NODE_MAP
+from llm_router import LLM_REQUEST_TIMEOUT, router
+from local_extractor import LOCAL_EXTRACTOR_ENABLED, LOCAL_EXTRACTOR_CONFIDENCE, SERVICE_PATTERNS, extract_architecture_locally
+
+logger = logging.getLogger("architecture_extractor")
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Azure OpenAI credentials and deployments are read by llm_router
+
+# json_schema (structured outputs), json_object (JSON mode) or none
+EXTRACTION_RESPONSE_FORMAT = os.getenv("EXTRACTION_RESPONSE_FORMAT", "json_schema").lower()
+
+# Stream extraction completions and parse them while they arrive
+AZURE_OPENAI_STREAM = os.getenv("AZURE_OPENAI_STREAM", "true").lower() == "true"
+
+# A patch for a small edit is a handful of operations, far below a full document
+EDIT_MAX_TOKENS = int(os.getenv("EDIT_MAX_TOKENS", 600))
+
+# Resource types the renderer can draw; the local rules cover the same set when diagrams is missing
+RESOURCE_TYPES = sorted(AZURE_NODE_MAP) or sorted(SERVICE_PATTERNS)
+
+
+def _object_schema(properties: dict) -> dict:
+    # Strict structured outputs require every property and no extras
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+ARCHITECTURE_SCHEMA = _object_schema({
+    "diagram_label": {"type": "string"},
+    "resources": {"type": "array", "items": _object_schema({
+        "name": {"type": "string"},
+        "type": {"type": "string", "enum": RESOURCE_TYPES},
+        "attributes": _object_schema({"location": {"type": "string"}, "sku": {"type": "string"}})
+    })},
+    "relationships": {"type": "array", "items": _object_schema({
+        "source": {"type": "string"},
+        "target": {"type": "string"},
+        "type": {"type": "string"}
+    })},
+    "clusters": {"type": "array", "items": _object_schema({
+        "name": {"type": "string"},
+        "parent": {"type": ["string", "null"]},
+        "resources": {"type": "array", "items": {"type": "string"}}
+    })}
+})
+
+# Bump PROMPT_VERSION whenever the prompt or schema changes so reports and caches can tell them apart
+PROMPT_VERSION = "3"
+EXTRACTION_SYSTEM_PROMPT = (
+    "Convert the user's Azure architecture description to JSON: "
+    '{"diagram_label":str,"resources":[{"name":str,"type":str,"attributes":{"location":str,"sku":str}}],'
+    '"relationships":[{"source":str,"target":str,"type":str}],"clusters":[{"name":str,"parent":str|null,"resources":[str]}]}. '
+    f"type is one of {','.join(RESOURCE_TYPES)}. "
+    "Include only what is stated or directly implied; use \"\" for unknown attributes. "
+    "Relationships and clusters must use resource names exactly. Clusters are subscriptions, resource groups, "
+    "VNets or subnets; parent is the name of the enclosing cluster, or null."
+)
+
+if EXTRACTION_RESPONSE_FORMAT == "json_schema":
+    EXTRACTION_RESPONSE = {
+        "type": "json_schema",
+        "json_schema": {"name": "azure_architecture", "strict": True, "schema": ARCHITECTURE_SCHEMA}
+    }
+elif EXTRACTION_RESPONSE_FORMAT == "json_object":
+    EXTRACTION_RESPONSE = {"type": "json_object"}
+else:
+    EXTRACTION_RESPONSE = None
+
+SAMPLE_ARCHITECTURE = {
+    "diagram_label": "Sample Web App Architecture",
+    "resources": [
+        {
+            "name": "Web App",
+            "type": "Azure.WebApp",
+            "attributes": {
+                "location": "East US",
+                "sku": "S1"
+            }
+        },
+        {
+            "name": "SQL Database",
+            "type": "Azure.SQLDatabase",
+            "attributes": {
+                "location": "East US",
+                "sku": "S2"
+            }
+        }
+    ],
+    "relationships": [
+        {
+            "source": "Web App",
+            "target": "SQL Database",
+            "type": "connects_to"
+        }
+    ],
+    "clusters": [
+        {
+            "name": "Resource Group 1",
+            "resources": ["Web App", "SQL Database"]
+        }
+    ]
+}
+
+
+def _chat_completion(messages: list, max_tokens: int, response_format: dict = None, usage: dict = None) -> str:
+    """
+    Send a chat completion request to Azure OpenAI and return the message content.
+    Token counts, the deployment used and the rate limit queue wait are copied
+    into usage when a dict is passed.
+    """
+    body = {
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": 0.3
+    }
+    if response_format:
+        body["response_format"] = response_format
+
+    try:
+        response = router.post(body, stats=usage)
+
+        if response.status_code != 200:
+            logger.error(f"Azure OpenAI API request failed: {response.text}")
+            raise Exception(f"Azure OpenAI API request failed: {response.text}")
+
+        result = response.json()
+        if result.get("usage"):
+            logger.info(f"Azure OpenAI token usage: {result['usage']}")
+            if usage is not None:
+                usage.update(result["usage"])
+        return result["choices"][0]["message"]["content"]
+    except requests.exceptions.Timeout:
+        logger.error("Azure OpenAI API request timed out")
+        raise Exception(f"Azure OpenAI API request timed out after {LLM_REQUEST_TIMEOUT:.0f} seconds")
+    except Exception as e:
+        logger.exception(f"Error calling Azure OpenAI API: {str(e)}")
+        raise Exception(f"Error calling Azure OpenAI API: {str(e)}")
+
+
+class IncrementalArchitectureParser:
+    """
+    Incremental parser for the architecture JSON document.
+
+    Text is fed in chunks as it streams in. Each element of the resources,
+    relationships and clusters arrays is decoded and validated as soon as its
+    closing brace arrives, and done becomes True when the top-level object
+    closes, so no pass over the full text is needed afterwards. Text before the
+    first "{" (e.g. a markdown code fence) is ignored.
+    """
+
+    # Model each element of a streamed array is validated with
+    ITEM_MODELS = {"resources": Resource, "relationships": Relationship, "clusters": Cluster}
+
+    def __init__(self):
+        self.result = {}
+        self.done = False
+        self.rejected = []
+        self._text = ""
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_key = True
+        self._key = None
+        self._value_start = None
+        self._array_key = None
+        self._item_start = None
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk of text; returns True once the document is complete."""
+        if self.done:
+            return True
+        offset = len(self._text)
+        self._text += chunk
+        for index in range(offset, len(self._text)):
+            self._step(index, self._text[index])
+            if self.done:
+                break
+        return self.done
+
+    def _step(self, index: int, ch: str) -> None:
+        if not self._started:
+            if ch == "{":
+                self._started = True
+                self._depth = 1
+            return
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 1 and self._expect_key:
+                    self._key = json.loads(self._text[self._string_start:index + 1])
+            return
+        if ch == '"':
+            self._in_string = True
+            self._string_start = index
+            if self._depth == 1 and not self._expect_key and self._value_start is None:
+                self._value_start = index
+            return
+        if ch in " \t\r\n":
+            return
+        if self._depth == 1:
+            self._step_top_level(index, ch)
+        elif ch in "[{":
+            if self._depth == 2 and self._array_key and ch == "{":
+                self._item_start = index
+            self._depth += 1
+        elif ch in "]}":
+            self._depth -= 1
+            if self._array_key and self._depth == 2 and self._item_start is not None:
+                self._add_item(self._array_key, self._text[self._item_start:index + 1])
+                self._item_start = None
+            elif self._array_key and self._depth == 1:
+                # The streamed array is complete; its elements are already in result
+                self._array_key = None
+                self._value_start = None
+
+    def _step_top_level(self, index: int, ch: str) -> None:
+        if ch == ":":
+            self._expect_key = False
+            self._value_start = None
+        elif ch in ",}":
+            if self._value_start is not None:
+                self.result[self._key] = json.loads(self._text[self._value_start:index])
+            self._value_start = None
+            self._expect_key = True
+            if ch == "}":
+                self._depth = 0
+                self.done = True
+        elif not self._expect_key:
+            if self._value_start is None:
+                self._value_start = index
+            if ch == "[" and self._key in self.ITEM_MODELS:
+                self._array_key = self._key
+                self.result[self._key] = []
+                self._depth = 2
+            elif ch in "[{":
+                self._depth += 1
+
+    def _add_item(self, key: str, text: str) -> None:
+        item = json.loads(text)
+        try:
+            self.ITEM_MODELS[key].model_validate(item)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'entry'}: {err['msg']}" for err in e.errors())
+            logger.warning(f"Dropping invalid {key} entry {item}: {error}")
+            self.rejected.append({"section": key, "item": item, "error": error})
+            return
+        self.result[key].append(item)
+
+
+def _stream_chat_completion(messages: list, max_tokens: int, response_format: dict = None, usage: dict = None) -> dict:
+    """
+    Stream a chat completion from Azure OpenAI into an IncrementalArchitectureParser.
+    Returns the parsed architecture once the JSON document has closed and, when
+    usage is requested, the usage chunk that follows it has arrived.
+    Token counts, the deployment used and the rate limit queue wait are copied
+    into usage when a dict is passed.
+    """
+    body = {
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": 0.3,
+        "stream": True
+    }
+    if response_format:
+        body["response_format"] = response_format
+    if usage is not None:
+        # Usage arrives in one extra chunk right after the last content chunk
+        body["stream_options"] = {"include_usage": True}
+
+    parser = IncrementalArchitectureParser()
+    started = time.monotonic()
+    first_token_seconds = None
+    try:
+        response = router.post(body, stream=True, stats=usage)
+
+        with response:
+            if response.status_code != 200:
+                logger.error(f"Azure OpenAI API request failed: {response.text}")
+                raise Exception(f"Azure OpenAI API request failed: {response.text}")
+
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    usage.update(chunk["usage"])
+                    break
+                if not chunk.get("choices") or parser.done:
+                    continue
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if not content:
+                    continue
+                if first_token_seconds is None:
+                    first_token_seconds = time.monotonic() - started
+                # Without a usage chunk to wait for, stop reading the moment the document closes
+                if parser.feed(content) and usage is None:
+                    break
+    except requests.exceptions.Timeout:
+        logger.error("Azure OpenAI API request timed out")
+        raise Exception(f"Azure OpenAI API request timed out after {LLM_REQUEST_TIMEOUT:.0f} seconds")
+    except Exception as e:
+        logger.exception(f"Error calling Azure OpenAI API: {str(e)}")
+        raise Exception(f"Error calling Azure OpenAI API: {str(e)}")
+
+    if not parser.done:
+        raise Exception("Azure OpenAI stream ended before the architecture JSON was complete")
+    logger.info(
+        f"Streamed architecture: first token after {first_token_seconds or 0:.2f}s, "
+        f"complete after {time.monotonic() - started:.2f}s, {len(parser.rejected)} invalid entries dropped"
+    )
+    return parser.result
+
+
+def _extract_json(content: str, open_char: str = "{", close_char: str = "}"):
+    """Parse JSON from a model response, tolerating text around it."""
+    try:
+        # First attempt: try to parse the whole content as JSON
+        return json.loads(content)
+    except json.JSONDecodeError:
+        # Second attempt: try to extract JSON from the content
+        json_start = content.find(open_char)
+        json_end = content.rfind(close_char) + 1
+        if json_start >= 0 and json_end > 0:
+            return json.loads(content[json_start:json_end])
+        raise Exception("Failed to extract JSON from Azure OpenAI response")
+
+
+def extract_architecture(architecture_description: str) -> tuple:
+    """
+    Extract the architecture JSON for a description.
+    Returns the architecture and a report with its source, the prompt version and token counts.
+    """
+    started = time.monotonic()
+    report = {"source": "local", "prompt_version": PROMPT_VERSION, "prompt_tokens": 0, "completion_tokens": 0}
+    local_json = None
+    if LOCAL_EXTRACTOR_ENABLED:
+        local_json, confidence = extract_architecture_locally(architecture_description)
+        report["confidence"] = confidence
+        logger.info(
+            f"Local extractor found {len(local_json['resources'])} resources "
+            f"with confidence {confidence:.2f} in {(time.monotonic() - started) * 1000:.1f}ms"
+        )
+        if confidence >= LOCAL_EXTRACTOR_CONFIDENCE:
+            report["seconds"] = round(time.monotonic() - started, 4)
+            return local_json, report
+
+    if not router.deployments:
+        # Without an API key, use whatever the local rules found
+        if local_json and local_json["resources"]:
+            arch_json = local_json
+        else:
+            # For demo purposes, return a sample JSON if nothing was recognized
+            arch_json = copy.deepcopy(SAMPLE_ARCHITECTURE)
+            report["source"] = "sample"
+        report["seconds"] = round(time.monotonic() - started, 4)
+        return arch_json, report
+
+    messages = [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": architecture_description}
+    ]
+    usage = {}
+    if AZURE_OPENAI_STREAM:
+        arch_json = _stream_chat_completion(messages, 2000, EXTRACTION_RESPONSE, usage)
+    else:
+        arch_json = _extract_json(_chat_completion(messages, 2000, EXTRACTION_RESPONSE, usage))
+
+    report["source"] = "azure_openai"
+    report["prompt_tokens"] = usage.get("prompt_tokens")
+    report["completion_tokens"] = usage.get("completion_tokens")
+    report["deployment"] = usage.get("deployment")
+    report["queue_wait_seconds"] = usage.get("queue_wait_seconds", 0.0)
+    report["seconds"] = round(time.monotonic() - started, 4)
+    logger.info(
+        f"Extraction with prompt v{PROMPT_VERSION}: {report['prompt_tokens']} prompt tokens, "
+        f"{report['completion_tokens']} completion tokens"
+    )
+    return arch_json, report
+
+
+def process_text_with_azure_openai(architecture_description: str) -> dict:
+    """
+    Process the natural language architecture description using Azure OpenAI.
+    Returns a structured JSON representation of the architecture.
+    """
+    return extract_architecture(architecture_description)[0]
+
+
+def process_edit_with_azure_openai(previous_arch_json: dict, change_description: str) -> tuple:
+    """
+    Apply a natural language edit to a previously extracted architecture.
+    Only the previous JSON and the changed text are sent; the model answers
+    with a JSON Patch (RFC 6902) that is applied locally.
+    Returns the patched architecture JSON and the patch that was applied.
+    """
+    if not router.deployments:
+        raise Exception("Editing a diagram from text requires Azure OpenAI credentials")
+
+    # Compact separators keep the previous document as small as possible in tokens
+    previous = json.dumps(previous_arch_json, separators=(",", ":"))
+    prompt = (
+        "Current architecture JSON:\n"
+        f"{previous}\n\n"
+        "Change requested:\n"
+        f"{change_description}\n\n"
+        "Reply with only a JSON Patch (RFC 6902) array that applies the change to the current JSON. "
+        "Use \"/resources/-\" style paths to append, keep resource names in relationships and clusters "
+        "consistent with the resources, and use types prefixed with \"Azure.\"."
+    )
+
+    content = _chat_completion(
+        [
+            {"role": "system", "content": "You edit Azure architecture JSON documents by returning JSON Patch operations."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=EDIT_MAX_TOKENS
+    )
+    patch = _extract_json(content, "[", "]")
+    if not isinstance(patch, list):
+        raise Exception("Azure OpenAI did not return a JSON Patch array")
+    return apply_json_patch(previous_arch_json, patch), patch
+
+
+def _resolve_pointer(document, pointer: str):
+    """Return (parent container, final key) for an RFC 6901 JSON pointer."""
+    if pointer == "" or not pointer.startswith("/"):
+        raise Exception(f"Unsupported JSON pointer: '{pointer}'")
+    parts = [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+    parent = document
+    for part in parts[:-1]:
+        parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+    return parent, parts[-1]
+
+
+def _get_pointer(document, pointer: str):
+    parent, key = _resolve_pointer(document, pointer)
+    return parent[int(key)] if isinstance(parent, list) else parent[key]
+
+
+def _add(document, pointer: str, value) -> None:
+    parent, key = _resolve_pointer(document, pointer)
+    if isinstance(parent, list):
+        if key == "-":
+            parent.append(value)
+        else:
+            parent.insert(int(key), value)
+    else:
+        parent[key] = value
+
+
+def _remove(document, pointer: str):
+    parent, key = _resolve_pointer(document, pointer)
+    return parent.pop(int(key) if isinstance(parent, list) else key)
+
+
+def apply_json_patch(document: dict, patch: list) -> dict:
+    """Apply RFC 6902 operations to a copy of document and return the result."""
+    result = copy.deepcopy(document)
+    for operation in patch:
+        op = operation.get("op")
+        path = operation.get("path", "")
+        try:
+            if op == "add":
+                _add(result, path, copy.deepcopy(operation["value"]))
+            elif op == "remove":
+                _remove(result, path)
+            elif op == "replace":
+                _remove(result, path)
+                _add(result, path, copy.deepcopy(operation["value"]))
+            elif op == "move":
+                _add(result, path, _remove(result, operation["from"]))
+            elif op == "copy":
+                _add(result, path, copy.deepcopy(_get_pointer(result, operation["from"])))
+            elif op == "test":
+                if _get_pointer(result, path) != operation["value"]:
+                    raise Exception("test operation failed")
+            else:
+                raise Exception(f"unknown operation '{op}'")
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            raise Exception(f"Failed to apply JSON Patch operation {operation}: {e}")
+    return result
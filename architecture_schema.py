@@ -0,0 +1,255 @@
+"""
+Validation and normalization of architecture JSON before rendering.
+
+The LLM, the local extractor and API clients all produce architecture JSON;
+normalize_architecture turns any of them into a document the renderer can
+draw safely. Oversized inputs are rejected before any per-item work, the
+structure is checked by compiled pydantic validators, duplicate resource
+names are merged or renamed, and the names used by relationships and
+clusters are matched to resources ignoring case and whitespace.
+
+Clusters may nest, either through a "parent" name or a nested "clusters"
+array. Both forms are flattened into one list where each cluster names its
+parent and each resource belongs to exactly one cluster, the deepest one
+that lists it.
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+logger = logging.getLogger("architecture_schema")
+
+# Inputs beyond these sizes are refused instead of being handed to Graphviz
+ARCH_MAX_RESOURCES = int(os.getenv("ARCH_MAX_RESOURCES", 2000))
+ARCH_MAX_RELATIONSHIPS = int(os.getenv("ARCH_MAX_RELATIONSHIPS", 10000))
+ARCH_MAX_CLUSTERS = int(os.getenv("ARCH_MAX_CLUSTERS", 500))
+ARCH_MAX_NAME_LENGTH = int(os.getenv("ARCH_MAX_NAME_LENGTH", 200))
+# Subscription -> resource group -> VNet -> subnet is 4 levels
+ARCH_MAX_CLUSTER_DEPTH = int(os.getenv("ARCH_MAX_CLUSTER_DEPTH", 16))
+
+DEFAULT_RESOURCE_TYPE = "Azure.WebApp"
+
+
+class ArchitectureValidationError(Exception):
+    """Raised when an architecture cannot be rendered."""
+
+
+class Resource(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    name: str = Field(min_length=1, max_length=ARCH_MAX_NAME_LENGTH)
+    type: str = DEFAULT_RESOURCE_TYPE
+    attributes: Dict[str, Any] = Field(default_factory=dict)
+
+
+class Relationship(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    source: str = Field(max_length=ARCH_MAX_NAME_LENGTH)
+    target: str = Field(max_length=ARCH_MAX_NAME_LENGTH)
+    type: str = "connects_to"
+
+
+class Cluster(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    name: str = Field(default="Cluster", max_length=ARCH_MAX_NAME_LENGTH)
+    resources: List[str] = Field(default_factory=list)
+    parent: Optional[str] = Field(default=None, max_length=ARCH_MAX_NAME_LENGTH)
+    clusters: List["Cluster"] = Field(default_factory=list)
+
+
+Cluster.model_rebuild()
+
+
+class Architecture(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    diagram_label: str = Field(default="Azure Architecture", max_length=ARCH_MAX_NAME_LENGTH)
+    resources: List[Resource] = Field(default_factory=list)
+    relationships: List[Relationship] = Field(default_factory=list)
+    clusters: List[Cluster] = Field(default_factory=list)
+
+
+def name_key(name: str) -> str:
+    """Key under which names match: case-insensitive with whitespace collapsed."""
+    return " ".join(name.split()).casefold()
+
+
+def _check_limits(arch_json) -> None:
+    # Cheap length checks first, so a pathological document is refused before validation
+    if not isinstance(arch_json, dict):
+        raise ArchitectureValidationError("Architecture JSON must be an object")
+    for section, limit in (("resources", ARCH_MAX_RESOURCES),
+                           ("relationships", ARCH_MAX_RELATIONSHIPS),
+                           ("clusters", ARCH_MAX_CLUSTERS)):
+        items = arch_json.get(section) or []
+        if not isinstance(items, list):
+            raise ArchitectureValidationError(f"'{section}' must be a list")
+        if len(items) > limit:
+            raise ArchitectureValidationError(f"Too many {section}: {len(items)} (limit {limit})")
+
+
+def normalize_architecture(arch_json: dict) -> tuple:
+    """
+    Validate and normalize an architecture.
+    Returns the normalized architecture and a report of what was changed.
+    """
+    started = time.perf_counter()
+    _check_limits(arch_json)
+    try:
+        architecture = Architecture.model_validate(
+            {key: value for key, value in arch_json.items() if value is not None}
+        )
+    except ValidationError as e:
+        first = e.errors()[0]
+        raise ArchitectureValidationError(
+            f"Invalid architecture JSON: {e.error_count()} errors, first: {first['msg']} at {first['loc']}"
+        )
+
+    report = {"renamed_resources": [], "merged_resources": [], "dropped_relationships": [],
+              "dropped_cluster_members": [], "multi_cluster_members": [], "detached_clusters": []}
+
+    # Resources: merge repeats of the same resource, rename distinct resources that collide
+    resources = []
+    by_key = {}
+    for resource in architecture.resources:
+        name = " ".join(resource.name.split())
+        key = name_key(name)
+        existing = by_key.get(key)
+        if existing is not None and existing["type"] == resource.type:
+            existing["attributes"] = {**resource.attributes, **existing["attributes"]}
+            report["merged_resources"].append(resource.name)
+            continue
+        if existing is not None:
+            suffix = 2
+            while name_key(f"{name} ({suffix})") in by_key:
+                suffix += 1
+            report["renamed_resources"].append([resource.name, f"{name} ({suffix})"])
+            name = f"{name} ({suffix})"
+            key = name_key(name)
+        entry = {"name": name, "type": resource.type, "attributes": resource.attributes}
+        by_key[key] = entry
+        resources.append(entry)
+
+    # Relationships: resolve endpoints by key, drop unknown endpoints and repeats
+    relationships = []
+    seen = set()
+    for relationship in architecture.relationships:
+        source = by_key.get(name_key(relationship.source))
+        target = by_key.get(name_key(relationship.target))
+        if source is None or target is None:
+            report["dropped_relationships"].append([relationship.source, relationship.target])
+            continue
+        edge = (source["name"], target["name"], relationship.type)
+        if edge in seen:
+            continue
+        seen.add(edge)
+        relationships.append({"source": edge[0], "target": edge[1], "type": edge[2]})
+
+    clusters = _normalize_clusters(architecture.clusters, by_key, report)
+
+    normalized = {
+        "diagram_label": architecture.diagram_label,
+        "resources": resources,
+        "relationships": relationships,
+        "clusters": clusters
+    }
+    report = {key: value for key, value in report.items() if value}
+    report["seconds"] = round(time.perf_counter() - started, 5)
+    if len(report) > 1:
+        logger.info(f"Normalized architecture: {report}")
+    return normalized, report
+
+
+def _normalize_clusters(cluster_models: List[Cluster], resources_by_key: dict, report: dict) -> list:
+    """Flatten nested clusters, resolve parents and give every resource a single cluster."""
+    # Flatten nested arrays; a nested cluster's parent is the cluster it is written in
+    flat = []
+    stack = [(cluster, None) for cluster in reversed(cluster_models)]
+    while stack:
+        cluster, enclosing = stack.pop()
+        flat.append((cluster, enclosing or cluster.parent))
+        stack.extend((child, cluster.name) for child in reversed(cluster.clusters))
+    if len(flat) > ARCH_MAX_CLUSTERS:
+        raise ArchitectureValidationError(f"Too many clusters: {len(flat)} (limit {ARCH_MAX_CLUSTERS})")
+
+    # Merge clusters with the same name
+    clusters = []
+    by_key = {}
+    for cluster, parent in flat:
+        key = name_key(cluster.name)
+        entry = by_key.get(key)
+        if entry is None:
+            entry = {"name": " ".join(cluster.name.split()), "resources": [], "parent": None, "_members": []}
+            by_key[key] = entry
+            clusters.append(entry)
+        if parent and entry["parent"] is None:
+            entry["parent"] = parent
+        entry["_members"].extend(cluster.resources)
+
+    # Resolve parents by name; unknown parents and self references become top level
+    for entry in clusters:
+        if entry["parent"] is None:
+            continue
+        parent = by_key.get(name_key(entry["parent"]))
+        if parent is None or parent is entry:
+            report["detached_clusters"].append([entry["name"], entry["parent"]])
+            entry["parent"] = None
+        else:
+            entry["parent"] = parent["name"]
+
+    # Depth of every cluster, memoized so the whole pass is linear; cycles are cut where found
+    depth = {}
+
+    def resolve_depth(entry):
+        path = []
+        on_path = set()
+        current = entry
+        while current is not None and current["name"] not in depth:
+            if current["name"] in on_path:
+                report["detached_clusters"].append([current["name"], current["parent"]])
+                current["parent"] = None
+                # Walk again now that the cycle is cut
+                return resolve_depth(entry)
+            path.append(current)
+            on_path.add(current["name"])
+            current = by_key[name_key(current["parent"])] if current["parent"] else None
+        level = depth[current["name"]] if current is not None else -1
+        for node in reversed(path):
+            level += 1
+            if level >= ARCH_MAX_CLUSTER_DEPTH:
+                raise ArchitectureValidationError(
+                    f"Clusters are nested deeper than {ARCH_MAX_CLUSTER_DEPTH} levels at '{node['name']}'"
+                )
+            depth[node["name"]] = level
+
+    for entry in clusters:
+        resolve_depth(entry)
+
+    # A resource listed by several clusters goes to the deepest; ties go to the first listed
+    assignment = {}
+    for entry in clusters:
+        for member in entry.pop("_members"):
+            resource = resources_by_key.get(name_key(member))
+            if resource is None:
+                report["dropped_cluster_members"].append([entry["name"], member])
+                continue
+            current = assignment.get(resource["name"])
+            if current is None:
+                assignment[resource["name"]] = entry
+            elif current is not entry:
+                if depth[entry["name"]] > depth[current["name"]]:
+                    assignment[resource["name"]] = entry
+                report["multi_cluster_members"].append(resource["name"])
+    for resource_name, entry in assignment.items():
+        entry["resources"].append(resource_name)
+
+    for entry in clusters:
+        if entry["parent"] is None:
+            del entry["parent"]
+    return clusters
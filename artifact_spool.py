@@ -0,0 +1,82 @@
+"""
+Binary side channel for rendered diagrams between the MCP server and its clients.
+
+Tool results carry images as base64 text inside JSON-RPC messages, which for a
+multi-megabyte diagram means a third more bytes and several full copies on
+each side. A client on the same host can instead ask for
+artifact_transport="handle": the server writes each output once into a spool
+directory on a RAM-backed filesystem and returns only its handle, a file name
+and size, and the client reads the bytes from the spool and deletes the file.
+
+Outputs nobody claims are removed after ARTIFACT_SPOOL_TTL seconds.
+"""
+
+import os
+import time
+import logging
+import tempfile
+from typing import Dict
+
+logger = logging.getLogger("artifact_spool")
+
+# Shared by the MCP server and the API server, so both must see the same directory
+ARTIFACT_SPOOL_DIR = os.getenv(
+    "ARTIFACT_SPOOL_DIR",
+    "/dev/shm/azure-diagram-artifacts" if os.path.isdir("/dev/shm")
+    else os.path.join(tempfile.gettempdir(), "azure-diagram-artifacts")
+)
+# Seconds an unclaimed output is kept
+ARTIFACT_SPOOL_TTL = float(os.getenv("ARTIFACT_SPOOL_TTL", 300))
+
+ARTIFACT_TRANSPORTS = ("inline", "handle")
+
+
+def _sweep() -> None:
+    """Delete outputs older than ARTIFACT_SPOOL_TTL whose client never claimed them."""
+    cutoff = time.time() - ARTIFACT_SPOOL_TTL
+    for entry in os.scandir(ARTIFACT_SPOOL_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            # Claimed or swept by another process meanwhile
+            pass
+
+
+def spool_artifacts(diagram_id: str, artifacts: Dict[str, bytes]) -> Dict[str, dict]:
+    """Write each output into the spool; returns {format: {"name", "bytes"}} handles."""
+    os.makedirs(ARTIFACT_SPOOL_DIR, exist_ok=True)
+    _sweep()
+    handles = {}
+    for output_format, data in artifacts.items():
+        name = f"{diagram_id}.{output_format}"
+        path = os.path.join(ARTIFACT_SPOOL_DIR, name)
+        # Write to a temporary name first so a reader never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        handles[output_format] = {"name": name, "bytes": len(data)}
+    return handles
+
+
+def claim_artifacts(handles: Dict[str, dict]) -> Dict[str, bytes]:
+    """Read the outputs behind handles from the spool and delete them."""
+    artifacts = {}
+    for output_format, handle in handles.items():
+        name = handle["name"]
+        # Handles come off the wire; only plain names inside the spool are accepted
+        if os.path.basename(name) != name or name.startswith("."):
+            raise Exception(f"Invalid artifact handle '{name}'")
+        path = os.path.join(ARTIFACT_SPOOL_DIR, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise Exception(f"Artifact '{name}' is not in {ARTIFACT_SPOOL_DIR}; "
+                            "artifact_transport=handle needs the server and client on the same host")
+        os.unlink(path)
+        if len(data) != handle["bytes"]:
+            raise Exception(f"Artifact '{name}' is {len(data)} bytes, expected {handle['bytes']}")
+        artifacts[output_format] = data
+    return artifacts
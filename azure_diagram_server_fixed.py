@@ -1,299 +1,317 @@
-import os
-import tempfile
 import json
 import base64
-from typing import Optional
-import requests
-import sys
+from typing import List, Optional, Union
 import logging
+import uuid
+import anyio
 from mcp.server.fastmcp import FastMCP, Image
+from mcp.types import BlobResourceContents, EmbeddedResource
 from dotenv import load_dotenv
+from architecture_extractor import extract_architecture, process_edit_with_azure_openai
+from diagram_renderer import diff_architectures, pinnable_positions, parse_output_formats
+from raster_encoder import parse_raster_options
+from graphviz_pool import graphviz_pool
+from render_executor import render_executor
+from artifact_spool import ARTIFACT_TRANSPORTS, spool_artifacts
+from mcp_remote import tool_error_text
+from render_limits import RenderLimitError
+from architecture_schema import normalize_architecture
+from shared_state import SharedState
+from mcp_transport import MCP_HOST, MCP_PORT, MCP_TRANSPORT, run_server
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mcp_server")
 
-# Try to import rsaz_diagrams, but handle import errors gracefully
-try:
-    from diagrams import Diagram, Cluster
-    from diagrams.azure.compute import AppServices
-    from diagrams.azure.database import SQLDatabases
-    from diagrams.azure.storage import BlobStorage
-    from diagrams.azure.network import LoadBalancers, ApplicationGateway, VirtualNetworks
-    from diagrams.azure.identity import ActiveDirectory
-    from diagrams.azure.security import KeyVaults
-    from diagrams.azure.integration import ServiceBus
-    from diagrams.azure.analytics import SynapseAnalytics
-    from diagrams.azure.aiml import CognitiveServices
-    from diagrams.azure.web import AppServicePlans
-    DIAGRAMS_AVAILABLE = True
-except ImportError as e:
-    logger.error(f"Failed to import diagrams library: {e}")
-    logger.error("Make sure diagrams/rsaz-diagrams and Graphviz are installed and in your PATH.")
-    DIAGRAMS_AVAILABLE = False
-
 # Load environment variables from .env file
 load_dotenv()
 
+# Transport settings live in mcp_transport. With MCP_TRANSPORT=sse the server stays
+# resident and clients (e.g. the API server) connect to http://MCP_HOST:MCP_PORT/sse.
+
 # Initialize FastMCP server
-mcp = FastMCP("azure-diagram-generator")
+mcp = FastMCP("azure-diagram-generator", host=MCP_HOST, port=MCP_PORT)
 
-# Define Azure OpenAI API credentials (these should be set in environment variables)
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4")
+# Architectures and node positions of rendered diagrams, for incremental re-renders
+layout_store = SharedState()
 
-# Map Azure resource types to diagrams library components
-AZURE_NODE_MAP = {
-    "Azure.WebApp": AppServices,
-    "Azure.SQLDatabase": SQLDatabases,
-    "Azure.BlobStorage": BlobStorage,
-    "Azure.LoadBalancer": LoadBalancers,
-    "Azure.ApplicationGateway": ApplicationGateway,
-    "Azure.VirtualNetwork": VirtualNetworks,
-    "Azure.ActiveDirectory": ActiveDirectory,
-    "Azure.KeyVault": KeyVaults,
-    "Azure.ServiceBus": ServiceBus,
-    "Azure.PowerBI": SynapseAnalytics,
-    "Azure.CognitiveServices": CognitiveServices,
-    "Azure.AppServicePlan": AppServicePlans,
-    # Add more mappings as needed
-}
+# Formats that are not images are returned as embedded resources with these MIME types
+ARTIFACT_MIME_TYPES = {"pdf": "application/pdf", "dot": "text/vnd.graphviz", "json-layout": "application/json",
+                       "geometry": "application/json"}
 
-def process_text_with_azure_openai(architecture_description: str) -> dict:
+def render_and_store(arch_json: dict, output_format, layout_direction: str, layout_engine: str = "auto",
+                     layout_timeout: Optional[float] = None, pinned_positions: Optional[dict] = None,
+                     normalization: Optional[dict] = None, raster_options: Optional[dict] = None):
     """
-    Process the natural language architecture description using Azure OpenAI.
-    Returns a structured JSON representation of the architecture.
+    Render a diagram in one or more formats from a single layout, store the layout
+    under a new diagram id and return ({format: bytes}, metadata).
+    arch_json is normalized first unless the normalization report of an earlier pass is given.
     """
-    if not AZURE_OPENAI_API_KEY or not AZURE_OPENAI_ENDPOINT:
-        # For demo purposes, return a sample JSON if no API key is available
-        return {
-            "diagram_label": "Sample Web App Architecture",
-            "resources": [
-                {
-                    "name": "Web App",
-                    "type": "Azure.WebApp",
-                    "attributes": {
-                        "location": "East US",
-                        "sku": "S1"
-                    }
-                },
-                {
-                    "name": "SQL Database",
-                    "type": "Azure.SQLDatabase",
-                    "attributes": {
-                        "location": "East US",
-                        "sku": "S2"
-                    }
-                }
-            ],
-            "relationships": [
-                {
-                    "source": "Web App",
-                    "target": "SQL Database",
-                    "type": "connects_to"
-                }
-            ],
-            "clusters": [
-                {
-                    "name": "Resource Group 1",
-                    "resources": ["Web App", "SQL Database"]
-                }
-            ]
-        }
-    
-    prompt = f"""
-    Analyze the following Azure architecture description and convert it into a structured JSON format.
-    Follow these guidelines:
-    
-    1. Identify Azure services, their names, and relevant attributes
-    2. Recognize relationships between these services
-    3. Understand grouping or clustering (e.g., resources within a resource group or subnet)
-    4. Output the extracted information in the following structured JSON format:
-    
-    {{
-      "diagram_label": "...",
-      "resources": [
-        {{
-          "name": "...",
-          "type": "Azure.[ResourceType]",
-          "attributes": {{
-            "location": "...",
-            "sku": "..."
-          }}
-        }}
-      ],
-      "relationships": [
-        {{
-          "source": "...",
-          "target": "...",
-          "type": "..."
-        }}
-      ],
-      "clusters": [
-        {{
-          "name": "...",
-          "resources": ["...", "..."]
-        }}
-      ]
-    }}
-    
-    Only include resources, relationships, and clusters that are explicitly mentioned or can be directly inferred from the description.
-    Use only valid Azure resource types prefixed with "Azure." for the "type" field.
-    Make sure all resource names used in relationships and clusters match exactly with the resource names defined.
-    
-    Architecture Description:
-    {architecture_description}
+    if normalization is None:
+        arch_json, normalization = normalize_architecture(arch_json)
+    # Runs in a render process when the executor is enabled, so concurrent renders use every core
+    artifacts, layout_report = render_executor.render(
+        arch_json, output_format, layout_direction, layout_engine, layout_timeout, pinned_positions,
+        normalize=False, raster_options=raster_options
+    )
+    layout_report["normalization"] = normalization
+    diagram_id = uuid.uuid4().hex
+    # Clients may call the server directly, so it prunes old layouts itself as well
+    layout_store.maybe_sweep_layouts()
+    layout_store.put_layout(diagram_id, arch_json, layout_report.pop("positions"))
+    logger.info(f"Generated diagram {diagram_id} ({layout_report['output_bytes']} bytes) with {layout_report['engine']} in {layout_report['layout_seconds']}s")
+    return artifacts, {"diagram_id": diagram_id, "formats": list(artifacts), "layout": layout_report}
+
+async def run_tool(function, *args):
     """
-    
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": AZURE_OPENAI_API_KEY
-    }
-    
-    body = {
-        "messages": [
-            {"role": "system", "content": "You are an AI assistant that extracts Azure architecture information from text descriptions and converts it to structured JSON."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 2000,
-        "temperature": 0.3
-    }
-    
-    # Get API version from env or use default
-    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")
+    Run a blocking tool function in a thread, so a resident server can serve other
+    clients meanwhile. A failure with an error code is reported with its code.
+    """
+    try:
+        return await anyio.to_thread.run_sync(function, *args)
+    except RenderLimitError as e:
+        raise Exception(tool_error_text(str(e), e.code))
+
+def check_artifact_transport(artifact_transport: str) -> None:
+    if artifact_transport not in ARTIFACT_TRANSPORTS:
+        raise Exception(f"Unknown artifact transport '{artifact_transport}'. Use one of: {', '.join(ARTIFACT_TRANSPORTS)}")
+
+def tool_result(artifacts: dict, metadata: dict, artifact_transport: str = "inline") -> list:
+    """
+    Tool result items: an image for png, webp and svg, an embedded resource for other formats, then the metadata JSON.
+    With the handle transport the outputs go to the artifact spool and the metadata lists their handles instead.
+    """
+    if artifact_transport == "handle":
+        metadata["artifact_handles"] = spool_artifacts(metadata["diagram_id"], artifacts)
+        return [json.dumps(metadata)]
+    contents = []
+    for output_format, data in artifacts.items():
+        if output_format in ("png", "webp", "svg"):
+            # Image base64-encodes raw bytes itself
+            contents.append(Image(data=data, format=output_format))
+        else:
+            contents.append(EmbeddedResource(type="resource", resource=BlobResourceContents(
+                uri=f"diagram://{metadata['diagram_id']}/{output_format}",
+                mimeType=ARTIFACT_MIME_TYPES[output_format],
+                blob=base64.b64encode(data).decode()
+            )))
+    contents.append(json.dumps(metadata))
+    return contents
+
+def rerender_from_previous(previous: dict, arch_json: dict, output_format, layout_direction: str,
+                           layout_timeout: Optional[float] = None, raster_options: Optional[dict] = None):
+    """Render arch_json as an edit of a stored diagram, pinning its unchanged nodes."""
+    # Normalize before diffing so renamed or merged resources are compared by their final names
+    arch_json, normalization = normalize_architecture(arch_json)
+    delta = diff_architectures(previous["arch_json"], arch_json)
+    # Unchanged nodes keep their previous positions so only the edited region moves
+    pinned = pinnable_positions(previous["positions"], delta, len(arch_json.get("resources", [])))
+    logger.info(f"Re-rendering with delta: {delta}")
+    artifacts, metadata = render_and_store(arch_json, output_format, layout_direction, "auto", layout_timeout, pinned,
+                                           normalization, raster_options)
+    metadata["delta"] = delta
+    metadata["incremental"] = pinned is not None
+    return artifacts, metadata
+
+def generate_diagram(architecture_description: str, output_format="png", layout_direction: str = "TB",
+                     layout_engine: str = "auto", layout_timeout: Optional[float] = None,
+                     raster_options: Optional[dict] = None):
+    """Extract an architecture from a description and render it; returns ({format: bytes}, metadata)."""
+    logger.info(f"Processing architecture description: {architecture_description[:100]}...")
     
     try:
-        response = requests.post(
-            f"{AZURE_OPENAI_ENDPOINT}/openai/deployments/{AZURE_OPENAI_DEPLOYMENT}/chat/completions?api-version={api_version}",
-            headers=headers,
-            json=body,
-            timeout=30  # Add a 30-second timeout
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Azure OpenAI API request failed: {response.text}")
-            raise Exception(f"Azure OpenAI API request failed: {response.text}")
+        # Reject unknown formats before paying for the extraction
+        output_format = parse_output_formats(output_format)
+        parse_raster_options(raster_options)
+        # Process the text with Azure OpenAI to get a structured JSON representation
+        arch_json, extraction = extract_architecture(architecture_description)
         
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
+        logger.info("Successfully processed architecture description")
         
-        # Extract JSON from the response
-        try:
-            # First attempt: try to parse the whole content as JSON
-            arch_json = json.loads(content)
-        except json.JSONDecodeError:
-            # Second attempt: try to extract JSON from the content
-            json_start = content.find('{')
-            json_end = content.rfind('}') + 1
-            if json_start >= 0 and json_end > 0:
-                arch_json = json.loads(content[json_start:json_end])
-            else:
-                raise Exception("Failed to extract JSON from Azure OpenAI response")
+        # Generate the diagram from the JSON
+        artifacts, metadata = render_and_store(arch_json, output_format, layout_direction, layout_engine,
+                                               layout_timeout, None, None, raster_options)
         
-        return arch_json
-    except requests.exceptions.Timeout:
-        logger.error("Azure OpenAI API request timed out")
-        raise Exception("Azure OpenAI API request timed out after 30 seconds")
+        metadata["extraction"] = extraction
+        return artifacts, metadata
+    except RenderLimitError:
+        # Keeps its type so that callers can tell a limit breach from other failures
+        raise
     except Exception as e:
-        logger.exception(f"Error calling Azure OpenAI API: {str(e)}")
-        raise Exception(f"Error calling Azure OpenAI API: {str(e)}")
+        # In case of an error, return a text error message
+        logger.exception(f"Error generating diagram: {str(e)}")
+        raise Exception(f"Error generating diagram: {str(e)}")
 
-def generate_diagram_from_json(arch_json: dict, output_format: str = "png", layout_direction: str = "TB") -> bytes:
-    """
-    Generate a diagram from the structured JSON representation of the architecture using diagrams.
-    Returns the diagram as bytes.
-    """
-    if not DIAGRAMS_AVAILABLE:
-        raise Exception("diagrams library is not available. Please install it.")
-    # Create a temporary file to save the diagram
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        diagram_path = os.path.join(tmpdirname, "diagram")
-        # Create the diagram
-        with Diagram(arch_json.get("diagram_label", "Azure Architecture"), 
-                    filename=diagram_path, 
-                    direction=layout_direction,
-                    outformat=output_format,
-                    show=False) as diagram:
-            # Dictionary to keep track of created nodes
-            nodes = {}
-            # Process clusters first
-            cluster_objects = {}
-            cluster_resource_mapping = {}
-            for cluster_info in arch_json.get("clusters", []):
-                cluster_name = cluster_info.get("name", "Cluster")
-                cluster = Cluster(cluster_name)
-                cluster_objects[cluster_name] = cluster
-                # Map resources to their clusters
-                for resource_name in cluster_info.get("resources", []):
-                    cluster_resource_mapping[resource_name] = cluster_name
-            # Create nodes for resources
-            for resource in arch_json.get("resources", []):
-                resource_name = resource.get("name", "Resource")
-                resource_type = resource.get("type", "Azure.WebApp")
-                # Get the diagram node class
-                node_class = AZURE_NODE_MAP.get(resource_type, AppServices)
-                # Create the node in the appropriate cluster or directly in the diagram
-                if resource_name in cluster_resource_mapping:
-                    cluster_name = cluster_resource_mapping[resource_name]
-                    with cluster_objects[cluster_name]:
-                        nodes[resource_name] = node_class(resource_name)
-                else:
-                    nodes[resource_name] = node_class(resource_name)
-            # Create relationships between nodes
-            for relationship in arch_json.get("relationships", []):
-                source_name = relationship.get("source")
-                target_name = relationship.get("target")
-                if source_name in nodes and target_name in nodes:
-                    nodes[source_name] >> nodes[target_name]
-        # Read the generated diagram file
-        output_path = f"{diagram_path}.{output_format}"
-        with open(output_path, "rb") as f:
-            diagram_bytes = f.read()
-        return diagram_bytes
+def update_diagram(previous_diagram_id: str, architecture_json: dict, output_format="png",
+                   layout_direction: str = "TB", layout_timeout: Optional[float] = None,
+                   raster_options: Optional[dict] = None):
+    """Re-render an edited architecture against a stored diagram; returns ({format: bytes}, metadata)."""
+    previous = layout_store.get_layout(previous_diagram_id)
+    if previous is None:
+        raise Exception(f"Unknown diagram id: {previous_diagram_id}")
+    
+    try:
+        logger.info(f"Updating diagram {previous_diagram_id}")
+        return rerender_from_previous(previous, architecture_json, output_format, layout_direction, layout_timeout,
+                                      raster_options)
+    except RenderLimitError:
+        raise
+    except Exception as e:
+        logger.exception(f"Error updating diagram: {str(e)}")
+        raise Exception(f"Error updating diagram: {str(e)}")
+
+def edit_diagram(previous_diagram_id: str, change_description: str, output_format="png",
+                 layout_direction: str = "TB", layout_timeout: Optional[float] = None,
+                 raster_options: Optional[dict] = None):
+    """Apply a natural language change to a stored diagram; returns ({format: bytes}, metadata)."""
+    previous = layout_store.get_layout(previous_diagram_id)
+    if previous is None:
+        raise Exception(f"Unknown diagram id: {previous_diagram_id}")
+    
+    try:
+        logger.info(f"Editing diagram {previous_diagram_id}: {change_description[:100]}...")
+        arch_json, patch = process_edit_with_azure_openai(previous["arch_json"], change_description)
+        artifacts, metadata = rerender_from_previous(previous, arch_json, output_format, layout_direction,
+                                                     layout_timeout, raster_options)
+        metadata["patch"] = patch
+        return artifacts, metadata
+    except RenderLimitError:
+        raise
+    except Exception as e:
+        logger.exception(f"Error editing diagram: {str(e)}")
+        raise Exception(f"Error editing diagram: {str(e)}")
 
 @mcp.tool()
 async def generate_azure_diagram_from_text(
     architecture_description: str,
-    output_format: str = "png",
-    layout_direction: str = "TB"
-) -> Image:
+    output_format: Union[str, List[str]] = "png",
+    layout_direction: str = "TB",
+    layout_engine: str = "auto",
+    layout_timeout: Optional[float] = None,
+    raster_options: Optional[dict] = None,
+    artifact_transport: str = "inline"
+) -> list:
     """
     Generate an Azure architecture diagram from a natural language description.
     
     Args:
         architecture_description: A natural language description of the Azure architecture.
-        output_format: The output format of the diagram (png or svg). Default: png.
+        output_format: The output format (png, webp, svg, pdf, dot, json-layout or geometry), or a list of them
+            to render from a single layout. geometry alone skips drawing and returns only coordinates. Default: png.
         layout_direction: The layout direction of the diagram (TB for top-to-bottom or LR for left-to-right). Default: TB.
+        layout_engine: Graphviz layout engine (auto, dot, neato, fdp or sfdp). auto picks one from the graph size. Default: auto.
+        layout_timeout: Layout time budget in seconds. Default: LAYOUT_TIMEOUT_SECONDS.
+        raster_options: PNG/WebP size and encoding: dpi, max_pixels, compress_level (0-9), quantize
+            (palette colours), webp_quality, or a preset (fast, balanced, small). Default: Graphviz output.
+        artifact_transport: inline returns the outputs in the result; handle writes them to the shared
+            artifact spool and returns only their handles, for clients on the same host. Default: inline.
     
     Returns:
-        An image of the generated diagram.
+        The diagram in each requested format (images for png and svg, embedded resources otherwise),
+        followed by JSON with the diagram id, a layout report and an extraction report
+        (source, prompt version and token counts).
     """
-    logger.info(f"Processing architecture description: {architecture_description[:100]}...")
+    check_artifact_transport(artifact_transport)
+    artifacts, metadata = await run_tool(
+        generate_diagram, architecture_description, output_format, layout_direction, layout_engine, layout_timeout,
+        raster_options
+    )
+    return tool_result(artifacts, metadata, artifact_transport)
+
+@mcp.tool()
+async def update_azure_diagram(
+    previous_diagram_id: str,
+    architecture_json: dict,
+    output_format: Union[str, List[str]] = "png",
+    layout_direction: str = "TB",
+    layout_timeout: Optional[float] = None,
+    raster_options: Optional[dict] = None,
+    artifact_transport: str = "inline"
+) -> list:
+    """
+    Re-render an edited architecture, reusing the layout of a previous diagram.
     
-    try:
-        # Process the text with Azure OpenAI to get a structured JSON representation
-        arch_json = process_text_with_azure_openai(architecture_description)
-        
-        logger.info("Successfully processed architecture description")
-        
-        # Generate the diagram from the JSON
-        diagram_bytes = generate_diagram_from_json(arch_json, output_format, layout_direction)
-        
-        logger.info(f"Generated diagram ({len(diagram_bytes)} bytes)")
-        
-        # Base64 encode the diagram bytes
-        diagram_data = base64.b64encode(diagram_bytes).decode('utf-8')
-        
-        logger.info("Returning image data")
-        
-        # Return the diagram as an image
-        return Image(data=diagram_data, format=output_format)
-    except Exception as e:
-        # In case of an error, return a text error message
-        logger.exception(f"Error generating diagram: {str(e)}")
-        raise Exception(f"Error generating diagram: {str(e)}")
+    Args:
+        previous_diagram_id: The diagram id returned when the previous version was generated.
+        architecture_json: The complete modified architecture JSON (diagram_label, resources, relationships, clusters).
+        output_format: The output format (png, webp, svg, pdf, dot, json-layout or geometry), or a list of them
+            to render from a single layout. geometry alone skips drawing and returns only coordinates. Default: png.
+        layout_direction: The layout direction used if a full layout is needed. Default: TB.
+        layout_timeout: Layout time budget in seconds. Default: LAYOUT_TIMEOUT_SECONDS.
+        raster_options: PNG/WebP size and encoding: dpi, max_pixels, compress_level (0-9), quantize
+            (palette colours), webp_quality, or a preset (fast, balanced, small). Default: Graphviz output.
+        artifact_transport: inline returns the outputs in the result; handle writes them to the shared
+            artifact spool and returns only their handles, for clients on the same host. Default: inline.
+    
+    Returns:
+        The updated diagram in each requested format, followed by JSON with the new diagram id,
+        the delta and a layout report.
+    """
+    check_artifact_transport(artifact_transport)
+    artifacts, metadata = await run_tool(
+        update_diagram, previous_diagram_id, architecture_json, output_format, layout_direction, layout_timeout,
+        raster_options
+    )
+    return tool_result(artifacts, metadata, artifact_transport)
+
+@mcp.tool()
+async def edit_azure_diagram_from_text(
+    previous_diagram_id: str,
+    change_description: str,
+    output_format: Union[str, List[str]] = "png",
+    layout_direction: str = "TB",
+    layout_timeout: Optional[float] = None,
+    raster_options: Optional[dict] = None,
+    artifact_transport: str = "inline"
+) -> list:
+    """
+    Apply a natural language change (e.g. "add a Redis cache in front of the database") to a previous diagram.
+    
+    Only the previous architecture JSON and the change text are sent to Azure OpenAI, which answers
+    with a JSON Patch that is applied locally, so an edit costs far fewer tokens than a full extraction.
+    
+    Args:
+        previous_diagram_id: The diagram id returned when the previous version was generated.
+        change_description: The change to make, in natural language.
+        output_format: The output format (png, webp, svg, pdf, dot, json-layout or geometry), or a list of them
+            to render from a single layout. geometry alone skips drawing and returns only coordinates. Default: png.
+        layout_direction: The layout direction used if a full layout is needed. Default: TB.
+        layout_timeout: Layout time budget in seconds. Default: LAYOUT_TIMEOUT_SECONDS.
+        raster_options: PNG/WebP size and encoding: dpi, max_pixels, compress_level (0-9), quantize
+            (palette colours), webp_quality, or a preset (fast, balanced, small). Default: Graphviz output.
+        artifact_transport: inline returns the outputs in the result; handle writes them to the shared
+            artifact spool and returns only their handles, for clients on the same host. Default: inline.
+    
+    Returns:
+        The updated diagram in each requested format, followed by JSON with the new diagram id,
+        the applied patch, the delta and a layout report.
+    """
+    check_artifact_transport(artifact_transport)
+    artifacts, metadata = await run_tool(
+        edit_diagram, previous_diagram_id, change_description, output_format, layout_direction, layout_timeout,
+        raster_options
+    )
+    return tool_result(artifacts, metadata, artifact_transport)
+
+def warm_renderers(use_processes: bool = True) -> None:
+    """Start the render processes, each with a warm Graphviz worker, or warm Graphviz workers in this process."""
+    if not use_processes:
+        render_executor.enabled = False
+    if render_executor.enabled:
+        logger.info(f"Started {render_executor.warm()} render process(es)")
+    else:
+        logger.info(f"Started {graphviz_pool.warm()} Graphviz worker(s)")
+
+def main(transport: str = MCP_TRANSPORT) -> None:
+    # Logged rather than printed: stdout carries the MCP messages of a stdio server
+    logger.info("Starting Azure Diagram Generator MCP Server...")
+    if transport == "sse":
+        # A resident server starts its render processes before the first request
+        warm_renderers()
+    else:
+        # A stdio server serves one client; starting render processes would cost more than it saves
+        render_executor.enabled = False
+    run_server(mcp, transport)
 
 if __name__ == "__main__":
-    print("Starting Azure Diagram Generator MCP Server...")
-    mcp.run(transport='stdio')
+    main()
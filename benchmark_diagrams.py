@@ -0,0 +1,314 @@
+"""
+Benchmarks for the diagram pipeline.
+
+Runs each benchmark on synthetic architectures of several sizes and prints a
+table of timings. Rendering benchmarks need Graphviz on the PATH.
+
+    python benchmark_diagrams.py                          # every benchmark
+    python benchmark_diagrams.py icons --sizes 10,50,200 --repeat 5
+    python benchmark_diagrams.py --json results.json      # keep results for comparison
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import logging
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from architecture_schema import ArchitectureValidationError, normalize_architecture
+from diagram_renderer import AZURE_NODE_MAP, build_diagram_source, render_diagram, render_diagram_formats, run_graphviz
+from graphviz_pool import graphviz_pool
+from icon_cache import PIL_AVAILABLE
+from render_executor import RenderExecutor
+from svg_optimizer import BROTLI_AVAILABLE, optimize_svg
+
+if BROTLI_AVAILABLE:
+    import brotli
+
+if PIL_AVAILABLE:
+    from PIL import Image as PILImage
+
+logger = logging.getLogger("benchmark_diagrams")
+
+
+def synthetic_architecture(node_count: int, seed: int = 0, nested: bool = False) -> dict:
+    """
+    An architecture with node_count resources, about 1.5 edges per node and clusters of 8.
+    With nested=True the clusters are grouped four to a parent, up to three levels deep.
+    """
+    rng = random.Random(seed)
+    resource_types = sorted(AZURE_NODE_MAP) or ["Azure.WebApp"]
+    names = [f"Resource {i}" for i in range(node_count)]
+    resources = [
+        {"name": name, "type": resource_types[i % len(resource_types)], "attributes": {}}
+        for i, name in enumerate(names)
+    ]
+    relationships = [
+        {"source": names[i - 1], "target": names[i], "type": "connects_to"} for i in range(1, node_count)
+    ]
+    for _ in range(node_count // 2):
+        source, target = rng.sample(names, 2) if node_count > 1 else (names[0], names[0])
+        relationships.append({"source": source, "target": target, "type": "calls"})
+    clusters = [
+        {"name": f"Group {i // 8}", "resources": names[i:i + 8]} for i in range(0, node_count, 8)
+    ]
+    if nested:
+        # Subnets inside VNets inside resource groups
+        for level, prefix in ((1, "VNet"), (2, "RG")):
+            children = [c for c in clusters if c["name"].startswith("Group" if level == 1 else "VNet")]
+            for i, child in enumerate(children):
+                child["parent"] = f"{prefix} {i // 4}"
+                if i % 4 == 0:
+                    clusters.append({"name": f"{prefix} {i // 4}", "resources": []})
+    return {
+        "diagram_label": f"Synthetic {node_count}",
+        "resources": resources,
+        "relationships": relationships,
+        "clusters": clusters
+    }
+
+
+def measure(fn, repeat: int) -> dict:
+    """Run fn repeat times and summarize the wall-clock seconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {
+        "min_ms": round(min(samples) * 1000, 2),
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2)
+    }
+
+
+def _icon_load(source: str) -> tuple:
+    """Bytes read and pixels decoded for the icons of a DOT source."""
+    # Graphviz loads each distinct image file once per render
+    images = set()
+    for line in source.splitlines():
+        start = line.find('image="')
+        if start != -1:
+            images.add(line[start + 7:line.index('"', start + 7)])
+    images = [path for path in images if os.path.exists(path)]
+    pixels = 0
+    if PIL_AVAILABLE:
+        for path in images:
+            with PILImage.open(path) as image:
+                pixels += image.size[0] * image.size[1]
+    return sum(os.path.getsize(path) for path in images), pixels
+
+
+def bench_icons(sizes, repeat, output_format):
+    """Render time and icon bytes read with the original icons versus the pre-resized icon cache."""
+    rows = []
+    for size in sizes:
+        arch = synthetic_architecture(size)
+        for use_icon_cache in (False, True):
+            source = build_diagram_source(arch, output_format, use_icon_cache=use_icon_cache)
+            icon_bytes, icon_pixels = _icon_load(source)
+            # Warm the cache and the OS page cache so only steady-state renders are timed
+            render_diagram(arch, output_format, use_icon_cache=use_icon_cache)
+            timing = measure(lambda: render_diagram(arch, output_format, use_icon_cache=use_icon_cache), repeat)
+            rows.append({
+                "benchmark": "icons",
+                "nodes": size,
+                "variant": "icon cache" if use_icon_cache else "package icons",
+                "icon_kb": round(icon_bytes / 1024, 1),
+                "icon_kpixels": round(icon_pixels / 1000),
+                **timing
+            })
+    return rows
+
+
+def bench_normalize(sizes, repeat, output_format):
+    """Cost of the validation and normalization stage, and of refusing an oversized input."""
+    rows = []
+    for size in sizes:
+        arch = synthetic_architecture(size)
+        rows.append({"benchmark": "normalize", "nodes": size, "variant": "valid",
+                     **measure(lambda: normalize_architecture(arch), repeat)})
+    oversized = synthetic_architecture(10)
+    oversized["relationships"] = oversized["relationships"] * (100000 // len(oversized["relationships"]) + 1)
+
+    def reject():
+        try:
+            normalize_architecture(oversized)
+        except ArchitectureValidationError:
+            return
+        raise Exception("Oversized architecture was not rejected")
+
+    for size in sizes:
+        arch = synthetic_architecture(size, nested=True)
+        rows.append({"benchmark": "normalize", "nodes": size, "variant": "nested clusters",
+                     **measure(lambda: normalize_architecture(arch), repeat)})
+    rows.append({"benchmark": "normalize", "nodes": 10, "variant": f"reject {len(oversized['relationships'])} edges",
+                 **measure(reject, repeat)})
+    return rows
+
+
+def bench_clusters(sizes, repeat, output_format):
+    """Time to build the DOT source with flat and nested clusters."""
+    rows = []
+    for size in sizes:
+        for nested in (False, True):
+            arch, _ = normalize_architecture(synthetic_architecture(size, nested=nested))
+            source = build_diagram_source(arch, output_format)
+            rows.append({
+                "benchmark": "clusters",
+                "nodes": size,
+                "variant": "nested" if nested else "flat",
+                "subgraphs": source.count("subgraph"),
+                "dot_kb": round(len(source) / 1024, 1),
+                **measure(lambda: build_diagram_source(arch, output_format), repeat)
+            })
+    return rows
+
+
+def bench_svg(sizes, repeat, output_format):
+    """SVG size as Graphviz writes it versus after icon deduplication, and the cost of optimizing."""
+    rows = []
+    for size in sizes:
+        arch, _ = normalize_architecture(synthetic_architecture(size))
+        raw = run_graphviz(build_diagram_source(arch), "dot", ["svg"], None)["svg"]
+        optimized, report = optimize_svg(raw)
+        rows.append({
+            "benchmark": "svg",
+            "nodes": size,
+            "variant": f"{report['icons']} icons",
+            "raw_kb": round(len(raw) / 1024, 1),
+            "optimized_kb": round(len(optimized) / 1024, 1),
+            "gzip_kb": round(len(gzip.compress(optimized, 9)) / 1024, 1),
+            "br_kb": round(len(brotli.compress(optimized)) / 1024, 1) if BROTLI_AVAILABLE else "",
+            **measure(lambda: optimize_svg(raw), repeat)
+        })
+    return rows
+
+
+# (label, output format, raster options) compared by the png benchmark
+RASTER_VARIANTS = [
+    ("graphviz", "png", {}),
+    ("preset fast", "png", {"preset": "fast"}),
+    ("preset small", "png", {"preset": "small"}),
+    ("max 1024px", "png", {"max_pixels": 1024}),
+    ("webp", "webp", {}),
+    ("150 dpi", "png", {"dpi": 150}),
+]
+
+
+def bench_png(sizes, repeat, output_format):
+    """Output size and end-to-end render time for each raster option set."""
+    rows = []
+    for size in sizes:
+        arch, _ = normalize_architecture(synthetic_architecture(size))
+        for label, raster_format, options in RASTER_VARIANTS:
+            def render():
+                return render_diagram_formats(arch, [raster_format], normalize=False, raster_options=options)
+            artifacts, report = render()
+            encoded = artifacts[raster_format]
+            rows.append({
+                "benchmark": "png",
+                "nodes": size,
+                "variant": label,
+                "kb": round(len(encoded) / 1024, 1),
+                # What the image costs on the base64/JSON path to the client
+                "base64_kb": round(len(encoded) * 4 / 3 / 1024, 1),
+                "encode_ms": round(report["raster"][raster_format].get("encode_seconds", 0) * 1000, 1),
+                **measure(render, repeat)
+            })
+    return rows
+
+
+def bench_graphviz(sizes, repeat, output_format):
+    """Layout and render time on a warm pool worker versus one dot process per render."""
+    rows = []
+    pool_enabled = graphviz_pool.enabled
+    try:
+        for size in sizes:
+            arch, _ = normalize_architecture(synthetic_architecture(size))
+            source = build_diagram_source(arch)
+            for use_pool in ([True, False] if pool_enabled else [False]):
+                graphviz_pool.enabled = use_pool
+                run_graphviz(source, "dot", [output_format], None)
+                rows.append({"benchmark": "graphviz", "nodes": size,
+                             "variant": "warm pool" if use_pool else "dot process",
+                             **measure(lambda: run_graphviz(source, "dot", [output_format], None), repeat)})
+    finally:
+        graphviz_pool.enabled = pool_enabled
+    return rows
+
+
+def bench_parallel(sizes, repeat, output_format):
+    """Render throughput with one render per core, in threads of this process versus render processes."""
+    rows = []
+    concurrency = os.cpu_count() or 1
+    executor = RenderExecutor(concurrency)
+    executor.warm()
+    try:
+        for size in sizes:
+            arch, _ = normalize_architecture(synthetic_architecture(size))
+            for variant, render in (("threads", lambda: render_diagram_formats(arch, [output_format], normalize=False)),
+                                    ("processes", lambda: executor.render(arch, [output_format], normalize=False))):
+                def batch():
+                    with ThreadPoolExecutor(concurrency) as threads:
+                        list(threads.map(lambda _: render(), range(concurrency)))
+                batch()
+                timing = measure(batch, repeat)
+                rows.append({"benchmark": "parallel", "nodes": size, "variant": variant,
+                             "renders_per_s": round(concurrency / (timing["median_ms"] / 1000), 1), **timing})
+    finally:
+        executor.shutdown()
+    return rows
+
+
+BENCHMARKS = {
+    "icons": bench_icons,
+    "normalize": bench_normalize,
+    "clusters": bench_clusters,
+    "svg": bench_svg,
+    "png": bench_png,
+    "graphviz": bench_graphviz,
+    "parallel": bench_parallel,
+}
+
+
+def print_table(rows: list) -> None:
+    if not rows:
+        return
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    widths = {c: max(len(c), *(len(str(row.get(c, ""))) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Diagram pipeline benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--sizes", default="10,50,200", help="Comma-separated node counts")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--format", default="png", help="Output format for rendering benchmarks")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = []
+    for name in args.benchmarks or list(BENCHMARKS):
+        try:
+            results.extend(BENCHMARKS[name](sizes, args.repeat, args.format))
+        except Exception as e:
+            logger.error(f"Benchmark {name} failed: {e}")
+            sys.exit(1)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
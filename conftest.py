@@ -0,0 +1,29 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from llm_router import Deployment
+from llm_stub_server import StubHandler
+
+# test_mcp_direct.py is a script that generates a diagram through a live MCP server, not a test module
+collect_ignore = ["test_mcp_direct.py"]
+
+
+@pytest.fixture
+def stub():
+    """Start stub Azure OpenAI endpoints; returns a Deployment for each."""
+    servers = []
+
+    def start(name: str, latency: float = 0.0, throttle: float = 0.0) -> Deployment:
+        handler = type(f"{name}Handler", (StubHandler,), {"latency": latency, "throttle": throttle,
+                                                         "log_message": lambda *args: None})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return Deployment(f"http://127.0.0.1:{server.server_port}", name, "key", "2024-10-21")
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,197 @@
+"""
+Execution backends for the API server.
+
+DIAGRAM_BACKEND chooses where the API server runs the diagram tools:
+
+- mcp: on the resident MCP server at MCP_SERVER_URL, or on a local stdio
+  server process per API worker when none is reachable, with the simplified
+  fallback server as a last resort for generation
+- inprocess: in the API worker itself, with warm Graphviz workers and no MCP
+  round trip or copy of the outputs
+- pool: in the API worker, with renders in preloaded render processes so
+  that concurrent renders use every core; unless RENDER_PROCESSES is set, the
+  cores are divided between the API workers
+
+API workers that call Azure OpenAI themselves (the inprocess and pool
+backends, and the local servers of the mcp backend) each get an equal share
+of the configured rate limits, so together they stay within the quota.
+
+Every backend returns the same payload as mcp_remote.parse_tool_result and
+raises ToolError, TimeoutError or BackendUnavailableError, so the API server
+does not depend on which one is configured.
+"""
+
+import os
+import logging
+import threading
+from typing import Optional
+
+import mcp_remote
+
+logger = logging.getLogger("diagram_backend")
+
+# mcp, inprocess or pool
+DIAGRAM_BACKEND = os.getenv("DIAGRAM_BACKEND", "mcp")
+# Seconds a tool call on the local MCP server process may take
+MCP_PROCESS_TIMEOUT = float(os.getenv("MCP_PROCESS_TIMEOUT", mcp_remote.MCP_TOOL_TIMEOUT))
+
+DIAGRAM_BACKENDS = ("mcp", "inprocess", "pool")
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ToolError(Exception):
+    """
+    Raised when a diagram tool ran and failed; calling it again would fail the same
+    way. code is the error code of the failure, if it has one (see mcp_remote.MCPToolError).
+    """
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class BackendUnavailableError(Exception):
+    """Raised when no server could run a diagram tool."""
+
+
+class MCPBackend:
+    """Tool calls over MCP: the resident server, then a local server process, then the fallback server."""
+
+    name = "mcp"
+
+    def __init__(self, server_url: Optional[str] = mcp_remote.MCP_SERVER_URL, workers: int = 1):
+        self.server_url = server_url
+        # Started on first use and kept for every later request of this worker. Every
+        # worker may start one, so each gets an equal share of the LLM rate limits
+        self.local_server = mcp_remote.MCPClient.for_script(os.path.join(SERVER_DIR, "azure_diagram_server_fixed.py"),
+                                                            {"LLM_QUOTA_SHARES": str(workers)})
+        self.fallback_server = mcp_remote.MCPClient.for_script(os.path.join(SERVER_DIR, "fallback_mcp_server_fixed.py"))
+
+    def start(self) -> None:
+        # Sessions are opened by the first tool call
+        pass
+
+    def call_tool(self, tool_name: str, arguments: dict) -> dict:
+        if self.server_url:
+            try:
+                logger.info(f"Calling {tool_name} on resident MCP server at {self.server_url}")
+                return mcp_remote.call_tool(self.server_url, tool_name,
+                                            {**arguments, "artifact_transport": mcp_remote.MCP_ARTIFACT_TRANSPORT})
+            except mcp_remote.MCPToolError as e:
+                # The tool ran and failed; the local server would fail the same way
+                raise ToolError(str(e), e.code)
+            except TimeoutError:
+                # Still running there; starting over on the local server would pay for it twice
+                raise
+            except mcp_remote.MCPConnectionError as e:
+                logger.warning(f"Resident MCP server call failed, using the local server process instead: {e}")
+        try:
+            # The local server always shares this host, so outputs come through the artifact spool
+            return self.local_server.call_tool(tool_name, {**arguments, "artifact_transport": "handle"},
+                                               MCP_PROCESS_TIMEOUT)
+        except mcp_remote.MCPToolError as e:
+            raise ToolError(str(e), e.code)
+        except TimeoutError:
+            raise TimeoutError(f"Diagram generation exceeded {MCP_PROCESS_TIMEOUT:.0f}s")
+        except mcp_remote.MCPConnectionError as e:
+            if tool_name != "generate_azure_diagram_from_text":
+                raise BackendUnavailableError(f"MCP server unavailable: {e}")
+            logger.warning(f"MCP server unavailable, falling back to the simplified server: {e}")
+        try:
+            # The simplified server draws a generic diagram without Azure OpenAI
+            fallback_arguments = {key: arguments[key] for key in ("architecture_description", "output_format", "layout_direction")}
+            if isinstance(fallback_arguments["output_format"], list):
+                # It renders one format only
+                fallback_arguments["output_format"] = fallback_arguments["output_format"][0]
+            return self.fallback_server.call_tool(tool_name, fallback_arguments, MCP_PROCESS_TIMEOUT)
+        except mcp_remote.MCPToolError as e:
+            raise ToolError(str(e), e.code)
+        except Exception as e:
+            logger.exception(f"Fallback MCP server failed: {e}")
+            raise BackendUnavailableError(f"Both MCP servers failed. Error: {e}")
+
+    def status(self) -> dict:
+        return {
+            "backend": self.name,
+            "resident_server": self.server_url,
+            "local_server": self.local_server.status(),
+            "fallback_server": self.fallback_server.status()
+        }
+
+    def close(self) -> None:
+        self.local_server.close()
+        self.fallback_server.close()
+
+
+class LocalBackend:
+    """Tool calls in the API worker process, rendering in render processes when use_processes is set."""
+
+    # Blocking function of the MCP server module behind each tool
+    TOOL_FUNCTIONS = {
+        "generate_azure_diagram_from_text": "generate_diagram",
+        "update_azure_diagram": "update_diagram",
+        "edit_azure_diagram_from_text": "edit_diagram"
+    }
+
+    def __init__(self, use_processes: bool = False, workers: int = 1):
+        self.name = "pool" if use_processes else "inprocess"
+        self.use_processes = use_processes
+        self.workers = workers
+        self._server = None
+        self._lock = threading.Lock()
+
+    def _get_server(self):
+        with self._lock:
+            if self._server is None:
+                # Imported on first use: the server module loads the diagrams library and the extractor
+                import azure_diagram_server_fixed
+                from llm_router import router
+                from render_executor import render_executor
+                # Every API worker runs its own limiters against the same deployments
+                router.share_quota(self.workers)
+                if self.use_processes and not os.getenv("RENDER_PROCESSES"):
+                    # Every API worker has its own render processes; together they get one per core
+                    render_executor.processes = max(1, (os.cpu_count() or 1) // self.workers)
+                azure_diagram_server_fixed.warm_renderers(self.use_processes)
+                self._server = azure_diagram_server_fixed
+            return self._server
+
+    def start(self) -> None:
+        """Load the renderer and start its workers before the first request."""
+        self._get_server()
+
+    def call_tool(self, tool_name: str, arguments: dict) -> dict:
+        tool = getattr(self._get_server(), self.TOOL_FUNCTIONS[tool_name])
+        try:
+            artifacts, metadata = tool(**arguments)
+        except Exception as e:
+            raise ToolError(str(e), getattr(e, "code", None))
+        return mcp_remote.artifact_payload(metadata, artifacts)
+
+    def status(self) -> dict:
+        from render_executor import render_executor
+        from graphviz_pool import graphviz_pool
+        from llm_router import router
+        return {
+            "backend": self.name,
+            "loaded": self._server is not None,
+            "render_executor": render_executor.status(),
+            "graphviz_pool": graphviz_pool.status(),
+            # Rate limit queue waits and throttling of the Azure OpenAI deployments this worker calls
+            "llm_deployments": router.status()
+        }
+
+    def close(self) -> None:
+        if self._server is not None:
+            from render_executor import render_executor
+            render_executor.shutdown()
+
+
+def create_backend(name: str = DIAGRAM_BACKEND, workers: int = 1):
+    """The execution backend called name, one of DIAGRAM_BACKENDS, for one of workers API worker processes."""
+    if name not in DIAGRAM_BACKENDS:
+        raise Exception(f"Unknown diagram backend '{name}'. Use one of: {', '.join(DIAGRAM_BACKENDS)}")
+    if name == "mcp":
+        return MCPBackend(workers=workers)
+    return LocalBackend(use_processes=name == "pool", workers=workers)
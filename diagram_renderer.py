@@ -0,0 +1,531 @@
+"""
+Diagram rendering shared by the Azure diagram MCP servers.
+
+The architecture JSON is turned into a Graphviz graph with the diagrams library,
+but the layout itself is run here rather than in Diagram.__exit__ so that the
+layout engine can be chosen from the graph size and the Graphviz process can be
+bounded by a time budget.
+"""
+
+import os
+import json
+import time
+import shlex
+import shutil
+import hashlib
+import logging
+import tempfile
+import subprocess
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+from architecture_schema import normalize_architecture
+from graphviz_pool import GraphvizPoolError, GraphvizTimeoutError, graphviz_pool
+from render_limits import RenderLimitError, check_output_size, describe_exit, is_limit_exit, limit_child_process
+from icon_cache import ICON_CACHE_ENABLED, icon_cache
+from icon_registry import icon_path_for, known_resource_types, node_class_for
+from raster_encoder import RASTER_DPI, encode_raster, icon_pixels_for, parse_raster_options
+from svg_optimizer import SVG_OPTIMIZE, optimize_svg
+
+logger = logging.getLogger("diagram_renderer")
+
+# Try to import rsaz_diagrams, but handle import errors gracefully
+try:
+    from diagrams import Diagram, Cluster, setdiagram
+    DIAGRAMS_AVAILABLE = True
+except ImportError as e:
+    logger.error(f"Failed to import diagrams library: {e}")
+    logger.error("Make sure diagrams/rsaz-diagrams and Graphviz are installed and in your PATH.")
+    DIAGRAMS_AVAILABLE = False
+
+
+class _LazyNodeMap(Mapping):
+    """Resource type -> diagrams node class, importing each class on first access."""
+
+    def __init__(self, resource_types: List[str]):
+        self._resource_types = resource_types
+
+    def __getitem__(self, resource_type: str):
+        if resource_type not in self._resource_types:
+            raise KeyError(resource_type)
+        return node_class_for(resource_type)
+
+    def __iter__(self):
+        return iter(self._resource_types)
+
+    def __len__(self):
+        return len(self._resource_types)
+
+
+# Map Azure resource types to diagrams library components. Other types are
+# resolved by alias or fuzzy match through the icon registry.
+AZURE_NODE_MAP = _LazyNodeMap(known_resource_types()) if DIAGRAMS_AVAILABLE else {}
+
+# Graphviz executable; the layout engine is selected with -K
+GRAPHVIZ_DOT = os.getenv("GRAPHVIZ_DOT", "dot")
+
+# Graphs up to these sizes use the layered dot layout; larger ones switch to
+# force-directed engines, which scale far better in time and memory
+LAYOUT_DOT_MAX_NODES = int(os.getenv("LAYOUT_DOT_MAX_NODES", 80))
+LAYOUT_DOT_MAX_EDGES = int(os.getenv("LAYOUT_DOT_MAX_EDGES", 160))
+LAYOUT_SFDP_MIN_NODES = int(os.getenv("LAYOUT_SFDP_MIN_NODES", 300))
+
+# Default wall-clock budget for one layout, in seconds
+LAYOUT_TIMEOUT_SECONDS = float(os.getenv("LAYOUT_TIMEOUT_SECONDS", 60))
+
+LAYOUT_ENGINES = ("auto", "dot", "neato", "fdp", "sfdp")
+
+# Formats one render can emit, mapped to the Graphviz -T format producing them.
+# "dot" is the laid-out DOT source and "json-layout" the layout as Graphviz JSON.
+# "geometry" is a compact summary of node, cluster and edge coordinates for
+# clients that draw the diagram themselves. WebP is encoded from Graphviz's PNG.
+OUTPUT_FORMATS = {"png": "png", "webp": "png", "svg": "svg", "pdf": "pdf", "dot": "dot", "json-layout": "json",
+                  "geometry": "json0"}
+RASTER_FORMATS = {"png", "webp"}
+# Graphviz scales vector output by dpi as well, so a custom dpi is only applied
+# to renders without them
+VECTOR_FORMATS = {"svg", "pdf"}
+
+# Formats that need only coordinates; when nothing else is requested the icons
+# are left out of the graph, as nodes have a fixed size and nothing is drawn
+LAYOUT_ONLY_FORMATS = {"geometry"}
+
+# An incremental render pins the unchanged nodes of the previous layout; when
+# more than this share of the resources changed a full layout is cheaper
+INCREMENTAL_MAX_CHANGE_RATIO = float(os.getenv("INCREMENTAL_MAX_CHANGE_RATIO", 0.5))
+
+# Graph attributes applied on top of the diagrams defaults for each engine.
+# Orthogonal edge routing is the dominant cost on big graphs, so the
+# force-directed engines use straight splines and remove node overlaps.
+_ENGINE_GRAPH_ATTRS = {
+    "dot": {},
+    "neato": {"overlap": "prism", "splines": "true", "sep": "+20"},
+    "fdp": {"overlap": "prism", "splines": "true", "sep": "+20"},
+    "sfdp": {"overlap": "prism", "splines": "line", "sep": "+20", "beautify": "true"},
+}
+
+
+class LayoutTimeoutError(Exception):
+    """Raised when Graphviz does not finish a layout within its time budget."""
+
+
+if DIAGRAMS_AVAILABLE:
+    class _LayoutDiagram(Diagram):
+        """Diagram that leaves rendering to run_graphviz instead of rendering on exit."""
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            setdiagram(None)
+
+
+def choose_layout_engine(node_count: int, edge_count: int, cluster_count: int = 0) -> str:
+    """Pick a Graphviz layout engine for a graph of the given size."""
+    if node_count <= LAYOUT_DOT_MAX_NODES and edge_count <= LAYOUT_DOT_MAX_EDGES:
+        return "dot"
+    if node_count >= LAYOUT_SFDP_MIN_NODES:
+        return "sfdp"
+    # neato ignores clusters; fdp draws them at a somewhat higher cost
+    return "fdp" if cluster_count else "neato"
+
+
+def node_id_for(resource_name: str) -> str:
+    """Stable Graphviz node id for a resource, so layouts can be matched across renders."""
+    return "res_" + hashlib.sha1(resource_name.encode("utf-8")).hexdigest()[:16]
+
+
+def _remaining_budget(budget: float, started: float, engine: str) -> float:
+    """Seconds of the layout budget left since started; raises LayoutTimeoutError when none are."""
+    remaining = budget - (time.monotonic() - started)
+    if remaining <= 0:
+        # Starting Graphviz with no time left would only kill it, or a pool worker, straight away
+        raise LayoutTimeoutError(f"Graphviz {engine} layout exceeded {budget:.1f}s before it started")
+    return remaining
+
+
+def run_graphviz(source: str, engine: str, output_formats: List[str], timeout: Optional[float]) -> Dict[str, bytes]:
+    """
+    Lay out DOT source once and emit it in every requested format, killing
+    Graphviz if it exceeds timeout. Returns the output bytes keyed by format.
+    Renders run on a warm worker of the Graphviz pool when it is available and
+    fall back to one dot process per render otherwise. Both run under the
+    limits of render_limits and raise RenderLimitError when a render breaks one.
+    """
+    if graphviz_pool.enabled:
+        try:
+            return graphviz_pool.render(source, engine, output_formats, timeout)
+        except GraphvizTimeoutError as e:
+            raise LayoutTimeoutError(str(e))
+        except GraphvizPoolError as e:
+            logger.warning(f"Graphviz pool could not render, running {GRAPHVIZ_DOT} instead: {e}")
+    if shutil.which(GRAPHVIZ_DOT) is None:
+        raise Exception(f"Graphviz executable '{GRAPHVIZ_DOT}' not found. Make sure Graphviz is installed and in your PATH.")
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        command = [GRAPHVIZ_DOT, f"-K{engine}"]
+        for output_format in output_formats:
+            command += [f"-T{output_format}", "-o", os.path.join(tmpdirname, f"diagram.{output_format}")]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # dot does no work until it has read its input, so the limits are in place before the layout
+        limit_child_process(process.pid)
+        try:
+            _, stderr = process.communicate(source.encode("utf-8"), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise LayoutTimeoutError(f"Graphviz {engine} layout exceeded {timeout:.1f}s")
+        if process.returncode != 0:
+            stderr = stderr.decode('utf-8', 'replace').strip()
+            if is_limit_exit(process.returncode, stderr):
+                raise RenderLimitError(describe_exit(process.returncode, stderr))
+            raise Exception(f"Graphviz {engine} failed: {stderr or describe_exit(process.returncode)}")
+        outputs = {}
+        for output_format in output_formats:
+            path = os.path.join(tmpdirname, f"diagram.{output_format}")
+            check_output_size(output_format, os.path.getsize(path))
+            with open(path, "rb") as f:
+                outputs[output_format] = f.read()
+        return outputs
+
+
+def parse_plain_positions(plain_output: bytes) -> Dict[str, Tuple[float, float]]:
+    """Read node centre positions (in inches) from Graphviz -Tplain output, keyed by node id."""
+    positions = {}
+    for line in plain_output.decode("utf-8", "replace").splitlines():
+        if not line.startswith("node "):
+            continue
+        fields = shlex.split(line)
+        positions[fields[1]] = (float(fields[2]), float(fields[3]))
+    return positions
+
+
+def parse_output_formats(output_format) -> List[str]:
+    """
+    Accept a format name, a comma-separated list of names or a list of names and
+    return the distinct formats in the order given.
+    """
+    if isinstance(output_format, str):
+        output_format = output_format.split(",")
+    formats = list(dict.fromkeys(f.strip().lower() for f in output_format if f and f.strip()))
+    if not formats:
+        raise Exception("No output format requested")
+    unknown = [f for f in formats if f not in OUTPUT_FORMATS]
+    if unknown:
+        raise Exception(f"Unknown output format '{unknown[0]}'. Use one or more of: {', '.join(OUTPUT_FORMATS)}")
+    return formats
+
+
+def _points(value: str) -> List[float]:
+    return [float(v) for v in value.split(",")]
+
+
+def layout_geometry(graphviz_json: bytes, arch_json: dict) -> bytes:
+    """
+    Reduce Graphviz json0 output to the geometry a client needs to draw the diagram:
+    node boxes, cluster boxes and edge splines in points, with the origin at the
+    top left like a browser canvas.
+    """
+    graph = json.loads(graphviz_json)
+    _, _, width, height = _points(graph.get("bb", "0,0,0,0"))
+
+    def flip(x, y):
+        return [round(x, 1), round(height - y, 1)]
+
+    resources = {node_id_for(r.get("name", "Resource")): r for r in arch_json.get("resources", [])}
+    cluster_parents = {f"cluster_{c.get('name')}": c.get("parent") for c in arch_json.get("clusters", [])}
+    relationship_types = {}
+    for relationship in arch_json.get("relationships", []):
+        relationship_types.setdefault((relationship.get("source"), relationship.get("target")), relationship.get("type"))
+
+    nodes, clusters, names = [], [], {}
+    for obj in graph.get("objects", []):
+        if obj.get("name") in cluster_parents and "bb" in obj:
+            x0, y0, x1, y1 = _points(obj["bb"])
+            clusters.append({"name": obj["name"][len("cluster_"):], "parent": cluster_parents[obj["name"]],
+                             "x": round(x0, 1), "y": round(height - y1, 1),
+                             "width": round(x1 - x0, 1), "height": round(y1 - y0, 1)})
+        elif obj.get("name") in resources and "pos" in obj:
+            resource = resources[obj["name"]]
+            names[obj["_gvid"]] = resource.get("name")
+            x, y = _points(obj["pos"])
+            nodes.append({"id": obj["name"], "name": resource.get("name"), "type": resource.get("type"),
+                          "icon": icon_path_for(resource.get("type", "Azure.WebApp")),
+                          "x": round(x, 1), "y": round(height - y, 1),
+                          # Graphviz gives node sizes in inches
+                          "width": round(float(obj.get("width", 0)) * 72, 1),
+                          "height": round(float(obj.get("height", 0)) * 72, 1)})
+
+    edges = []
+    for edge in graph.get("edges", []):
+        source, target = names.get(edge.get("tail")), names.get(edge.get("head"))
+        if source is None or target is None:
+            continue
+        points, arrow = [], None
+        # Spline syntax: optional "e,x,y" arrow tip and "s,x,y" start, then the control points
+        for token in edge.get("pos", "").split():
+            if token.startswith("e,"):
+                arrow = flip(*_points(token[2:]))
+            elif not token.startswith("s,"):
+                points.append(flip(*_points(token)))
+        edges.append({"source": source, "target": target, "type": relationship_types.get((source, target)),
+                      "points": points, "arrow": arrow})
+
+    geometry = {"units": "pt", "width": round(width, 1), "height": round(height, 1),
+                "nodes": nodes, "clusters": clusters, "edges": edges}
+    return json.dumps(geometry, separators=(",", ":")).encode("utf-8")
+
+
+def diff_architectures(previous: dict, current: dict) -> dict:
+    """Compute added, removed and changed resources, relationships and clusters."""
+    def resources(arch):
+        return {r.get("name"): r.get("type") for r in arch.get("resources", [])}
+
+    def relationships(arch):
+        return {(r.get("source"), r.get("target"), r.get("type")) for r in arch.get("relationships", [])}
+
+    def clusters(arch):
+        return {c.get("name"): (c.get("parent"), frozenset(c.get("resources", []))) for c in arch.get("clusters", [])}
+
+    def cluster_of(cluster_map):
+        return {name: cluster for cluster, (_, members) in cluster_map.items() for name in members}
+
+    old_resources, new_resources = resources(previous), resources(current)
+    old_relationships, new_relationships = relationships(previous), relationships(current)
+    old_clusters, new_clusters = clusters(previous), clusters(current)
+    old_membership, new_membership = cluster_of(old_clusters), cluster_of(new_clusters)
+    return {
+        "added_resources": sorted(set(new_resources) - set(old_resources)),
+        "removed_resources": sorted(set(old_resources) - set(new_resources)),
+        "changed_resources": sorted(name for name in set(old_resources) & set(new_resources)
+                                    if old_resources[name] != new_resources[name]),
+        "moved_resources": sorted(name for name in set(old_resources) & set(new_resources)
+                                  if old_membership.get(name) != new_membership.get(name)),
+        "added_relationships": [list(r) for r in sorted(new_relationships - old_relationships, key=str)],
+        "removed_relationships": [list(r) for r in sorted(old_relationships - new_relationships, key=str)],
+        "added_clusters": sorted(set(new_clusters) - set(old_clusters)),
+        "removed_clusters": sorted(set(old_clusters) - set(new_clusters)),
+        "changed_clusters": sorted(name for name in set(old_clusters) & set(new_clusters)
+                                   if old_clusters[name] != new_clusters[name]),
+    }
+
+
+def pinnable_positions(previous_positions: Dict[str, Tuple[float, float]], delta: dict,
+                       resource_count: int) -> Optional[Dict[str, Tuple[float, float]]]:
+    """
+    Return the previous positions that can be pinned for an incremental render,
+    or None when the edit is too large for the previous layout to be worth reusing.
+    """
+    if not previous_positions or not resource_count:
+        return None
+    # Resources that moved between clusters have to be placed again as well
+    changed = set(delta["added_resources"]) | set(delta["changed_resources"]) | set(delta["moved_resources"])
+    if changed and len(changed) / resource_count > INCREMENTAL_MAX_CHANGE_RATIO:
+        return None
+    removed = set(delta["removed_resources"])
+    return {name: pos for name, pos in previous_positions.items() if name not in changed and name not in removed}
+
+
+def build_diagram_source(arch_json: dict, output_format: str = "png", layout_direction: str = "TB",
+                         graph_attr: Optional[dict] = None,
+                         pinned_positions: Optional[Dict[str, Tuple[float, float]]] = None,
+                         use_icon_cache: bool = ICON_CACHE_ENABLED, draw_icons: bool = True,
+                         icon_pixels: Optional[int] = None) -> str:
+    """
+    Build the Graphviz DOT source for an architecture without rendering it.
+    pinned_positions maps resource names to fixed (x, y) positions in inches.
+    With use_icon_cache the nodes point at pre-resized icons in the icon cache,
+    icon_pixels wide (the cache default when None); without draw_icons they
+    have no image at all, for layout-only output.
+    """
+    pinned_positions = pinned_positions or {}
+    if not DIAGRAMS_AVAILABLE:
+        raise Exception("diagrams library is not available. Please install it.")
+    with _LayoutDiagram(arch_json.get("diagram_label", "Azure Architecture"),
+                        filename="diagram",
+                        direction=layout_direction,
+                        outformat=output_format,
+                        show=False,
+                        graph_attr=graph_attr) as diagram:
+        # Dictionary to keep track of created nodes
+        nodes = {}
+
+        def add_node(resource):
+            resource_name = resource.get("name", "Resource")
+            resource_type = resource.get("type", "Azure.WebApp")
+            # Get the diagram node class; only its module is imported
+            node_class = node_class_for(resource_type)
+            node_attrs = {}
+            if not draw_icons:
+                node_attrs["image"] = ""
+            elif use_icon_cache and node_class._icon:
+                node_attrs["image"] = icon_cache.path_for(f"{node_class._icon_dir}/{node_class._icon}", icon_pixels)
+            if resource_name in pinned_positions:
+                x, y = pinned_positions[resource_name]
+                node_attrs["pos"] = f"{x},{y}!"
+            nodes[resource_name] = node_class(resource_name, nodeid=node_id_for(resource_name), **node_attrs)
+
+        # Index clusters and resources once. Each cluster context is then entered
+        # exactly once, inside its parent's, with all of its resources and child
+        # clusters; re-entering a Cluster re-emits its whole subgraph.
+        cluster_names = {cluster_info.get("name", "Cluster") for cluster_info in arch_json.get("clusters", [])}
+        child_clusters = {}
+        cluster_of = {}
+        for cluster_info in arch_json.get("clusters", []):
+            cluster_name = cluster_info.get("name", "Cluster")
+            parent = cluster_info.get("parent")
+            child_clusters.setdefault(parent if parent in cluster_names else None, []).append(cluster_name)
+            for resource_name in cluster_info.get("resources", []):
+                cluster_of.setdefault(resource_name, cluster_name)
+        cluster_resources = {}
+        for resource in arch_json.get("resources", []):
+            cluster_resources.setdefault(cluster_of.get(resource.get("name", "Resource")), []).append(resource)
+
+        entered = set()
+
+        def add_cluster(cluster_name):
+            if cluster_name in entered:
+                return
+            entered.add(cluster_name)
+            with Cluster(cluster_name):
+                for resource in cluster_resources.get(cluster_name, []):
+                    add_node(resource)
+                for child in child_clusters.get(cluster_name, []):
+                    add_cluster(child)
+
+        for resource in cluster_resources.get(None, []):
+            add_node(resource)
+        for cluster_name in child_clusters.get(None, []):
+            add_cluster(cluster_name)
+        # Create relationships between nodes
+        for relationship in arch_json.get("relationships", []):
+            source_name = relationship.get("source")
+            target_name = relationship.get("target")
+            if source_name in nodes and target_name in nodes:
+                nodes[source_name] >> nodes[target_name]
+    return diagram.dot.source
+
+
+def render_diagram_formats(arch_json: dict, output_formats: List[str], layout_direction: str = "TB",
+                           layout_engine: str = "auto", layout_timeout: Optional[float] = None,
+                           pinned_positions: Optional[Dict[str, Tuple[float, float]]] = None,
+                           use_icon_cache: bool = ICON_CACHE_ENABLED, normalize: bool = True,
+                           raster_options: Optional[dict] = None) -> Tuple[Dict[str, bytes], dict]:
+    """
+    Lay out an architecture once and emit it in every requested output format.
+    Returns the output bytes keyed by format and a layout report (engine, graph
+    size, seconds, and the node positions keyed by resource name for later
+    incremental renders). When pinned_positions is given those nodes keep their
+    place and only the remaining nodes are laid out. The architecture is
+    normalized first unless normalize is False because the caller already did.
+    raster_options (see raster_encoder) set the dpi, size and encoding of png
+    and webp output.
+    """
+    output_formats = parse_output_formats(output_formats)
+    raster_options = parse_raster_options(raster_options)
+    normalization = None
+    if normalize:
+        arch_json, normalization = normalize_architecture(arch_json)
+    if layout_engine not in LAYOUT_ENGINES:
+        raise Exception(f"Unknown layout engine '{layout_engine}'. Use one of: {', '.join(LAYOUT_ENGINES)}")
+    budget = layout_timeout if layout_timeout is not None else LAYOUT_TIMEOUT_SECONDS
+    node_count = len(arch_json.get("resources", []))
+    edge_count = len(arch_json.get("relationships", []))
+    cluster_count = len(arch_json.get("clusters", []))
+    engine = layout_engine
+    if pinned_positions:
+        # Only the force-directed engines honour pinned positions; fdp also draws clusters
+        engine = "fdp" if cluster_count else "neato"
+    elif engine == "auto":
+        engine = choose_layout_engine(node_count, edge_count, cluster_count)
+
+    report = {
+        "requested_engine": layout_engine,
+        "engine": engine,
+        "nodes": node_count,
+        "edges": edge_count,
+        "clusters": cluster_count,
+        "pinned_nodes": len(pinned_positions or {}),
+        "budget_seconds": budget,
+        "fallback": False,
+    }
+    if normalization is not None:
+        report["normalization"] = normalization
+    # Every format is written from the same layout; the plain output carries
+    # node positions without a second layout pass
+    graphviz_formats = list(dict.fromkeys([OUTPUT_FORMATS[f] for f in output_formats] + ["plain"]))
+    draw_icons = not set(output_formats) <= LAYOUT_ONLY_FORMATS
+    report["layout_only"] = not draw_icons
+    graph_attr = dict(_ENGINE_GRAPH_ATTRS[engine])
+    icon_pixels = None
+    if RASTER_FORMATS & set(output_formats):
+        dpi = raster_options["dpi"]
+        if dpi != RASTER_DPI and VECTOR_FORMATS & set(output_formats):
+            logger.warning(f"dpi {dpi} ignored because vector formats are rendered from the same layout")
+            dpi = raster_options["dpi"] = RASTER_DPI
+        if dpi != RASTER_DPI:
+            graph_attr["dpi"] = str(dpi)
+            # Icons are resized for the resolution they are drawn at
+            icon_pixels = icon_pixels_for(dpi)
+    # The diagrams outformat is never used because run_graphviz does the rendering
+    started = time.monotonic()
+    source = build_diagram_source(arch_json, "png", layout_direction,
+                                  graph_attr, pinned_positions, use_icon_cache, draw_icons, icon_pixels)
+    report["build_seconds"] = round(time.monotonic() - started, 4)
+    try:
+        outputs = run_graphviz(source, engine, graphviz_formats, _remaining_budget(budget, started, engine))
+    except LayoutTimeoutError:
+        # An automatically chosen layered layout may blow its budget on a dense
+        # graph; retry once with sfdp in whatever budget remains
+        remaining = budget - (time.monotonic() - started)
+        if layout_engine != "auto" or engine == "sfdp" or remaining <= 0:
+            raise
+        logger.warning(f"{engine} layout exceeded its budget, retrying with sfdp ({remaining:.1f}s left)")
+        engine = "sfdp"
+        report.update(engine=engine, fallback=True, pinned_nodes=0)
+        graph_attr = {**_ENGINE_GRAPH_ATTRS[engine], **({"dpi": graph_attr["dpi"]} if "dpi" in graph_attr else {})}
+        source = build_diagram_source(arch_json, "png", layout_direction, graph_attr,
+                                      use_icon_cache=use_icon_cache, draw_icons=draw_icons, icon_pixels=icon_pixels)
+        outputs = run_graphviz(source, engine, graphviz_formats, _remaining_budget(budget, started, engine))
+    report["layout_seconds"] = round(time.monotonic() - started - report["build_seconds"], 4)
+    artifacts = {f: outputs[OUTPUT_FORMATS[f]] for f in output_formats}
+    if "geometry" in artifacts:
+        artifacts["geometry"] = layout_geometry(artifacts["geometry"], arch_json)
+    for output_format in RASTER_FORMATS & set(artifacts):
+        artifacts[output_format], report.setdefault("raster", {})[output_format] = encode_raster(
+            outputs["png"], output_format, raster_options
+        )
+    if "svg" in artifacts and SVG_OPTIMIZE:
+        # Embed each icon once so the SVG is self-contained and small
+        artifacts["svg"], report["svg"] = optimize_svg(artifacts["svg"])
+    report["output_bytes"] = {f: len(data) for f, data in artifacts.items()}
+    logger.info(f"Layout report: {report}")
+    node_positions = parse_plain_positions(outputs["plain"])
+    report["positions"] = {
+        resource.get("name"): node_positions[node_id_for(resource.get("name", "Resource"))]
+        for resource in arch_json.get("resources", [])
+        if node_id_for(resource.get("name", "Resource")) in node_positions
+    }
+    return artifacts, report
+
+
+def render_diagram(arch_json: dict, output_format: str = "png", layout_direction: str = "TB",
+                   layout_engine: str = "auto", layout_timeout: Optional[float] = None,
+                   pinned_positions: Optional[Dict[str, Tuple[float, float]]] = None,
+                   use_icon_cache: bool = ICON_CACHE_ENABLED, normalize: bool = True,
+                   raster_options: Optional[dict] = None) -> Tuple[bytes, dict]:
+    """
+    Render an architecture in a single output format and report what the layout cost.
+    Returns the diagram bytes and the layout report of render_diagram_formats.
+    """
+    artifacts, report = render_diagram_formats(arch_json, [output_format], layout_direction, layout_engine,
+                                               layout_timeout, pinned_positions, use_icon_cache, normalize,
+                                               raster_options)
+    return next(iter(artifacts.values())), report
+
+
+def generate_diagram_from_json(arch_json: dict, output_format: str = "png", layout_direction: str = "TB",
+                               raster_options: Optional[dict] = None) -> bytes:
+    """
+    Generate a diagram from the structured JSON representation of the architecture using diagrams.
+    Returns the diagram as bytes; output_format="geometry" returns only the layout
+    coordinates as JSON, without drawing anything.
+    """
+    diagram_bytes, _ = render_diagram(arch_json, output_format, layout_direction, raster_options=raster_options)
+    return diagram_bytes
@@ -6,6 +6,11 @@ set -e
 # Function to cleanup on exit
 cleanup() {
     echo "Shutting down services..."
+    # Let the API server drain in-flight requests before the MCP server goes away
+    if [ -n "$API_PID" ]; then
+        kill -TERM "$API_PID" 2>/dev/null || true
+        wait "$API_PID" 2>/dev/null || true
+    fi
     if [ -n "$MCP_PID" ]; then
         kill -TERM "$MCP_PID" 2>/dev/null || true
     fi
@@ -18,14 +23,30 @@ trap cleanup SIGTERM SIGINT
 echo "Starting Azure Architecture Diagram Generator..."
 echo "Deployment mode: ${DEPLOYMENT_MODE:-development}"
 
-# Start the MCP server in the background
+# Use every core the container is allowed unless API_WORKERS is set explicitly
+if [ -z "$API_WORKERS" ] && [ "${DEPLOYMENT_MODE:-development}" = "production" ]; then
+    export API_WORKERS=$(nproc)
+fi
+echo "API workers: ${API_WORKERS:-1}"
+
+# Start the MCP server in the background as a resident SSE server that the
+# API server workers send their tool calls to
+export MCP_TRANSPORT=sse
+export MCP_PORT=${MCP_PORT:-8001}
+export MCP_SERVER_URL=${MCP_SERVER_URL:-http://127.0.0.1:${MCP_PORT}/sse}
+# Both servers share this container, so rendered images go through the artifact spool in /dev/shm
+export MCP_ARTIFACT_TRANSPORT=${MCP_ARTIFACT_TRANSPORT:-handle}
 python azure_diagram_server_fixed.py &
 MCP_PID=$!
 echo "MCP Server started with PID: $MCP_PID"
 
-# Sleep to allow MCP server to initialize
-sleep 2
+# Wait until the MCP server completes an initialize handshake
+if ! python mcp_remote.py --wait-ready --timeout "${MCP_READY_TIMEOUT:-30}"; then
+    echo "MCP server is not ready yet; API requests fall back to per-request servers while it is unavailable"
+fi
 
-# Start the API server (this will run in the foreground)
+# Start the API server in the background so this shell can forward SIGTERM to it
 echo "Starting API Server..."
-exec python api_server.py
+python api_server.py &
+API_PID=$!
+wait "$API_PID"
@@ -1,10 +1,7 @@
-import os
-import base64
-import json
 import logging
-from typing import Dict, Any
 from mcp.server.fastmcp import FastMCP, Image
 from dotenv import load_dotenv
+from mcp_transport import MCP_HOST, MCP_PORT, run_server
 import matplotlib.pyplot as plt
 from io import BytesIO
 
@@ -16,7 +13,7 @@ logger = logging.getLogger("fallback_mcp_server")
 load_dotenv()
 
 # Initialize FastMCP server
-mcp = FastMCP("azure-diagram-generator-fallback")
+mcp = FastMCP("azure-diagram-generator-fallback", host=MCP_HOST, port=MCP_PORT)
 
 def generate_simple_diagram(architecture_description: str, output_format: str = "png") -> bytes:
     """
@@ -96,11 +93,12 @@ async def generate_azure_diagram_from_text(
     # Generate simple diagram
     diagram_bytes = generate_simple_diagram(architecture_description, output_format)
     
-    # Create base64 encoded data for MCP Image
-    diagram_data = base64.b64encode(diagram_bytes).decode('utf-8')
-    
-    return Image(data=diagram_data, format=output_format)
+    # Image base64-encodes raw bytes itself
+    return Image(data=diagram_bytes, format=output_format)
 
-if __name__ == "__main__":
+def main() -> None:
     logger.info("Starting Fallback MCP server for Azure architecture diagram generation")
-    mcp.run(transport='stdio')
+    run_server(mcp)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Pool of warm Graphviz renderer processes.
+
+Running the dot executable for every render pays for fork/exec, plugin loading
+and font cache initialization each time, which dominates the latency of small
+diagrams. Each worker in this pool is a long-lived Python process that loads
+libgvc through ctypes once, creates one Graphviz context and then renders DOT
+sources sent over its stdin, laying each graph out once and writing every
+requested format from that layout.
+
+Workers are checked out one request at a time. A render that exceeds its
+timeout kills the worker, which is replaced on the next checkout, so a runaway
+layout cannot hold a worker forever. Workers also run under the CPU, memory
+and output size limits of render_limits; a render that breaks one is killed
+or refused and reported as RenderLimitError. Idle workers are pinged before reuse and
+retired after GRAPHVIZ_POOL_MAX_RENDERS renders. When libgvc cannot be found
+or a worker fails to start, the pool disables itself and run_graphviz falls
+back to running the dot executable once per render.
+"""
+
+import os
+import sys
+import time
+import struct
+import pickle
+import select
+import ctypes
+import ctypes.util
+import logging
+import argparse
+import threading
+import subprocess
+from typing import Dict, List, Optional
+
+from render_limits import (RenderLimitError, check_output_size, describe_exit, is_limit_exit, out_of_memory_message,
+                           limit_cpu_from_now, limit_memory)
+
+logger = logging.getLogger("graphviz_pool")
+
+# Renderer processes; 0 disables the pool so every render runs the dot executable
+GRAPHVIZ_POOL_SIZE = int(os.getenv("GRAPHVIZ_POOL_SIZE", 2))
+# libgvc and libcgraph, looked up on the library path when not set
+GRAPHVIZ_LIBGVC = os.getenv("GRAPHVIZ_LIBGVC") or ctypes.util.find_library("gvc")
+GRAPHVIZ_LIBCGRAPH = os.getenv("GRAPHVIZ_LIBCGRAPH") or ctypes.util.find_library("cgraph")
+# Renders before a worker is replaced, bounding whatever memory libgvc keeps
+GRAPHVIZ_POOL_MAX_RENDERS = int(os.getenv("GRAPHVIZ_POOL_MAX_RENDERS", 500))
+# Workers idle for longer than this are pinged before they are used again
+GRAPHVIZ_POOL_HEALTH_INTERVAL = float(os.getenv("GRAPHVIZ_POOL_HEALTH_INTERVAL", 30))
+GRAPHVIZ_POOL_START_TIMEOUT = float(os.getenv("GRAPHVIZ_POOL_START_TIMEOUT", 10))
+PING_TIMEOUT = 2
+
+_HEADER = struct.Struct("!Q")
+
+
+class GraphvizPoolError(Exception):
+    """Raised when the pool cannot render; the caller should run the dot executable instead."""
+
+
+class GraphvizTimeoutError(Exception):
+    """Raised when a render exceeds its timeout; the worker running it has been killed."""
+
+
+def _write_message(stream, message) -> None:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            raise EOFError("Graphviz worker closed its pipe")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_message(stream):
+    (size,) = _HEADER.unpack(_read_exactly(stream, _HEADER.size))
+    return pickle.loads(_read_exactly(stream, size))
+
+
+class LibGvc:
+    """ctypes binding for the libgvc calls a render needs."""
+
+    def __init__(self, gvc_path: str, cgraph_path: str):
+        self.gvc = ctypes.CDLL(gvc_path)
+        self.cgraph = ctypes.CDLL(cgraph_path)
+        self.gvc.gvContext.restype = ctypes.c_void_p
+        self.gvc.gvLayout.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p]
+        self.gvc.gvFreeLayout.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        # The length is an unsigned int before Graphviz 3 and a size_t since; a
+        # zeroed size_t reads correctly either way on little-endian hosts
+        self.gvc.gvRenderData.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p,
+                                          ctypes.POINTER(ctypes.POINTER(ctypes.c_char)),
+                                          ctypes.POINTER(ctypes.c_size_t)]
+        self.gvc.gvFreeRenderData.argtypes = [ctypes.POINTER(ctypes.c_char)]
+        self.cgraph.agmemread.restype = ctypes.c_void_p
+        self.cgraph.agmemread.argtypes = [ctypes.c_char_p]
+        self.cgraph.agclose.argtypes = [ctypes.c_void_p]
+        self.context = self.gvc.gvContext()
+        if not self.context:
+            raise Exception("gvContext failed")
+
+    def render(self, source: bytes, engine: str, output_formats: List[str]) -> Dict[str, bytes]:
+        """Lay out a DOT source once and render it in every format."""
+        graph = self.cgraph.agmemread(source)
+        if not graph:
+            raise Exception("Graphviz could not parse the DOT source")
+        try:
+            if self.gvc.gvLayout(self.context, graph, engine.encode("ascii")) != 0:
+                raise Exception(f"Graphviz {engine} layout failed")
+            try:
+                outputs = {}
+                for output_format in output_formats:
+                    data = ctypes.POINTER(ctypes.c_char)()
+                    length = ctypes.c_size_t(0)
+                    if self.gvc.gvRenderData(self.context, graph, output_format.encode("ascii"),
+                                             ctypes.byref(data), ctypes.byref(length)) != 0:
+                        raise Exception(f"Graphviz could not render {output_format}")
+                    try:
+                        # Refuse an oversized output before copying it into Python
+                        check_output_size(output_format, length.value)
+                        outputs[output_format] = ctypes.string_at(data, length.value)
+                    finally:
+                        self.gvc.gvFreeRenderData(data)
+                return outputs
+            finally:
+                self.gvc.gvFreeLayout(self.context, graph)
+        finally:
+            self.cgraph.agclose(graph)
+
+
+def worker_main(gvc_path: str, cgraph_path: str) -> None:
+    """Serve render requests from stdin until it closes."""
+    requests = os.fdopen(os.dup(0), "rb", buffering=0)
+    replies = os.fdopen(os.dup(1), "wb", buffering=0)
+    # Anything Graphviz prints goes to stderr so it cannot corrupt the reply stream
+    os.dup2(2, 1)
+    try:
+        lib = LibGvc(gvc_path, cgraph_path)
+        # Load the layout and render plugins and the font cache before taking work
+        lib.render(b'digraph { a [label="warm"] -> b }', "dot", ["png"])
+        # The address space cap applies from here on, once the libraries are mapped
+        limit_memory()
+    except Exception as e:
+        _write_message(replies, ("error", f"Graphviz worker could not start: {e}"))
+        return
+    _write_message(replies, ("ready", os.getpid()))
+    while True:
+        try:
+            message = _read_message(requests)
+        except EOFError:
+            return
+        if message == "ping":
+            _write_message(replies, ("ok", "pong"))
+            continue
+        source, engine, output_formats = message
+        # Each render gets its own CPU allowance; going over it raises SIGXCPU and ends the worker
+        limit_cpu_from_now()
+        try:
+            _write_message(replies, ("ok", lib.render(source, engine, output_formats)))
+        except RenderLimitError as e:
+            _write_message(replies, ("limit", str(e)))
+        except MemoryError:
+            _write_message(replies, ("limit", out_of_memory_message()))
+        except Exception as e:
+            _write_message(replies, ("error", str(e)))
+
+
+class _Worker:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker",
+             "--libgvc", GRAPHVIZ_LIBGVC, "--libcgraph", GRAPHVIZ_LIBCGRAPH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0
+        )
+        self.renders = 0
+        self.last_used = time.monotonic()
+        try:
+            status, detail = self.call(None, GRAPHVIZ_POOL_START_TIMEOUT)
+        except (GraphvizTimeoutError, EOFError, OSError) as e:
+            status, detail = "error", f"Graphviz worker did not start: {e}"
+        if status != "ready":
+            self.kill()
+            raise GraphvizPoolError(detail)
+
+    def call(self, message, timeout: Optional[float]):
+        """Send a message (None just waits for the next reply) and return the reply."""
+        if message is not None:
+            _write_message(self.process.stdin, message)
+        readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not readable:
+            raise GraphvizTimeoutError(f"no reply within {timeout:.1f}s")
+        return _read_message(self.process.stdout)
+
+    def alive(self) -> bool:
+        if self.process.poll() is not None:
+            return False
+        if time.monotonic() - self.last_used < GRAPHVIZ_POOL_HEALTH_INTERVAL:
+            return True
+        try:
+            return self.call("ping", PING_TIMEOUT) == ("ok", "pong")
+        except (GraphvizTimeoutError, EOFError, OSError):
+            return False
+
+    def exit_code(self, wait: float = 1.0) -> Optional[int]:
+        """Exit status of a worker whose pipe closed, waiting briefly for it to be reaped."""
+        try:
+            return self.process.wait(wait)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def kill(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class GraphvizPool:
+    """Warm libgvc renderer processes, checked out one render at a time."""
+
+    def __init__(self, size: int = GRAPHVIZ_POOL_SIZE):
+        self.size = size
+        self.enabled = size > 0 and os.name == "posix" and bool(GRAPHVIZ_LIBGVC and GRAPHVIZ_LIBCGRAPH)
+        self._idle: List[_Worker] = []
+        self._count = 0
+        self._cond = threading.Condition()
+        self.renders = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.limit_kills = 0
+
+    def _disable(self, reason) -> None:
+        if self.enabled:
+            logger.warning(f"Graphviz pool disabled, renders will run the dot executable: {reason}")
+        self.enabled = False
+
+    def _checkout(self, timeout: Optional[float]) -> _Worker:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            worker = None
+            with self._cond:
+                while not self._idle and self._count >= self.size:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise GraphvizTimeoutError("no Graphviz worker became free in time")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    worker = self._idle.pop()
+                else:
+                    self._count += 1
+            if worker is None:
+                # Start a new worker outside the lock; it takes a moment to load libgvc
+                try:
+                    return _Worker()
+                except Exception as e:
+                    self._release_slot()
+                    self._disable(e)
+                    raise GraphvizPoolError(str(e))
+            # Health check outside the lock so a slow ping does not block other renders
+            if worker.alive():
+                return worker
+            worker.kill()
+            self.restarts += 1
+            self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+    def _checkin(self, worker: _Worker, healthy: bool) -> None:
+        if not healthy or worker.renders >= GRAPHVIZ_POOL_MAX_RENDERS:
+            worker.kill()
+            self._release_slot()
+            return
+        worker.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def render(self, source: str, engine: str, output_formats: List[str], timeout: Optional[float]) -> Dict[str, bytes]:
+        """
+        Render DOT source in every format from one layout on a warm worker. Raises
+        GraphvizTimeoutError when the render exceeds timeout and GraphvizPoolError
+        when no worker can render, in which case the caller should fall back.
+        RenderLimitError means the render itself broke a resource limit.
+        """
+        if not self.enabled:
+            raise GraphvizPoolError("Graphviz pool is disabled")
+        if timeout is not None and timeout <= 0:
+            raise GraphvizTimeoutError(f"Graphviz {engine} layout exceeded {timeout:.1f}s before it started")
+        started = time.monotonic()
+        worker = self._checkout(timeout)
+        remaining = None if timeout is None else timeout - (time.monotonic() - started)
+        if remaining is not None and remaining <= 0:
+            # Waiting for the worker used up the budget; it never saw this render, so it goes back as it is
+            self._checkin(worker, healthy=True)
+            raise GraphvizTimeoutError(f"Graphviz {engine} layout exceeded {timeout:.1f}s waiting for a worker")
+        try:
+            status, result = worker.call((source.encode("utf-8"), engine, output_formats), remaining)
+        except GraphvizTimeoutError:
+            self.timeouts += 1
+            self._checkin(worker, healthy=False)
+            raise GraphvizTimeoutError(f"Graphviz {engine} layout exceeded {timeout:.1f}s")
+        except (EOFError, OSError) as e:
+            # The worker died mid-render; the next checkout starts a new one
+            self.restarts += 1
+            returncode = worker.exit_code()
+            self._checkin(worker, healthy=False)
+            if returncode and is_limit_exit(returncode):
+                # Killed by its CPU limit or by the kernel; running the same source
+                # again would only hit the same limit
+                self.limit_kills += 1
+                raise RenderLimitError(describe_exit(returncode))
+            if returncode:
+                # A crash such as SIGSEGV or an abort: Graphviz fails on this source
+                raise Exception(f"Graphviz {engine} failed: {describe_exit(returncode)}")
+            raise GraphvizPoolError(f"Graphviz worker died: {e}")
+        worker.renders += 1
+        self.renders += 1
+        self._checkin(worker, healthy=True)
+        if status == "limit":
+            self.limit_kills += 1
+            raise RenderLimitError(result)
+        if status != "ok":
+            raise Exception(f"Graphviz {engine} failed: {result}")
+        return result
+
+    def warm(self) -> int:
+        """Start workers up to the pool size ahead of the first request; returns how many are idle."""
+        workers = []
+        try:
+            while self.enabled and len(workers) < self.size:
+                workers.append(self._checkout(GRAPHVIZ_POOL_START_TIMEOUT))
+        except (GraphvizPoolError, GraphvizTimeoutError):
+            pass
+        for worker in workers:
+            self._checkin(worker, healthy=True)
+        return len(workers)
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "size": self.size,
+                "workers": self._count,
+                "idle": len(self._idle),
+                "renders": self.renders,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+                "limit_kills": self.limit_kills
+            }
+
+
+graphviz_pool = GraphvizPool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm Graphviz renderer pool")
+    parser.add_argument("--worker", action="store_true", help="Run as a renderer process (used by the pool)")
+    parser.add_argument("--libgvc", default=GRAPHVIZ_LIBGVC)
+    parser.add_argument("--libcgraph", default=GRAPHVIZ_LIBCGRAPH)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker_main(args.libgvc, args.libcgraph)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        logger.info(f"Started {graphviz_pool.warm()} worker(s): {graphviz_pool.status()}")
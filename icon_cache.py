@@ -0,0 +1,111 @@
+"""
+Pre-resized icon cache for the renderer.
+
+Graphviz opens and decodes the icon file of every node on every render, and
+the diagrams icons are 256x256 PNGs drawn at 1.4 inches. The cache writes each
+icon once, resized to the pixel size it is drawn at, into a RAM-backed
+directory (/dev/shm where available) shared by every process on the host, and
+the renderer points the nodes' image attribute there. Graphviz then reads a
+small file from memory instead of a large one from the package directory.
+"""
+
+import os
+import logging
+import tempfile
+import threading
+from typing import Iterable, Optional
+
+logger = logging.getLogger("icon_cache")
+
+ICON_CACHE_ENABLED = os.getenv("ICON_CACHE_ENABLED", "true").lower() == "true"
+ICON_CACHE_DIR = os.getenv(
+    "ICON_CACHE_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "azure-diagram-icons")
+)
+# Node icons are drawn 1.4 inches wide, about 134 pixels at Graphviz's default 96 dpi
+ICON_CACHE_PIXELS = int(os.getenv("ICON_CACHE_PIXELS", 136))
+
+try:
+    from PIL import Image as PILImage
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+def _resources_root() -> Optional[str]:
+    # diagrams resolves icon paths relative to the parent of its package directory
+    try:
+        import diagrams
+    except ImportError:
+        return None
+    return os.path.dirname(os.path.dirname(os.path.abspath(diagrams.__file__)))
+
+
+class IconCache:
+    """Resized copies of the diagrams icons, keyed by icon path and pixel size."""
+
+    def __init__(self, cache_dir: str = ICON_CACHE_DIR, pixels: int = ICON_CACHE_PIXELS):
+        self.cache_dir = cache_dir
+        self.pixels = pixels
+        self.root = _resources_root()
+        self._paths = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def source_path(self, icon: str) -> str:
+        return os.path.join(self.root, icon)
+
+    def path_for(self, icon: str, pixels: Optional[int] = None) -> str:
+        """
+        Return the path of the cached copy of an icon (e.g. "resources/azure/compute/app-services.png"),
+        creating it on first use. Falls back to the original file if it cannot be cached.
+        """
+        pixels = pixels or self.pixels
+        key = (icon, pixels)
+        path = self._paths.get(key)
+        if path is not None:
+            self.hits += 1
+            return path
+        with self._lock:
+            path = self._paths.get(key)
+            if path is None:
+                self.misses += 1
+                path = self._materialize(icon, pixels)
+                self._paths[key] = path
+        return path
+
+    def _materialize(self, icon: str, pixels: int) -> str:
+        source = self.source_path(icon)
+        target = os.path.join(self.cache_dir, str(pixels), icon.replace("/", "_"))
+        # Another process may already have written it
+        if os.path.exists(target):
+            return target
+        if not PIL_AVAILABLE:
+            return source
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with PILImage.open(source) as image:
+                if max(image.size) > pixels:
+                    image.thumbnail((pixels, pixels), PILImage.LANCZOS)
+                image.save(temp_path, format="PNG", optimize=True)
+            os.replace(temp_path, target)
+        except OSError as e:
+            logger.warning(f"Could not cache icon {icon}: {e}")
+            return source
+        return target
+
+    def preload(self, icons: Iterable[str], pixels: Optional[int] = None) -> int:
+        """Cache a set of icons up front; returns how many were processed."""
+        count = 0
+        for icon in icons:
+            self.path_for(icon, pixels)
+            count += 1
+        return count
+
+    def stats(self) -> dict:
+        return {"dir": self.cache_dir, "icons": len(self._paths), "hits": self.hits, "misses": self.misses}
+
+
+icon_cache = IconCache()
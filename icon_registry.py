@@ -0,0 +1,306 @@
+"""
+Registry of the Azure node classes and icons shipped with the diagrams library.
+
+The diagrams.azure modules are scanned once, by parsing their source rather
+than importing them, and the class name, module and icon path of every node
+class are written to a compact JSON lookup file. The file is built by the
+Docker image (python icon_registry.py --build) or on first use, and rebuilt
+when the installed diagrams package changes.
+
+resolve_class_name maps a resource type such as "Azure.Functions" to a class
+name through curated aliases, aliases for generic names such as "Storage",
+a normalized exact match and finally a fuzzy match. node_class_for imports only the module that defines that class, so a
+diagram pays only for the icons it uses.
+"""
+
+import os
+import ast
+import json
+import glob
+import difflib
+import logging
+import argparse
+import importlib
+import importlib.util
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger("icon_registry")
+
+ICON_REGISTRY_PATH = os.getenv(
+    "ICON_REGISTRY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "azure_icon_registry.json")
+)
+REGISTRY_FORMAT = 1
+FALLBACK_CLASS = "AppServices"
+# Similarity needed for a fuzzy match; below it the fallback icon is used
+FUZZY_CUTOFF = float(os.getenv("ICON_FUZZY_CUTOFF", 0.8))
+
+# When several modules define a class with the same name, the first module wins
+PREFERRED_MODULES = [
+    "compute", "web", "database", "storage", "network", "identity", "security", "integration",
+    "analytics", "aiml", "ml", "containers", "devops", "iot", "monitor", "general"
+]
+
+# Resource types the extractor produces, mapped to class names
+RESOURCE_TYPE_ALIASES = {
+    "Azure.WebApp": "AppServices",
+    "Azure.AppService": "AppServices",
+    "Azure.AppServicePlan": "AppServicePlans",
+    "Azure.Functions": "FunctionApps",
+    "Azure.FunctionApp": "FunctionApps",
+    "Azure.VirtualMachine": "VM",
+    "Azure.VMScaleSet": "VMScaleSet",
+    "Azure.AKS": "KubernetesServices",
+    "Azure.KubernetesService": "KubernetesServices",
+    "Azure.ContainerRegistry": "ContainerRegistries",
+    "Azure.ContainerInstances": "ContainerInstances",
+    "Azure.ContainerApps": "ContainerApps",
+    "Azure.SQLDatabase": "SQLDatabases",
+    "Azure.SQLServer": "SQLServers",
+    "Azure.SQLManagedInstance": "SQLManagedInstances",
+    "Azure.CosmosDB": "CosmosDb",
+    "Azure.PostgreSQL": "DatabaseForPostgresqlServers",
+    "Azure.MySQL": "DatabaseForMysqlServers",
+    "Azure.RedisCache": "CacheForRedis",
+    "Azure.Redis": "CacheForRedis",
+    "Azure.BlobStorage": "BlobStorage",
+    "Azure.StorageAccount": "StorageAccounts",
+    "Azure.DataLake": "DataLakeStorage",
+    "Azure.LoadBalancer": "LoadBalancers",
+    "Azure.ApplicationGateway": "ApplicationGateway",
+    "Azure.FrontDoor": "FrontDoors",
+    "Azure.CDN": "CDNProfiles",
+    "Azure.VirtualNetwork": "VirtualNetworks",
+    "Azure.Subnet": "Subnets",
+    "Azure.Firewall": "Firewall",
+    "Azure.DNS": "DNSZones",
+    "Azure.TrafficManager": "TrafficManagerProfiles",
+    "Azure.APIManagement": "APIManagement",
+    "Azure.ActiveDirectory": "ActiveDirectory",
+    "Azure.KeyVault": "KeyVaults",
+    "Azure.ServiceBus": "ServiceBus",
+    "Azure.EventHub": "EventHubs",
+    "Azure.EventGrid": "EventGridTopics",
+    "Azure.LogicApps": "LogicApps",
+    "Azure.PowerBI": "PowerBiEmbedded",
+    "Azure.SynapseAnalytics": "SynapseAnalytics",
+    "Azure.DataFactory": "DataFactories",
+    "Azure.Databricks": "Databricks",
+    "Azure.CognitiveServices": "CognitiveServices",
+    "Azure.OpenAI": "AzureOpenAI",
+    "Azure.CognitiveSearch": "CognitiveSearch",
+    "Azure.MachineLearning": "MachineLearningServiceWorkspaces",
+    "Azure.ApplicationInsights": "ApplicationInsights",
+    "Azure.Monitor": "Monitor",
+    "Azure.LogAnalytics": "LogAnalyticsWorkspaces",
+    "Azure.IoTHub": "IotHub",
+}
+
+# Generic and abbreviated names, matched on the normalized key before the fuzzy match,
+# which would otherwise pick an unrelated class that happens to contain them
+# ("storage" -> "StorageMover", "kubernetes" -> "ArcKubernetes")
+GENERIC_TYPE_ALIASES = {
+    "Storage": "StorageAccounts",
+    "Blob": "BlobStorage",
+    "APIGateway": "APIManagement",
+    "API": "APIManagement",
+    "AppGateway": "ApplicationGateway",
+    "WAF": "WebApplicationFirewallPolicieswaf",
+    "Kubernetes": "KubernetesServices",
+    "K8s": "KubernetesServices",
+    "Cache": "CacheForRedis",
+    "Web": "AppServices",
+    "Network": "VirtualNetworks",
+    "VNet": "VirtualNetworks",
+    "NSG": "NetworkSecurityGroups",
+    "AD": "ActiveDirectory",
+    "AAD": "ActiveDirectory",
+    "EntraID": "ActiveDirectory",
+    "AppInsights": "ApplicationInsights",
+    "Insights": "ApplicationInsights",
+    "ML": "MachineLearningServiceWorkspaces",
+    "AI": "CognitiveServices",
+}
+
+
+def normalize_type(name: str) -> str:
+    """Reduce a type or class name to a lookup key: "Azure.Function_Apps" -> "functionapp"."""
+    key = name.lower()
+    for prefix in ("microsoft.", "azure."):
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    key = "".join(ch for ch in key if ch.isalnum())
+    if key.startswith("azure") and len(key) > len("azure"):
+        key = key[len("azure"):]
+    if key.endswith("s") and len(key) > 3:
+        key = key[:-1]
+    return key
+
+
+def _azure_package_dir() -> Optional[str]:
+    spec = importlib.util.find_spec("diagrams")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return os.path.join(list(spec.submodule_search_locations)[0], "azure")
+
+
+def _source_signature(package_dir: str) -> str:
+    # Changes whenever the installed diagrams package is upgraded or replaced
+    modules = glob.glob(os.path.join(package_dir, "*.py"))
+    return f"{package_dir}:{len(modules)}:{max(os.path.getmtime(m) for m in modules):.0f}"
+
+
+def _scan_module(path: str) -> tuple:
+    """Return ({class: icon path}, {alias: class}) for one diagrams.azure module without importing it."""
+    tree = ast.parse(open(path, encoding="utf-8").read(), path)
+    icon_dirs = {}
+    classes = {}
+    aliases = {}
+    for statement in tree.body:
+        if isinstance(statement, ast.ClassDef):
+            attributes = {
+                target.id: node.value.value
+                for node in statement.body if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant)
+                for target in node.targets if isinstance(target, ast.Name)
+            }
+            base = statement.bases[0].id if statement.bases and isinstance(statement.bases[0], ast.Name) else None
+            icon_dir = attributes.get("_icon_dir") or icon_dirs.get(base)
+            if icon_dir:
+                icon_dirs[statement.name] = icon_dir
+            if "_icon" in attributes and icon_dir:
+                classes[statement.name] = f"{icon_dir}/{attributes['_icon']}"
+        elif (isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Name)
+              and len(statement.targets) == 1 and isinstance(statement.targets[0], ast.Name)):
+            aliases[statement.targets[0].id] = statement.value.id
+    return classes, aliases
+
+
+def build_registry(package_dir: Optional[str] = None) -> dict:
+    """Scan diagrams.azure and return the registry document."""
+    package_dir = package_dir or _azure_package_dir()
+    if package_dir is None or not os.path.isdir(package_dir):
+        raise Exception("diagrams library is not available. Please install it.")
+    modules = sorted(
+        os.path.splitext(os.path.basename(path))[0]
+        for path in glob.glob(os.path.join(package_dir, "*.py"))
+        if not os.path.basename(path).startswith("_")
+    )
+    modules.sort(key=lambda m: PREFERRED_MODULES.index(m) if m in PREFERRED_MODULES else len(PREFERRED_MODULES))
+
+    classes = {}
+    for module in modules:
+        module_classes, module_aliases = _scan_module(os.path.join(package_dir, f"{module}.py"))
+        for class_name, icon in module_classes.items():
+            classes.setdefault(class_name, [module, icon])
+        for alias, target in module_aliases.items():
+            if target in module_classes:
+                classes.setdefault(alias, [module, module_classes[target]])
+
+    index = {}
+    for class_name in classes:
+        index.setdefault(normalize_type(class_name), class_name)
+    return {
+        "format": REGISTRY_FORMAT,
+        "signature": _source_signature(package_dir),
+        "classes": classes,
+        "index": index
+    }
+
+
+def write_registry(registry: dict, path: str = ICON_REGISTRY_PATH) -> None:
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(registry, f, separators=(",", ":"), sort_keys=True)
+    os.replace(temp_path, path)
+
+
+@lru_cache(maxsize=1)
+def load_registry() -> dict:
+    """Load the lookup file, building it first if it is missing or stale."""
+    package_dir = _azure_package_dir()
+    if package_dir is None:
+        return {"format": REGISTRY_FORMAT, "signature": None, "classes": {}, "index": {}}
+    try:
+        with open(ICON_REGISTRY_PATH, encoding="utf-8") as f:
+            registry = json.load(f)
+        if registry.get("format") == REGISTRY_FORMAT and registry.get("signature") == _source_signature(package_dir):
+            return registry
+    except (OSError, ValueError):
+        pass
+    registry = build_registry(package_dir)
+    try:
+        write_registry(registry)
+        logger.info(f"Built icon registry with {len(registry['classes'])} classes at {ICON_REGISTRY_PATH}")
+    except OSError as e:
+        # A read-only install still works, it just rebuilds the registry on each start
+        logger.warning(f"Could not write icon registry to {ICON_REGISTRY_PATH}: {e}")
+    return registry
+
+
+_GENERIC_ALIASES = {normalize_type(name): class_name for name, class_name in GENERIC_TYPE_ALIASES.items()}
+
+
+@lru_cache(maxsize=1024)
+def resolve_class_name(resource_type: str) -> str:
+    """Map a resource type to a diagrams.azure class name, falling back to AppServices."""
+    registry = load_registry()
+    classes, index = registry["classes"], registry["index"]
+    alias = RESOURCE_TYPE_ALIASES.get(resource_type)
+    if alias in classes:
+        return alias
+    key = normalize_type(resource_type)
+    alias = _GENERIC_ALIASES.get(key)
+    if alias in classes:
+        return alias
+    if key in index:
+        return index[key]
+    matches = difflib.get_close_matches(key, index, n=1, cutoff=FUZZY_CUTOFF)
+    if not matches and len(key) >= 4:
+        # "eventhub" -> "eventhubcluster", "redis" -> "cacheforredi": prefer the shortest
+        # class that starts with the key, then the shortest that contains it
+        matches = (sorted((k for k in index if k.startswith(key)), key=len)[:1]
+                   or sorted((k for k in index if key in k), key=len)[:1])
+    if matches:
+        return index[matches[0]]
+    logger.warning(f"No Azure icon for resource type '{resource_type}', using {FALLBACK_CLASS}")
+    return FALLBACK_CLASS
+
+
+@lru_cache(maxsize=None)
+def load_node_class(class_name: str):
+    """Import the diagrams.azure module that defines class_name and return the class."""
+    module, _ = load_registry()["classes"][class_name]
+    return getattr(importlib.import_module(f"diagrams.azure.{module}"), class_name)
+
+
+def node_class_for(resource_type: str):
+    """Node class to draw a resource type with."""
+    return load_node_class(resolve_class_name(resource_type))
+
+
+def icon_path_for(resource_type: str) -> Optional[str]:
+    """Path of the icon file for a resource type, relative to the site-packages directory."""
+    entry = load_registry()["classes"].get(resolve_class_name(resource_type))
+    return entry[1] if entry else None
+
+
+def known_resource_types() -> list:
+    """Resource types with a curated alias whose class is installed."""
+    classes = load_registry()["classes"]
+    return sorted(t for t, class_name in RESOURCE_TYPE_ALIASES.items() if class_name in classes)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Azure icon registry")
+    parser.add_argument("--build", action="store_true", help="Rebuild the registry file")
+    parser.add_argument("--lookup", nargs="*", default=[], help="Resource types to resolve")
+    args = parser.parse_args()
+
+    if args.build:
+        registry = build_registry()
+        write_registry(registry)
+        logger.info(f"Wrote {len(registry['classes'])} classes to {ICON_REGISTRY_PATH}")
+    for resource_type in args.lookup:
+        print(f"{resource_type} -> {resolve_class_name(resource_type)} ({icon_path_for(resource_type)})")
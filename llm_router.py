@@ -0,0 +1,338 @@
+"""
+Routing of Azure OpenAI chat completions across several deployments.
+
+Deployments are listed in AZURE_OPENAI_DEPLOYMENTS as a JSON array of
+{"endpoint", "deployment", "api_key", "api_version"} objects; without it the
+single AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_DEPLOYMENT pair is used. Each
+request goes to the deployment with the lowest expected latency that is not
+throttled. A 429 parks the deployment until its Retry-After expires and the
+request fails over to the next one. With LLM_HEDGING enabled, a second request
+is sent to another deployment once the first has taken longer than that
+deployment's p95 latency, and whichever answers first wins. Requests wait in
+each deployment's rate_limiter queue before they are sent.
+
+Endpoints are plain URLs, so llm_stub_server.py can stand in for Azure OpenAI
+when trying the router locally.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from rate_limiter import AZURE_OPENAI_RPM, AZURE_OPENAI_TPM, RateLimiter, estimate_tokens
+
+logger = logging.getLogger("llm_router")
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Connect timeout and, for streamed responses, the longest gap between chunks
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 30))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+# Hedge delay before a deployment has enough latency samples for a p95
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 3))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.2))
+LLM_LATENCY_SAMPLES = 100
+LLM_MIN_SAMPLES_FOR_P95 = 20
+# Weight of the newest sample in the moving latency average
+LLM_LATENCY_EWMA_ALPHA = 0.2
+# Throttling pause when a 429 carries no Retry-After header
+LLM_DEFAULT_RETRY_AFTER = 10.0
+# Latency assumed per request in flight on a deployment that has not answered yet
+LLM_UNMEASURED_LATENCY = 1.0
+
+
+class Deployment:
+    """One Azure OpenAI deployment and its observed latency and throttling state."""
+
+    def __init__(self, endpoint: str, deployment: str, api_key: str, api_version: str,
+                 rpm: int = AZURE_OPENAI_RPM, tpm: int = AZURE_OPENAI_TPM):
+        self.endpoint = endpoint.rstrip("/")
+        self.deployment = deployment
+        self.api_key = api_key
+        self.api_version = api_version
+        self.name = f"{self.endpoint}/{deployment}"
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.ewma_latency = None
+        self.failures = 0
+        self.limiter = RateLimiter(rpm, tpm)
+        # Streamed responses return after the headers, so their latencies are kept apart
+        self._latencies = {True: deque(maxlen=LLM_LATENCY_SAMPLES), False: deque(maxlen=LLM_LATENCY_SAMPLES)}
+
+    @property
+    def url(self) -> str:
+        return f"{self.endpoint}/openai/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
+
+    def p95(self, stream: bool) -> Optional[float]:
+        samples = self._latencies[stream]
+        if len(samples) < LLM_MIN_SAMPLES_FOR_P95:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def record_latency(self, seconds: float, stream: bool) -> None:
+        self._latencies[stream].append(seconds)
+        if self.ewma_latency is None:
+            self.ewma_latency = seconds
+        else:
+            self.ewma_latency += LLM_LATENCY_EWMA_ALPHA * (seconds - self.ewma_latency)
+
+    def record_headers(self, headers) -> None:
+        # Azure OpenAI reports the remaining quota on every response
+        for header, attribute in (("x-ratelimit-remaining-requests", "remaining_requests"),
+                                  ("x-ratelimit-remaining-tokens", "remaining_tokens")):
+            if header in headers:
+                try:
+                    setattr(self, attribute, int(headers[header]))
+                except ValueError:
+                    pass
+
+    def throttle(self, headers) -> float:
+        retry_after = LLM_DEFAULT_RETRY_AFTER
+        try:
+            if "retry-after-ms" in headers:
+                retry_after = float(headers["retry-after-ms"]) / 1000
+            elif "retry-after" in headers:
+                retry_after = float(headers["retry-after"])
+        except ValueError:
+            pass
+        self.blocked_until = time.monotonic() + retry_after
+        return retry_after
+
+    def score(self, tokens: int = 0) -> float:
+        # Expected seconds until a response: the rate limiter queue plus observed latency.
+        # Untried deployments count as instant so every deployment gets measured, but the
+        # requests already sent to one still count so a burst spreads over all of them
+        score = self.limiter.estimate_wait(tokens)
+        if self.ewma_latency is None:
+            return score + LLM_UNMEASURED_LATENCY * self.in_flight
+        latency = self.ewma_latency * (1 + self.in_flight)
+        if self.remaining_requests == 0 or self.remaining_tokens == 0:
+            latency *= 10
+        return score + latency * (1 + self.failures)
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "in_flight": self.in_flight,
+            "ewma_latency": self.ewma_latency,
+            "p95_stream": self.p95(True),
+            "p95": self.p95(False),
+            "blocked_for": max(0.0, self.blocked_until - time.monotonic()),
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "failures": self.failures,
+            "rate_limit": self.limiter.status()
+        }
+
+
+def load_deployments() -> List[Deployment]:
+    """Read the deployment list from the environment."""
+    # Structured outputs and streamed usage need 2024-10-21 or later
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-10-21")
+    api_key = os.getenv("AZURE_OPENAI_API_KEY")
+    configured = os.getenv("AZURE_OPENAI_DEPLOYMENTS")
+    if configured:
+        return [
+            Deployment(
+                entry["endpoint"],
+                entry["deployment"],
+                entry.get("api_key", api_key),
+                entry.get("api_version", api_version),
+                entry.get("rpm", AZURE_OPENAI_RPM),
+                entry.get("tpm", AZURE_OPENAI_TPM)
+            )
+            for entry in json.loads(configured)
+        ]
+    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    if not endpoint or not api_key:
+        return []
+    return [Deployment(endpoint, os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4"), api_key, api_version)]
+
+
+class DeploymentRouter:
+    """Latency-aware load balancing, 429 failover and optional hedging over deployments."""
+
+    def __init__(self, deployments: List[Deployment], hedging: bool = LLM_HEDGING,
+                 timeout: float = LLM_REQUEST_TIMEOUT):
+        self.deployments = deployments
+        self.hedging = hedging
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 4 * len(deployments)), thread_name_prefix="llm")
+
+    def _pick(self, exclude=(), tokens: int = 0) -> Optional[Deployment]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [d for d in self.deployments if d not in exclude and d.blocked_until <= now]
+            if not candidates:
+                return None
+            chosen = min(candidates, key=lambda d: d.score(tokens))
+            chosen.in_flight += 1
+            return chosen
+
+    def _send(self, deployment: Deployment, body: dict, stream: bool):
+        started = time.monotonic()
+        try:
+            response = requests.post(
+                deployment.url,
+                headers={"Content-Type": "application/json", "api-key": deployment.api_key},
+                json=body,
+                timeout=self.timeout,
+                stream=stream
+            )
+        except requests.exceptions.RequestException:
+            with self._lock:
+                deployment.failures += 1
+                deployment.in_flight -= 1
+            raise
+        elapsed = time.monotonic() - started
+        with self._lock:
+            deployment.in_flight -= 1
+            deployment.record_headers(response.headers)
+            if response.status_code == 429:
+                retry_after = deployment.throttle(response.headers)
+                logger.warning(f"Deployment {deployment.name} throttled for {retry_after:.1f}s")
+            elif response.status_code >= 500:
+                deployment.failures += 1
+            else:
+                deployment.failures = 0
+                deployment.record_latency(elapsed, stream)
+        return response
+
+    def _wait_for_unblock(self) -> None:
+        # Every deployment is throttled; wait for the first one to come back
+        with self._lock:
+            wake = min(d.blocked_until for d in self.deployments)
+        delay = wake - time.monotonic()
+        if delay > 0:
+            logger.warning(f"All deployments throttled; waiting {delay:.1f}s")
+            time.sleep(delay)
+
+    def post(self, body: dict, stream: bool = False, stats: dict = None):
+        """
+        Send a chat completion body and return the first successful requests.Response.
+        Throttled or failing deployments are skipped; the last error response is returned
+        when none succeeds. The deployment used and the rate limiter queue wait are
+        copied into stats when a dict is passed.
+        """
+        if not self.deployments:
+            raise Exception("No Azure OpenAI deployments are configured")
+        tokens = estimate_tokens(body)
+        queue_wait = 0.0
+        tried = []
+        last_response = None
+        last_error = None
+        while len(tried) < len(self.deployments):
+            deployment = self._pick(exclude=tried, tokens=tokens)
+            if deployment is None:
+                if tried:
+                    break
+                self._wait_for_unblock()
+                continue
+            tried.append(deployment)
+            # Queue for quota instead of sending a request that would come back as a 429
+            waited = deployment.limiter.acquire(tokens)
+            queue_wait += waited
+            if waited > 0.001:
+                logger.info(f"Waited {waited:.2f}s for rate limit on {deployment.name}")
+            if stats is not None:
+                stats["queue_wait_seconds"] = round(queue_wait, 3)
+            try:
+                if self.hedging:
+                    response, deployment = self._post_hedged(deployment, body, stream, tried, tokens)
+                else:
+                    response = self._send(deployment, body, stream)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Deployment {deployment.name} failed: {e}")
+                last_error = e
+                continue
+            if stats is not None:
+                # The deployment that answered, which is the hedge when it won
+                stats["deployment"] = deployment.name
+            if response.status_code == 200:
+                return response
+            if response.status_code != 429 and response.status_code < 500:
+                # Client errors would fail the same way everywhere
+                return response
+            response.close()
+            last_response = response
+        if last_response is not None:
+            return last_response
+        raise last_error or Exception("No Azure OpenAI deployment accepted the request")
+
+    def _post_hedged(self, primary: Deployment, body: dict, stream: bool, tried: list, tokens: int) -> tuple:
+        """Send to primary, and to a backup once primary is slow; returns the response used and its deployment."""
+        futures = {self._executor.submit(self._send, primary, body, stream): primary}
+        delay = max(primary.p95(stream) or LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY)
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            backup = self._pick(exclude=tried, tokens=tokens)
+            if backup is not None and not backup.limiter.try_acquire(tokens):
+                # A hedge is only worth sending if it does not have to queue for quota
+                with self._lock:
+                    backup.in_flight -= 1
+                backup = None
+            if backup is not None:
+                tried.append(backup)
+                logger.info(f"Hedging request to {backup.name} after {delay:.2f}s on {primary.name}")
+                futures[self._executor.submit(self._send, backup, body, stream)] = backup
+
+        pending = set(futures)
+        winner = None
+        fallback = None
+        error = None
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except requests.exceptions.RequestException as e:
+                    error = e
+                    continue
+                if winner is None and response.status_code == 200:
+                    winner = (response, futures[future])
+                    continue
+                # Keep one error response in case no request succeeds
+                if fallback is not None:
+                    fallback[0].close()
+                fallback = (response, futures[future])
+        for future in pending:
+            # The losing request cannot be cancelled mid-flight; release it when it returns
+            future.add_done_callback(_close_response)
+        if winner is not None:
+            if fallback is not None:
+                fallback[0].close()
+            return winner
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def share_quota(self, shares: int) -> None:
+        """Limit every deployment to 1/shares of its quota (see rate_limiter)."""
+        for deployment in self.deployments:
+            deployment.limiter.share(shares)
+
+    def status(self) -> list:
+        """Latency, throttling and rate limit queue state of every deployment."""
+        with self._lock:
+            return [d.status() for d in self.deployments]
+
+
+def _close_response(future) -> None:
+    if future.exception() is None:
+        future.result().close()
+
+
+router = DeploymentRouter(load_deployments())
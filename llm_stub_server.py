@@ -0,0 +1,96 @@
+"""
+Local stand-in for an Azure OpenAI chat completions endpoint.
+
+Answers every chat completion with a fixed architecture after a configurable
+delay, and can throttle a share of requests with 429s. Start two or more on
+different ports and list them in AZURE_OPENAI_DEPLOYMENTS to try the router
+and rate limiter without Azure:
+
+    python llm_stub_server.py --port 9001 --latency 0.2
+    python llm_stub_server.py --port 9002 --latency 1.5 --jitter 1.0 --throttle 0.2
+    AZURE_OPENAI_DEPLOYMENTS='[{"endpoint": "http://127.0.0.1:9001", "deployment": "a", "api_key": "x"},
+                               {"endpoint": "http://127.0.0.1:9002", "deployment": "b", "api_key": "x"}]'
+"""
+
+import json
+import time
+import random
+import argparse
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("llm_stub_server")
+
+STUB_ARCHITECTURE = {
+    "diagram_label": "Stub Architecture",
+    "resources": [
+        {"name": "Web App", "type": "Azure.WebApp", "attributes": {"location": "East US", "sku": "S1"}},
+        {"name": "SQL Database", "type": "Azure.SQLDatabase", "attributes": {"location": "East US", "sku": "S2"}}
+    ],
+    "relationships": [{"source": "Web App", "target": "SQL Database", "type": "connects_to"}],
+    "clusters": [{"name": "Resource Group 1", "resources": ["Web App", "SQL Database"]}]
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    jitter = 0.0
+    throttle = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if random.random() < self.throttle:
+            self.send_response(429)
+            self.send_header("retry-after-ms", "1000")
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"error": {"code": "429", "message": "Rate limit reached"}}')
+            return
+
+        time.sleep(self.latency + random.random() * self.jitter)
+        content = json.dumps(STUB_ARCHITECTURE)
+        usage = {"prompt_tokens": 200, "completion_tokens": len(content) // 4, "total_tokens": 200 + len(content) // 4}
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for start in range(0, len(content), 8):
+                chunk = {"choices": [{"index": 0, "delta": {"content": content[start:start + 8]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            if body.get("stream_options", {}).get("include_usage"):
+                self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        payload = json.dumps({
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.info(format % args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Stub Azure OpenAI chat completions endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Base response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay of up to this many seconds")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Share of requests answered with 429")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    StubHandler.jitter = args.jitter
+    StubHandler.throttle = args.throttle
+    logger.info(f"Stub Azure OpenAI endpoint on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), StubHandler).serve_forever()
@@ -0,0 +1,159 @@
+"""
+Rule-based architecture extraction without a network round trip.
+
+Maps service mentions in a description to the resource types drawn by
+diagram_renderer, infers the usual relationships between them and a
+resource-group cluster, and scores how much of the description it understood.
+A description with a word that may name a service the rules do not know, or
+with a negation, scores 0. architecture_extractor only calls Azure OpenAI when
+the confidence is below LOCAL_EXTRACTOR_CONFIDENCE.
+"""
+
+import os
+import re
+import logging
+
+logger = logging.getLogger("local_extractor")
+
+LOCAL_EXTRACTOR_ENABLED = os.getenv("LOCAL_EXTRACTOR_ENABLED", "true").lower() == "true"
+LOCAL_EXTRACTOR_CONFIDENCE = float(os.getenv("LOCAL_EXTRACTOR_CONFIDENCE", 0.8))
+
+# Resource type -> (display name, phrases that mention it). Longer phrases are
+# matched first so "app service plan" is not also read as a web app.
+SERVICE_PATTERNS = {
+    "Azure.AppServicePlan": ("App Service Plan", ["app service plan", "service plan", "hosting plan"]),
+    "Azure.WebApp": ("Web App", ["web app", "webapp", "app service", "web application", "website", "web site", "web frontend", "frontend"]),
+    "Azure.SQLDatabase": ("SQL Database", ["azure sql database", "sql database", "azure sql", "sql db", "sql server", "relational database", "database"]),
+    "Azure.BlobStorage": ("Blob Storage", ["blob storage", "storage account", "blob container", "blobs", "blob", "storage"]),
+    "Azure.LoadBalancer": ("Load Balancer", ["load balancer", "load-balancer"]),
+    "Azure.ApplicationGateway": ("Application Gateway", ["application gateway", "app gateway", "web application firewall", "waf"]),
+    "Azure.VirtualNetwork": ("Virtual Network", ["virtual network", "vnet", "subnet"]),
+    "Azure.ActiveDirectory": ("Active Directory", ["azure active directory", "active directory", "azure ad", "aad", "entra id", "entra"]),
+    "Azure.KeyVault": ("Key Vault", ["key vault", "keyvault", "secrets store"]),
+    "Azure.ServiceBus": ("Service Bus", ["service bus", "servicebus", "message queue", "queue"]),
+    "Azure.PowerBI": ("Power BI", ["power bi", "powerbi", "dashboard", "reporting"]),
+    "Azure.CognitiveServices": ("Cognitive Services", ["cognitive services", "cognitive service", "azure openai", "openai", "computer vision", "language service"]),
+}
+
+# Usual connections between tiers: (source, target, relationship type)
+RELATIONSHIP_RULES = [
+    ("Azure.ApplicationGateway", "Azure.WebApp", "routes_to"),
+    ("Azure.LoadBalancer", "Azure.WebApp", "routes_to"),
+    ("Azure.AppServicePlan", "Azure.WebApp", "hosts"),
+    ("Azure.ActiveDirectory", "Azure.WebApp", "authenticates"),
+    ("Azure.WebApp", "Azure.SQLDatabase", "connects_to"),
+    ("Azure.WebApp", "Azure.BlobStorage", "stores_in"),
+    ("Azure.WebApp", "Azure.KeyVault", "reads_secrets"),
+    ("Azure.WebApp", "Azure.ServiceBus", "sends_messages"),
+    ("Azure.WebApp", "Azure.CognitiveServices", "calls"),
+    ("Azure.PowerBI", "Azure.SQLDatabase", "queries"),
+]
+
+# Words that carry no service information; anything else left unmatched lowers confidence
+FILLER_WORDS = set("""
+a an the and or with to from for of in on into onto at by via that which who
+is are be being it its this these those their there then than also using uses use used
+has have having plus as behind front backed connect connects connected connecting
+talks talk stores store storing stored reads read writes write sends send calls call
+hosts host hosting hosted keeps keep kept secrets files data messages users
+simple basic small single one two some our my we i need want create build deploy
+architecture diagram azure app application service services resource group resources
+named called group region east west north south us europe central all both each inside
+within between where through layer tier protected secured secure public private
+""".split())
+
+# Words that describe a workload without naming a service; left unmatched they only
+# lower the confidence, while any other unmatched word may be a service the rules do
+# not know ("a web app on AKS") and leaves the description to Azure OpenAI
+DESCRIPTIVE_WORDS = set("""
+scalable scale highly available availability reliable resilient redundant global globally
+fast faster performance performant securely internal external customer customers user employees
+orders products content images static dynamic traffic requests internet mobile online
+production staging dev development test environment new existing multiple several many
+high low large modern cloud native based
+""".split())
+
+# Keyword rules cannot tell what a negation applies to ("a web app without a database"),
+# so a description containing one is left to Azure OpenAI
+_NEGATION = re.compile(r"\b(?:no|not|without|except|excluding|exclude|neither|nor|never|instead of|rather than|"
+                       r"other than|apart from)\b|n't\b")
+
+_RESOURCE_GROUP = re.compile(r"resource group(?:\s+(?:named|called))?\s+[\"']?([A-Za-z0-9][\w.-]*)", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9][a-z0-9.+-]*")
+
+_PHRASES = sorted(
+    ((phrase, resource_type) for resource_type, (_, phrases) in SERVICE_PATTERNS.items() for phrase in phrases),
+    key=lambda entry: len(entry[0]),
+    reverse=True
+)
+_PHRASE_PATTERN = re.compile(r"\b(" + "|".join(re.escape(phrase) for phrase, _ in _PHRASES) + r")s?\b")
+_PHRASE_TYPES = dict(_PHRASES)
+
+
+def extract_architecture_locally(architecture_description: str) -> tuple:
+    """
+    Extract an architecture from a description with keyword rules.
+    Returns the architecture JSON and a confidence score between 0 and 1.
+    """
+    text = architecture_description.lower()
+    found = []
+    covered = []
+    for match in _PHRASE_PATTERN.finditer(text):
+        resource_type = _PHRASE_TYPES[match.group(1)]
+        covered.append(match.span())
+        if resource_type not in found:
+            found.append(resource_type)
+
+    names = {resource_type: SERVICE_PATTERNS[resource_type][0] for resource_type in found}
+    resources = [{"name": names[resource_type], "type": resource_type, "attributes": {}} for resource_type in found]
+    relationships = [
+        {"source": names[source], "target": names[target], "type": relationship_type}
+        for source, target, relationship_type in RELATIONSHIP_RULES
+        if source in names and target in names
+    ]
+
+    clusters = []
+    group = _RESOURCE_GROUP.search(architecture_description)
+    if resources:
+        clusters.append({
+            "name": group.group(1) if group else "Resource Group",
+            "resources": [resource["name"] for resource in resources]
+        })
+        if group:
+            covered.append((group.start(1), group.end(1)))
+
+    arch_json = {
+        "diagram_label": " + ".join(resource["name"] for resource in resources) or "Azure Architecture",
+        "resources": resources,
+        "relationships": relationships,
+        "clusters": clusters
+    }
+    return arch_json, _confidence(text, covered, resources)
+
+
+def _confidence(text: str, covered: list, resources: list) -> float:
+    # Share of the meaningful words that a rule accounted for
+    if not resources:
+        return 0.0
+    negation = _NEGATION.search(text)
+    if negation:
+        logger.debug(f"Local extractor cannot interpret the negation '{negation.group(0)}'")
+        return 0.0
+    meaningful = 0
+    unexplained = []
+    for match in _WORD.finditer(text):
+        word = match.group(0)
+        if any(start <= match.start() < end for start, end in covered):
+            meaningful += 1
+            continue
+        if word in FILLER_WORDS or word.isdigit():
+            continue
+        meaningful += 1
+        unexplained.append(word)
+    unknown = [word for word in unexplained if word not in DESCRIPTIVE_WORDS]
+    if unknown:
+        logger.debug(f"Local extractor does not know: {', '.join(unknown)}")
+        return 0.0
+    if unexplained:
+        logger.debug(f"Local extractor could not place: {', '.join(unexplained)}")
+    return round(1.0 - len(unexplained) / max(meaningful, 1), 3)
@@ -0,0 +1,327 @@
+"""
+Client helpers for the resident MCP diagram server.
+
+entrypoint.sh starts azure_diagram_server_fixed.py once with the SSE transport.
+The API server sends its tool calls to that process over one long-lived MCP
+session per worker process (MCPClient), or to a local stdio server process
+held the same way when no resident server is reachable. The entrypoint uses
+--wait-ready to block until the server completes an MCP initialize handshake.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import logging
+import atexit
+import weakref
+import argparse
+import threading
+from typing import Dict, Optional
+
+import anyio
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+
+from artifact_spool import claim_artifacts
+
+logger = logging.getLogger("mcp_remote")
+
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL")
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", 5))
+MCP_TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", 120))
+# "handle" has the resident server pass outputs through the artifact spool instead of
+# base64 in the tool result; only valid when it runs on the same host
+MCP_ARTIFACT_TRANSPORT = os.getenv("MCP_ARTIFACT_TRANSPORT", "inline")
+
+
+class MCPToolError(Exception):
+    """
+    Raised when the server ran the tool and it failed; calling it again would fail
+    the same way. code names the kind of failure when the server reported one,
+    e.g. "render_limit" for a render that broke a resource limit.
+    """
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+def tool_error_text(message: str, code: Optional[str]) -> str:
+    """Error text for a failed tool that carries an error code along with the message."""
+    return json.dumps({"error": message, "code": code})
+
+
+def _parse_tool_error(text: str) -> MCPToolError:
+    # The SDK puts "Error executing tool <name>: " in front of the text of the exception
+    start = text.find('{"error"')
+    if start >= 0:
+        try:
+            error = json.loads(text[start:])
+            return MCPToolError(f"MCP tool error: {error['error']}", error.get("code"))
+        except (ValueError, KeyError, TypeError):
+            pass
+    return MCPToolError(f"MCP tool error: {text}")
+
+
+def _image_format_from_mime(mime_type: str) -> str:
+    # "image/png" -> "png", "image/svg+xml" -> "svg"
+    return mime_type.split("/", 1)[-1].split("+", 1)[0]
+
+
+def parse_tool_result(result) -> dict:
+    """
+    Convert an MCP CallToolResult into the API response payload.
+    Every rendered format is returned under "artifacts", base64 encoded, or as
+    raw bytes when the server passed them through the artifact spool; the
+    first one is also returned as image_data and image_format.
+    """
+    if result.isError:
+        raise _parse_tool_error(" ".join(getattr(item, "text", "") for item in result.content))
+    payload = {}
+    artifacts = {}
+    for item in result.content:
+        if item.type == "image":
+            artifacts.setdefault(_image_format_from_mime(item.mimeType), item.data)  # This is base64 encoded
+        elif item.type == "resource" and hasattr(item.resource, "blob"):
+            # Non-image formats arrive as diagram://<diagram id>/<format> resources
+            artifacts.setdefault(str(item.resource.uri).rsplit("/", 1)[-1], item.resource.blob)
+        elif item.type == "text":
+            # Extra text items carry JSON metadata such as the layout report
+            try:
+                metadata = json.loads(item.text)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(metadata, dict):
+                payload.update(metadata)
+    if "artifact_handles" in payload:
+        artifacts = claim_artifacts(payload.pop("artifact_handles"))
+    return artifact_payload(payload, artifacts)
+
+
+def artifact_payload(payload: dict, artifacts: dict) -> dict:
+    """Add the rendered artifacts to a tool's metadata, the first one also as image_data and image_format."""
+    if not artifacts:
+        raise Exception("The diagram tool returned no image")
+    payload["image_format"], payload["image_data"] = next(iter(artifacts.items()))
+    payload["artifacts"] = artifacts
+    if "geometry" in artifacts:
+        # Layout coordinates are small; decode them so viewers can use them directly
+        geometry = artifacts["geometry"]
+        payload["geometry"] = json.loads(geometry if isinstance(geometry, bytes) else base64.b64decode(geometry))
+    return payload
+
+
+class MCPConnectionError(Exception):
+    """Raised when no MCP session could be established, or it was lost during a call."""
+
+
+class _Connection:
+    """One MCP session and the tool calls running on it."""
+
+    def __init__(self):
+        self.ready = asyncio.get_running_loop().create_future()
+        self.closing = asyncio.Event()
+        self.calls = set()
+        self.task: Optional[asyncio.Task] = None
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_all_clients: "weakref.WeakSet[MCPClient]" = weakref.WeakSet()
+_loop_lock = threading.Lock()
+
+
+def _client_loop() -> asyncio.AbstractEventLoop:
+    """Event loop, on a daemon thread of its own, that every MCP session of this process runs on."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="mcp-client", daemon=True).start()
+        return _loop
+
+
+class MCPClient:
+    """
+    A long-lived MCP client session shared by every thread of the process.
+    Tool calls from any thread are sent on the one session concurrently and
+    matched to their results by JSON-RPC request id. A session that is lost is
+    opened again on the next call.
+    """
+
+    def __init__(self, open_transport, description: str):
+        self._open_transport = open_transport
+        self.description = description
+        self._connection: Optional[_Connection] = None
+        self.calls = 0
+        self.connects = 0
+        _all_clients.add(self)
+
+    @classmethod
+    def for_url(cls, url: str) -> "MCPClient":
+        """Client for a resident server's SSE endpoint."""
+        return cls(lambda: sse_client(url, timeout=MCP_CONNECT_TIMEOUT), url)
+
+    @classmethod
+    def for_script(cls, script_path: str, env: Optional[Dict[str, str]] = None) -> "MCPClient":
+        """Client for a server script started as a stdio child process on first use, with env added to its environment."""
+        # The child gets this process's environment (the SDK default keeps only PATH and a
+        # few others), forced onto stdio in case MCP_TRANSPORT=sse is set for a resident server
+        parameters = StdioServerParameters(command=sys.executable, args=[script_path],
+                                           env={**os.environ, **(env or {}), "MCP_TRANSPORT": "stdio"})
+        return cls(lambda: stdio_client(parameters), os.path.basename(script_path))
+
+    async def _relay(self, source, sink, connection: _Connection) -> None:
+        # The session does not notice its transport closing, so watch the stream for it
+        async with sink:
+            async for message in source:
+                if isinstance(message, Exception):
+                    # A line that is not JSON-RPC, e.g. a stray print of a stdio server; the
+                    # session goes on, and a broken transport ends this loop by closing the stream
+                    logger.warning(f"Unreadable message or transport error from {self.description}: {message}")
+                    continue
+                await sink.send(message)
+        connection.closing.set()
+
+    async def _hold(self, connection: _Connection) -> None:
+        try:
+            async with self._open_transport() as (transport_read, write_stream):
+                read_writer, read_stream = anyio.create_memory_object_stream(0)
+                async with anyio.create_task_group() as relays:
+                    relays.start_soon(self._relay, transport_read, read_writer, connection)
+                    async with ClientSession(read_stream, write_stream) as session:
+                        await asyncio.wait_for(session.initialize(), MCP_CONNECT_TIMEOUT)
+                        connection.ready.set_result(session)
+                        await connection.closing.wait()
+                    relays.cancel_scope.cancel()
+        except Exception as e:
+            if not connection.ready.done():
+                connection.ready.set_exception(MCPConnectionError(f"Could not open an MCP session to {self.description}: {e}"))
+            else:
+                logger.warning(f"MCP session to {self.description} failed: {e}")
+        finally:
+            if not connection.ready.done():
+                connection.ready.set_exception(MCPConnectionError(f"MCP session to {self.description} closed"))
+            if self._connection is connection:
+                self._connection = None
+            # Calls waiting on a lost session would otherwise wait out their whole timeout
+            for call in list(connection.calls):
+                call.cancel()
+
+    async def _call(self, tool_name: str, arguments: dict, timeout: float):
+        connection = self._connection
+        if connection is None:
+            connection = self._connection = _Connection()
+            self.connects += 1
+            connection.task = asyncio.get_running_loop().create_task(self._hold(connection))
+        try:
+            session = await asyncio.wait_for(asyncio.shield(connection.ready), MCP_CONNECT_TIMEOUT * 2)
+        except asyncio.TimeoutError:
+            raise MCPConnectionError(f"No MCP session to {self.description} within {MCP_CONNECT_TIMEOUT * 2:.0f}s")
+        task = asyncio.current_task()
+        connection.calls.add(task)
+        try:
+            return await asyncio.wait_for(session.call_tool(tool_name, arguments), timeout)
+        except asyncio.TimeoutError:
+            # asyncio.TimeoutError is only the builtin TimeoutError from Python 3.11 on
+            raise TimeoutError(f"{tool_name} on {self.description} did not finish within {timeout:.0f}s")
+        except (anyio.EndOfStream, anyio.ClosedResourceError, anyio.BrokenResourceError):
+            raise MCPConnectionError(f"MCP session to {self.description} was lost during {tool_name}")
+        except asyncio.CancelledError:
+            if connection.closing.is_set() or self._connection is not connection:
+                raise MCPConnectionError(f"MCP session to {self.description} was lost during {tool_name}")
+            raise
+        finally:
+            connection.calls.discard(task)
+
+    def call_tool(self, tool_name: str, arguments: dict, timeout: float = MCP_TOOL_TIMEOUT) -> dict:
+        """
+        Call a tool from any thread and return the parsed result payload. Raises
+        TimeoutError when the tool runs longer than timeout, MCPConnectionError
+        when there is no session and MCPToolError when the tool failed.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._call(tool_name, arguments, timeout), _client_loop())
+        result = future.result()
+        self.calls += 1
+        # Parsed in the calling thread so a tool error surfaces as MCPToolError here
+        return parse_tool_result(result)
+
+    def close(self, timeout: float = 5) -> None:
+        """End the session and wait for it to wind down, which terminates a stdio server process."""
+        connection = self._connection
+        if connection is None:
+            return
+
+        async def finish():
+            connection.closing.set()
+            await asyncio.wait_for(asyncio.shield(connection.task), timeout)
+
+        try:
+            asyncio.run_coroutine_threadsafe(finish(), _client_loop()).result(timeout + 1)
+        except Exception as e:
+            logger.warning(f"MCP session to {self.description} did not close cleanly: {e}")
+
+    def status(self) -> dict:
+        return {"server": self.description, "connected": self._connection is not None,
+                "calls": self.calls, "connects": self.connects}
+
+
+_clients: Dict[str, MCPClient] = {}
+
+
+@atexit.register
+def _close_all() -> None:
+    # A stdio server does not exit when our end of its pipe closes, so end every session
+    # before this process goes away and takes the client loop thread with it
+    for client in list(_all_clients):
+        client.close()
+
+
+def call_tool(url: str, tool_name: str, arguments: dict, timeout: float = MCP_TOOL_TIMEOUT) -> dict:
+    """Call a tool on the resident server at url over this process's shared session to it."""
+    with _loop_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = MCPClient.for_url(url)
+    return client.call_tool(tool_name, arguments, timeout)
+
+
+async def _handshake(url: str) -> None:
+    async with sse_client(url, timeout=MCP_CONNECT_TIMEOUT) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await asyncio.wait_for(session.initialize(), MCP_CONNECT_TIMEOUT)
+
+
+def wait_until_ready(url: str, timeout: float = 30, interval: float = 0.25) -> bool:
+    """Poll the server until an MCP initialize handshake succeeds or timeout expires."""
+    deadline = time.monotonic() + timeout
+    last_error: Optional[Exception] = None
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(_handshake(url))
+            return True
+        except Exception as e:
+            last_error = e
+            time.sleep(interval)
+    logger.error(f"MCP server at {url} not ready after {timeout}s: {last_error}")
+    return False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Resident MCP server client utilities")
+    parser.add_argument("--url", default=MCP_SERVER_URL, help="SSE endpoint of the MCP server")
+    parser.add_argument("--wait-ready", action="store_true", help="Block until the server answers an initialize handshake")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for readiness")
+    args = parser.parse_args()
+
+    if not args.url:
+        parser.error("--url or MCP_SERVER_URL is required")
+    if args.wait_ready:
+        started = time.monotonic()
+        if not wait_until_ready(args.url, args.timeout):
+            sys.exit(1)
+        logger.info(f"MCP server at {args.url} ready after {time.monotonic() - started:.2f}s")
@@ -0,0 +1,196 @@
+"""
+Network transport for the MCP servers.
+
+With MCP_TRANSPORT=sse a server runs as one resident process that any number
+of MCP clients connect to at http://MCP_HOST:MCP_PORT/sse, sharing its warm
+render processes, Graphviz workers and caches. SessionLimits wraps the SDK's
+SSE app so that one deployment can be shared by a fleet of agents:
+
+- at most MCP_MAX_SESSIONS SSE sessions are open at once; further clients get
+  503 with Retry-After instead of slowing every session down
+- a session ends as soon as its client disconnects, and a session with no
+  request in flight and no traffic for MCP_IDLE_TIMEOUT seconds is closed, so
+  abandoned clients do not hold a slot forever
+"""
+
+import os
+import re
+import json
+import time
+import logging
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+import anyio
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+
+logger = logging.getLogger("mcp_transport")
+
+# stdio serves the one client that started the process; sse serves many over HTTP
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", 8001))
+# Open SSE sessions allowed at once; 0 is unlimited
+MCP_MAX_SESSIONS = int(os.getenv("MCP_MAX_SESSIONS", 64))
+# Seconds without traffic after which an SSE session with no request in flight is closed; 0 keeps sessions open
+MCP_IDLE_TIMEOUT = float(os.getenv("MCP_IDLE_TIMEOUT", 600))
+# Seconds an SSE server waits for open sessions on shutdown before closing them; SSE streams never end on their own
+MCP_SHUTDOWN_TIMEOUT = float(os.getenv("MCP_SHUTDOWN_TIMEOUT", 5))
+
+MCP_TRANSPORTS = ("stdio", "sse")
+
+# The endpoint event carries the session id the client posts its messages with
+_SESSION_ID_RE = re.compile(rb"session_id=([0-9a-f]{32})")
+# Responses are serialized as {"jsonrpc":"2.0","id":<id>,"result"|"error":...}
+_RESPONSE_ID_RE = re.compile(rb'^event: message\r?\ndata: \{"jsonrpc":"2\.0","id":("[^"]*"|-?\d+),"(?:result|error)"')
+
+
+class _Session:
+    def __init__(self):
+        self.id: Optional[str] = None
+        self.last_active = time.monotonic()
+        # Ids of requests the server has not answered yet, as their JSON text
+        self.pending = set()
+        self.closed_idle = False
+        self.disconnected = False
+
+
+class SessionLimits:
+    """ASGI wrapper for an SSE MCP app: caps concurrent sessions and closes idle ones."""
+
+    def __init__(self, app, sse_path: str = "/sse", message_path: str = "/messages/",
+                 max_sessions: int = MCP_MAX_SESSIONS, idle_timeout: float = MCP_IDLE_TIMEOUT):
+        self.app = app
+        self.sse_path = sse_path
+        self.message_path = message_path
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._open = set()
+        self._by_id: Dict[str, _Session] = {}
+        self.rejected = 0
+        self.idle_closed = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.sse_path:
+            await self._stream(scope, receive, send)
+        elif scope["type"] == "http" and scope["path"].startswith(self.message_path):
+            await self._message(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _stream(self, scope, receive, send):
+        if self.max_sessions and len(self._open) >= self.max_sessions:
+            self.rejected += 1
+            logger.warning(f"Refused an MCP session: {len(self._open)} sessions open (limit {self.max_sessions})")
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"text/plain"), (b"retry-after", b"5")]})
+            await send({"type": "http.response.body", "body": b"Too many MCP sessions, retry later"})
+            return
+        session = _Session()
+        self._open.add(session)
+
+        async def watched_send(message):
+            if message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if session.id is None:
+                    match = _SESSION_ID_RE.search(body)
+                    if match:
+                        session.id = match.group(1).decode()
+                        self._by_id[session.id] = session
+                elif not body.startswith(b":"):
+                    # Anything but a keep-alive comment counts as traffic
+                    session.last_active = time.monotonic()
+                    match = _RESPONSE_ID_RE.match(body)
+                    if match:
+                        session.pending.discard(match.group(1).decode())
+            await send(message)
+
+        try:
+            async with anyio.create_task_group() as group:
+
+                async def watched_receive():
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        # The SDK keeps serving a session after its client goes away; end it
+                        # here so the slot is free for the next client
+                        session.disconnected = True
+                        group.cancel_scope.cancel()
+                    return message
+
+                if self.idle_timeout:
+                    group.start_soon(self._watch_idle, session, group.cancel_scope)
+                await self.app(scope, watched_receive, watched_send)
+                group.cancel_scope.cancel()
+        finally:
+            self._open.discard(session)
+            self._by_id.pop(session.id, None)
+        if session.closed_idle and not session.disconnected:
+            # End the chunked response properly so the client sees the stream close
+            try:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            except Exception:
+                pass
+
+    async def _watch_idle(self, session: _Session, cancel_scope) -> None:
+        interval = max(1.0, self.idle_timeout / 10)
+        while True:
+            await anyio.sleep(interval)
+            if not session.pending and time.monotonic() - session.last_active >= self.idle_timeout:
+                self.idle_closed += 1
+                session.closed_idle = True
+                logger.info(f"Closing MCP session {session.id} after {self.idle_timeout:.0f}s idle")
+                cancel_scope.cancel()
+                return
+
+    async def _message(self, scope, receive, send):
+        session_id = parse_qs(scope.get("query_string", b"").decode()).get("session_id", [None])[0]
+        session = self._by_id.get(session_id)
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        session.last_active = time.monotonic()
+        chunks = []
+
+        async def watched_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    self._track_requests(session, b"".join(chunks))
+            return message
+
+        await self.app(scope, watched_receive, send)
+
+    @staticmethod
+    def _track_requests(session: _Session, body: bytes) -> None:
+        try:
+            messages = json.loads(body)
+        except ValueError:
+            return
+        for message in messages if isinstance(messages, list) else [messages]:
+            if isinstance(message, dict) and "method" in message and "id" in message:
+                session.pending.add(json.dumps(message["id"]))
+
+    def status(self) -> dict:
+        return {
+            "sessions": len(self._open),
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            "rejected": self.rejected,
+            "idle_closed": self.idle_closed
+        }
+
+
+def run_server(mcp: FastMCP, transport: str = MCP_TRANSPORT) -> None:
+    """Run an MCP server on stdio, or over SSE behind SessionLimits."""
+    if transport not in MCP_TRANSPORTS:
+        raise Exception(f"Unknown MCP transport '{transport}'. Use one of: {', '.join(MCP_TRANSPORTS)}")
+    if transport == "stdio":
+        mcp.run(transport="stdio")
+        return
+    app = SessionLimits(mcp.sse_app(), mcp.settings.sse_path, mcp.settings.message_path)
+    logger.info(f"Serving MCP over SSE at http://{mcp.settings.host}:{mcp.settings.port}{mcp.settings.sse_path} "
+                f"(max {MCP_MAX_SESSIONS or 'unlimited'} sessions, idle timeout {MCP_IDLE_TIMEOUT or 'off'})")
+    uvicorn.run(app, host=mcp.settings.host, port=mcp.settings.port, log_level=mcp.settings.log_level.lower(),
+                timeout_graceful_shutdown=MCP_SHUTDOWN_TIMEOUT)
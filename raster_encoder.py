@@ -0,0 +1,127 @@
+"""
+Size and encode-time controls for raster diagram output.
+
+Graphviz writes PNGs at its default resolution and zlib level. Raster options
+let a request trade file size against encode time: the resolution (dpi) is
+passed to Graphviz, and the PNG it produces is re-encoded with Pillow only
+when the request asks for something Graphviz does not do itself: a maximum
+pixel size, a zlib compression level, palette quantization or WebP output.
+
+    {"preset": "small"}                                   # 256-colour palette, best compression
+    {"dpi": 150, "max_pixels": 2048, "compress_level": 1} # sharper but quick to encode
+"""
+
+import io
+import os
+import math
+import time
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger("raster_encoder")
+
+# Graphviz draws bitmaps at 96 dpi unless told otherwise
+RASTER_DPI = int(os.getenv("RASTER_DPI", 96))
+# Longest side of a raster output in pixels; 0 keeps whatever Graphviz produced
+RASTER_MAX_PIXELS = int(os.getenv("RASTER_MAX_PIXELS", 0))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", 80))
+RASTER_MAX_DPI = 600
+
+# Node icons are drawn 1.4 inches wide
+ICON_INCHES = 1.4
+
+RASTER_PRESETS = {
+    # Cheapest encode, largest file
+    "fast": {"compress_level": 1},
+    # Graphviz output untouched
+    "balanced": {},
+    # Smallest PNG: 256-colour palette at the highest zlib level
+    "small": {"quantize": 256, "compress_level": 9},
+}
+
+try:
+    from PIL import Image as PILImage
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+def parse_raster_options(options: Optional[dict] = None) -> dict:
+    """Merge a request's raster options with their preset and the defaults, validating each value."""
+    options = dict(options or {})
+    preset = options.pop("preset", None)
+    if preset is not None and preset not in RASTER_PRESETS:
+        raise Exception(f"Unknown raster preset '{preset}'. Use one of: {', '.join(RASTER_PRESETS)}")
+    merged = {"dpi": RASTER_DPI, "max_pixels": RASTER_MAX_PIXELS, "compress_level": None, "quantize": 0,
+              "webp_quality": WEBP_QUALITY, **RASTER_PRESETS.get(preset, {}), **options}
+    unknown = set(merged) - {"dpi", "max_pixels", "compress_level", "quantize", "webp_quality"}
+    if unknown:
+        raise Exception(f"Unknown raster options: {', '.join(sorted(unknown))}")
+    try:
+        for key in ("dpi", "max_pixels", "quantize", "webp_quality"):
+            merged[key] = int(merged[key])
+        if merged["compress_level"] is not None:
+            merged["compress_level"] = int(merged["compress_level"])
+    except (TypeError, ValueError) as e:
+        raise Exception(f"Raster options must be integers: {e}")
+    if not 18 <= merged["dpi"] <= RASTER_MAX_DPI:
+        raise Exception(f"dpi must be between 18 and {RASTER_MAX_DPI}")
+    if merged["max_pixels"] < 0:
+        raise Exception("max_pixels must not be negative")
+    if merged["compress_level"] is not None and not 0 <= merged["compress_level"] <= 9:
+        raise Exception("compress_level must be between 0 and 9")
+    if not 0 <= merged["quantize"] <= 256:
+        raise Exception("quantize must be a palette size up to 256 (0 disables it)")
+    if not 1 <= merged["webp_quality"] <= 100:
+        raise Exception("webp_quality must be between 1 and 100")
+    if preset is not None:
+        merged["preset"] = preset
+    return merged
+
+
+def icon_pixels_for(dpi: int) -> int:
+    """Pixel size the node icons are drawn at for a given dpi."""
+    return math.ceil(ICON_INCHES * dpi)
+
+
+def needs_reencode(options: dict, output_format: str) -> bool:
+    return output_format == "webp" or bool(
+        options["max_pixels"] or options["quantize"] or options["compress_level"] is not None
+    )
+
+
+def encode_raster(png: bytes, output_format: str, options: dict) -> Tuple[bytes, dict]:
+    """
+    Apply the raster options to a Graphviz PNG and encode it as png or webp.
+    Returns the encoded bytes and a report of the sizes and the encode time.
+    """
+    report = {"graphviz_bytes": len(png), "dpi": options["dpi"]}
+    if not needs_reencode(options, output_format):
+        report["bytes"] = len(png)
+        return png, report
+    if not PIL_AVAILABLE:
+        if output_format == "webp":
+            raise Exception("WebP output needs the Pillow package")
+        logger.warning("Pillow is not installed; returning the PNG as Graphviz wrote it")
+        report["bytes"] = len(png)
+        return png, report
+
+    started = time.perf_counter()
+    with PILImage.open(io.BytesIO(png)) as image:
+        image.load()
+        if options["max_pixels"] and max(image.size) > options["max_pixels"]:
+            image.thumbnail((options["max_pixels"], options["max_pixels"]), PILImage.LANCZOS)
+            report["resized_to"] = list(image.size)
+        buffer = io.BytesIO()
+        if output_format == "webp":
+            image.save(buffer, format="WEBP", quality=options["webp_quality"], method=4)
+        else:
+            if options["quantize"]:
+                # Fast octree quantization keeps the alpha channel of transparent backgrounds
+                image = image.convert("RGBA").quantize(options["quantize"], method=PILImage.Quantize.FASTOCTREE)
+            compress_level = options["compress_level"] if options["compress_level"] is not None else 6
+            image.save(buffer, format="PNG", compress_level=compress_level)
+    encoded = buffer.getvalue()
+    report["bytes"] = len(encoded)
+    report["encode_seconds"] = round(time.perf_counter() - started, 4)
+    return encoded, report
@@ -0,0 +1,179 @@
+"""
+Client-side request and token rate limiting for Azure OpenAI deployments.
+
+Each deployment gets a RateLimiter with a requests-per-minute and a
+tokens-per-minute bucket that refill continuously. Callers that would exceed
+either budget wait in a FIFO queue instead of being rejected, so bursts are
+smoothed to the deployment's quota rather than turned into 429s. Tokens are
+counted the way Azure OpenAI counts them against TPM: the estimated prompt
+tokens plus max_tokens, charged when the request is sent.
+
+Limiters live in the memory of one process. When several processes call the
+same deployments, each with its own limiters (API workers running the tools
+in-process, or each starting a local MCP server while the resident one is
+unreachable), each enforces an equal share of the quota: LLM_QUOTA_SHARES,
+or share() for a process that learns the number at run time.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("rate_limiter")
+
+# Defaults for deployments that do not set rpm/tpm; 0 means unlimited
+AZURE_OPENAI_RPM = int(os.getenv("AZURE_OPENAI_RPM", 0))
+AZURE_OPENAI_TPM = int(os.getenv("AZURE_OPENAI_TPM", 0))
+# Processes that each run their own limiters against the same quota
+LLM_QUOTA_SHARES = max(1, int(os.getenv("LLM_QUOTA_SHARES", 1)))
+# Rough characters per token for prompt estimates
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(body: dict) -> int:
+    """Estimate the TPM cost of a chat completion body: prompt tokens plus max_tokens."""
+    prompt_chars = sum(len(json.dumps(message.get("content", ""))) for message in body.get("messages", []))
+    if body.get("response_format"):
+        prompt_chars += len(json.dumps(body["response_format"]))
+    return prompt_chars // CHARS_PER_TOKEN + int(body.get("max_tokens", 0))
+
+
+def _share(limit: int, shares: int) -> int:
+    return max(1, limit // shares) if limit else 0
+
+
+class RateLimiter:
+    """Requests and tokens per minute token buckets with a FIFO wait queue."""
+
+    def __init__(self, rpm: int = AZURE_OPENAI_RPM, tpm: int = AZURE_OPENAI_TPM, shares: int = LLM_QUOTA_SHARES):
+        # The deployment's whole quota; this limiter enforces 1/shares of it
+        self.quota_rpm = rpm
+        self.quota_tpm = tpm
+        self.shares = max(1, shares)
+        self.rpm = _share(rpm, self.shares)
+        self.tpm = _share(tpm, self.shares)
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._queue = deque()
+        # Queue wait metrics
+        self.granted = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rpm or self.tpm)
+
+    def share(self, shares: int) -> None:
+        """Enforce 1/shares of the quota, for when that many processes each run a limiter against it."""
+        with self._cond:
+            self._refill()
+            self.shares = max(1, shares)
+            self.rpm = _share(self.quota_rpm, self.shares)
+            self.tpm = _share(self.quota_tpm, self.shares)
+            self._requests = min(self._requests, self.rpm)
+            self._tokens = min(self._tokens, self.tpm)
+            self._cond.notify_all()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _shortfall(self, requests: float, tokens: float) -> float:
+        # Seconds until both buckets hold enough for the given amounts
+        wait = 0.0
+        if self.rpm and self._requests < requests:
+            wait = (requests - self._requests) * 60 / self.rpm
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _clamp(self, tokens: int) -> int:
+        # A request larger than the whole bucket would otherwise wait forever
+        return min(tokens, self.tpm) if self.tpm else tokens
+
+    def estimate_wait(self, tokens: int) -> float:
+        """Seconds a new request of this size would wait, counting everyone already queued."""
+        if not self.enabled:
+            return 0.0
+        with self._cond:
+            self._refill()
+            queued = sum(ticket[0] for ticket in self._queue)
+            return self._shortfall(len(self._queue) + 1, queued + self._clamp(tokens))
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Take capacity for one request only if it is available without waiting."""
+        if not self.enabled:
+            return True
+        tokens = self._clamp(tokens)
+        with self._cond:
+            self._refill()
+            if self._queue or self._shortfall(1, tokens) > 0:
+                return False
+            self._take(tokens)
+            self.granted += 1
+            return True
+
+    def _take(self, tokens: int) -> None:
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+
+    def acquire(self, tokens: int) -> float:
+        """Wait in line until one request of this size fits the budget; returns the seconds waited."""
+        if not self.enabled:
+            return 0.0
+        tokens = self._clamp(tokens)
+        started = time.monotonic()
+        # A list is a unique ticket even when two callers ask for the same amount
+        ticket = [tokens]
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    wait = None
+                    if self._queue[0] is ticket:
+                        wait = self._shortfall(1, tokens)
+                        if wait <= 0:
+                            self._take(tokens)
+                            break
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+            waited = time.monotonic() - started
+            self.granted += 1
+            if waited > 0.001:
+                self.delayed += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def status(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "shares": self.shares,
+                "available_requests": round(self._requests, 2) if self.rpm else None,
+                "available_tokens": round(self._tokens) if self.tpm else None,
+                "queued": len(self._queue),
+                "granted": self.granted,
+                "delayed": self.delayed,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "max_wait_seconds": round(self.max_wait, 3)
+            }
@@ -0,0 +1,176 @@
+"""
+Process pool for diagram renders.
+
+Building the DOT source with the diagrams library, reading the layout back and
+post-processing PNG and SVG output are Python work, so renders running in
+threads of one server process are serialized by the GIL. The render executor
+runs each render in one of RENDER_PROCESSES worker processes instead.
+
+On POSIX the workers are forked from a forkserver that has already imported
+diagram_renderer, so every worker starts with the diagrams library, the icon
+registry and Pillow loaded. Each worker keeps one warm Graphviz renderer of its
+own (see graphviz_pool). Outputs of RENDER_SHM_MIN_BYTES or more come back in
+a shared memory block rather than through the result pipe.
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("render_executor")
+
+# Render processes; 0 renders in threads of the calling process
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", os.cpu_count() or 1))
+# Outputs at least this large are returned through shared memory instead of the result pipe
+RENDER_SHM_MIN_BYTES = int(os.getenv("RENDER_SHM_MIN_BYTES", 256 * 1024))
+
+
+def _initialize_worker() -> None:
+    from graphviz_pool import graphviz_pool
+    # A worker renders one diagram at a time, so one warm Graphviz renderer is enough
+    graphviz_pool.size = 1
+    graphviz_pool.warm()
+
+
+def _ready() -> bool:
+    return True
+
+
+def _export(artifacts: Dict[str, bytes]) -> Tuple[Optional[str], dict]:
+    """Move large outputs into one shared memory block; returns its name and where each output is."""
+    large = {fmt: data for fmt, data in artifacts.items() if len(data) >= RENDER_SHM_MIN_BYTES}
+    if not large:
+        return None, {fmt: ("inline", data) for fmt, data in artifacts.items()}
+    block = shared_memory.SharedMemory(create=True, size=sum(len(data) for data in large.values()))
+    entries = {}
+    offset = 0
+    for fmt, data in artifacts.items():
+        if fmt in large:
+            block.buf[offset:offset + len(data)] = data
+            entries[fmt] = ("shm", offset, len(data))
+            offset += len(data)
+        else:
+            entries[fmt] = ("inline", data)
+    name = block.name
+    # The caller unlinks the block once it has copied the outputs out
+    block.close()
+    return name, entries
+
+
+def _import(name: Optional[str], entries: dict) -> Dict[str, bytes]:
+    if name is None:
+        return {fmt: entry[1] for fmt, entry in entries.items()}
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        artifacts = {}
+        for fmt, entry in entries.items():
+            if entry[0] == "shm":
+                _, offset, size = entry
+                artifacts[fmt] = bytes(block.buf[offset:offset + size])
+            else:
+                artifacts[fmt] = entry[1]
+        return artifacts
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _render(args: tuple, kwargs: dict):
+    from diagram_renderer import render_diagram_formats
+    artifacts, report = render_diagram_formats(*args, **kwargs)
+    name, entries = _export(artifacts)
+    report["render_pid"] = os.getpid()
+    return name, entries, report
+
+
+class RenderExecutor:
+    """Runs render_diagram_formats in a pool of preloaded worker processes."""
+
+    def __init__(self, processes: int = RENDER_PROCESSES):
+        self.processes = processes
+        self.enabled = processes > 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.shm_transfers = 0
+        self.restarts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                if os.name == "posix":
+                    context = multiprocessing.get_context("forkserver")
+                    # Imported once in the forkserver; workers fork with it already loaded
+                    context.set_forkserver_preload(["diagram_renderer"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(self.processes, mp_context=context,
+                                                     initializer=_initialize_worker)
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, *args, **kwargs) -> Tuple[Dict[str, bytes], dict]:
+        """
+        render_diagram_formats in a worker process, or in the calling thread when
+        the executor is disabled. Blocks until the render is done.
+        """
+        if not self.enabled:
+            from diagram_renderer import render_diagram_formats
+            return render_diagram_formats(*args, **kwargs)
+        executor = self._get_executor()
+        try:
+            name, entries, report = executor.submit(_render, args, kwargs).result()
+        except BrokenProcessPool as e:
+            # A worker died (the pool cannot tell which render killed it); start a fresh pool
+            self._reset(executor)
+            raise Exception(f"Render process died: {e}")
+        self.renders += 1
+        if name is not None:
+            self.shm_transfers += 1
+        return _import(name, entries), report
+
+    def warm(self) -> int:
+        """Start every worker ahead of the first request; returns the number of render processes."""
+        if not self.enabled:
+            return 0
+        executor = self._get_executor()
+        futures = [executor.submit(_ready) for _ in range(self.processes)]
+        try:
+            for future in futures:
+                future.result()
+            return self.processes
+        except BrokenProcessPool as e:
+            # Workers that cannot even start would fail every render; render in-process instead
+            self._reset(executor)
+            self.enabled = False
+            logger.warning(f"Render processes could not start, rendering in-process: {e}")
+            return 0
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "processes": self.processes,
+            "renders": self.renders,
+            "shm_transfers": self.shm_transfers,
+            "restarts": self.restarts
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+render_executor = RenderExecutor()
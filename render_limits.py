@@ -0,0 +1,142 @@
+"""
+Hard resource limits for Graphviz renders.
+
+The layout time budget bounds how long a caller waits, but not what a render
+consumes while it runs. These limits are enforced by the operating system on
+the process doing the layout, a pool worker or a one-shot dot process:
+
+- CPU seconds per render (RLIMIT_CPU, delivered as SIGXCPU)
+- address space of the render process (RLIMIT_AS)
+- bytes of each rendered output, checked before it is returned
+
+A render that breaks a limit is killed and reported as RenderLimitError, so a
+pathological architecture fails on its own instead of starving other renders.
+"""
+
+import os
+import signal
+import logging
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    # Not available on Windows; only the output size cap applies there
+    RESOURCE_AVAILABLE = False
+# Limits of another process can only be set on Linux; elsewhere one-shot dot processes run without them
+PRLIMIT_AVAILABLE = RESOURCE_AVAILABLE and hasattr(resource, "prlimit")
+
+logger = logging.getLogger("render_limits")
+
+# 0 disables a limit
+RENDER_MAX_CPU_SECONDS = int(os.getenv("RENDER_MAX_CPU_SECONDS", 30))
+RENDER_MAX_MEMORY_MB = int(os.getenv("RENDER_MAX_MEMORY_MB", 1024))
+RENDER_MAX_OUTPUT_BYTES = int(os.getenv("RENDER_MAX_OUTPUT_BYTES", 50 * 1024 * 1024))
+
+
+class RenderLimitError(Exception):
+    """Raised when a render is killed for exceeding a resource limit."""
+
+    # Error code of the failure in tool results, see mcp_remote.MCPToolError
+    code = "render_limit"
+
+
+def limit_memory() -> None:
+    """Cap the address space of the current process; called once in each render process."""
+    if RESOURCE_AVAILABLE and RENDER_MAX_MEMORY_MB:
+        limit = RENDER_MAX_MEMORY_MB * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def limit_cpu_from_now() -> None:
+    """
+    Allow the current process RENDER_MAX_CPU_SECONDS more CPU time. Only the soft
+    limit moves, so a long-lived worker can grant each render its own allowance.
+    """
+    if RESOURCE_AVAILABLE and RENDER_MAX_CPU_SECONDS:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime) + 1 + RENDER_MAX_CPU_SECONDS
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _lower_soft_limit(pid: int, limit_type: int, limit: int) -> None:
+    _, hard = resource.prlimit(pid, limit_type)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.prlimit(pid, limit_type, (limit, hard))
+
+
+def limit_child_process(pid: int) -> None:
+    """
+    Apply both limits to a one-shot dot process that was just started and is
+    still waiting for its input. They are set from this process with prlimit,
+    because a preexec_fn is not safe to run in a process with threads.
+    """
+    if not PRLIMIT_AVAILABLE:
+        return
+    try:
+        if RENDER_MAX_MEMORY_MB:
+            _lower_soft_limit(pid, resource.RLIMIT_AS, RENDER_MAX_MEMORY_MB * 1024 * 1024)
+        if RENDER_MAX_CPU_SECONDS:
+            _lower_soft_limit(pid, resource.RLIMIT_CPU, RENDER_MAX_CPU_SECONDS)
+    except ProcessLookupError:
+        # It already exited; its exit status tells what went wrong
+        pass
+
+
+def check_output_size(output_format: str, size: int) -> None:
+    if RENDER_MAX_OUTPUT_BYTES and size > RENDER_MAX_OUTPUT_BYTES:
+        raise RenderLimitError(
+            f"Render limit exceeded: {output_format} output is {size} bytes (limit {RENDER_MAX_OUTPUT_BYTES})"
+        )
+
+
+# What Graphviz, the C library and the C++ runtime print when an allocation fails
+OUT_OF_MEMORY_SIGNATURES = ("out of memory", "cannot allocate memory", "enomem", "std::bad_alloc")
+
+
+def out_of_memory(stderr: str) -> bool:
+    """Whether a render's error output shows that it ran out of memory."""
+    stderr = stderr.lower()
+    return any(signature in stderr for signature in OUT_OF_MEMORY_SIGNATURES)
+
+
+def out_of_memory_message() -> str:
+    if RENDER_MAX_MEMORY_MB:
+        return f"Render limit exceeded: the render ran out of memory under the {RENDER_MAX_MEMORY_MB} MB limit"
+    return "Render limit exceeded: the render ran out of memory"
+
+
+def is_limit_exit(returncode: int, stderr: str = "") -> bool:
+    """
+    Whether a render process that ended with returncode was stopped by a limit:
+    SIGXCPU from its CPU limit, SIGKILL, or a failed allocation under its
+    address space cap. Any other crash is a Graphviz failure, not a limit.
+    """
+    if RESOURCE_AVAILABLE and returncode == -signal.SIGXCPU:
+        return True
+    if returncode == -signal.SIGKILL:
+        return True
+    return returncode != 0 and out_of_memory(stderr)
+
+
+def describe_exit(returncode: int, stderr: str = "") -> str:
+    """Explain why a render process ended, in terms of the limit that stopped it when one did."""
+    if RESOURCE_AVAILABLE and returncode == -signal.SIGXCPU:
+        return f"Render limit exceeded: more than {RENDER_MAX_CPU_SECONDS} CPU seconds"
+    if returncode == -signal.SIGKILL:
+        return "Render limit exceeded: the render process was killed"
+    if returncode != 0 and out_of_memory(stderr):
+        return out_of_memory_message()
+    if returncode < 0:
+        try:
+            return f"The render process crashed with {signal.Signals(-returncode).name}"
+        except ValueError:
+            pass
+    return f"The render process exited with code {returncode}"
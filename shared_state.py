@@ -0,0 +1,258 @@
+"""
+Shared state for the API server and the resident MCP server.
+
+When the API server runs with several worker processes, in-memory dictionaries
+are no longer shared between requests. This module keeps the response cache,
+the diagram catalog and the job records in a small SQLite database so that
+every worker sees the same state. The MCP server stores the architecture and
+node positions of each rendered diagram here for incremental re-renders.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger("shared_state")
+
+# Kept apart from the diagrams directory, whose files the API server serves
+STATE_DIR = os.getenv("STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state"))
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(STATE_DIR, "state.db"))
+# Seconds finished jobs, catalogued diagrams, cache entries and stored layouts are kept; 0 keeps them forever
+STATE_RETENTION_SECONDS = float(os.getenv("STATE_RETENTION_SECONDS", 7 * 24 * 3600))
+# Seconds between two retention sweeps of one process
+STATE_SWEEP_INTERVAL = float(os.getenv("STATE_SWEEP_INTERVAL", 600))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    image_format TEXT NOT NULL,
+    diagram_id TEXT,
+    created REAL NOT NULL,
+    artifacts TEXT
+);
+CREATE TABLE IF NOT EXISTS diagrams (
+    filename TEXT PRIMARY KEY,
+    image_format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    worker_pid INTEGER NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    filename TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS layouts (
+    diagram_id TEXT PRIMARY KEY,
+    arch_json TEXT NOT NULL,
+    positions TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+class SharedState:
+    """SQLite-backed cache, diagram catalog and job table shared by all workers."""
+
+    def __init__(self, db_path: str = STATE_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connection() as conn:
+            # WAL lets readers in other workers proceed while one worker writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Databases created before multi-format renders lack the artifacts column
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(cache)")}
+            if "artifacts" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN artifacts TEXT")
+
+    @contextmanager
+    def _connection(self):
+        # One connection per thread; sqlite3 connections must not cross threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        with conn:
+            yield conn
+
+    # Response cache
+
+    def cache_get(self, key: str, max_age: Optional[float] = None) -> Optional[dict]:
+        """
+        Return the cached diagram entry for key, or None if missing or expired.
+        "artifacts" maps every format rendered with the diagram to its filename.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT filename, image_format, diagram_id, created, artifacts FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row["created"] > max_age:
+            return None
+        entry = dict(row)
+        entry["artifacts"] = json.loads(row["artifacts"]) if row["artifacts"] else {row["image_format"]: row["filename"]}
+        return entry
+
+    def cache_put(self, key: str, filename: str, image_format: str, diagram_id: Optional[str] = None,
+                  artifacts: Optional[dict] = None) -> None:
+        """Cache a diagram; artifacts maps each format of a multi-format render to its filename."""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, filename, image_format, diagram_id, created, artifacts) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, filename, image_format, diagram_id, time.time(), json.dumps(artifacts) if artifacts else None)
+            )
+
+    # Diagram catalog
+
+    def add_diagram(self, filename: str, image_format: str, size: int) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO diagrams (filename, image_format, size, created) VALUES (?, ?, ?, ?)",
+                (filename, image_format, size, time.time())
+            )
+
+    def list_diagrams(self) -> list:
+        """Return catalog entries, newest first."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT filename, image_format, size, created FROM diagrams ORDER BY created DESC"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_diagram(self, filename: str) -> Optional[dict]:
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT filename, image_format, size, created FROM diagrams WHERE filename = ?", (filename,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def latest_diagram(self, image_formats: Optional[tuple] = None) -> Optional[dict]:
+        """Return the newest catalog entry, of one of image_formats if given."""
+        query = "SELECT filename, image_format, size, created FROM diagrams"
+        params = ()
+        if image_formats:
+            query += f" WHERE image_format IN ({', '.join('?' * len(image_formats))})"
+            params = tuple(image_formats)
+        with self._connection() as conn:
+            row = conn.execute(query + " ORDER BY created DESC LIMIT 1", params).fetchone()
+        return dict(row) if row else None
+
+    # Jobs
+
+    def start_job(self, job_id: str) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, worker_pid, created, updated) VALUES (?, 'running', ?, ?, ?)",
+                (job_id, os.getpid(), now, now)
+            )
+
+    def finish_job(self, job_id: str, filename: Optional[str] = None, error: Optional[str] = None) -> None:
+        status = "failed" if error else "completed"
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated = ?, filename = ?, error = ? WHERE id = ?",
+                (status, time.time(), filename, error, job_id)
+            )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def interrupt_running_jobs(self, worker_pid: Optional[int] = None) -> int:
+        """Mark jobs still running in this worker as interrupted, e.g. on shutdown."""
+        worker_pid = worker_pid or os.getpid()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'interrupted', updated = ? WHERE status = 'running' AND worker_pid = ?",
+                (time.time(), worker_pid)
+            )
+        return cursor.rowcount
+
+    # Retention
+
+    def sweep(self, max_age: float = STATE_RETENTION_SECONDS) -> list:
+        """
+        Delete finished jobs, catalogued diagrams, cache entries and layouts older than max_age.
+        Returns the filenames dropped from the catalog, whose files the caller removes.
+        """
+        if not max_age:
+            return []
+        cutoff = time.time() - max_age
+        with self._connection() as conn:
+            filenames = [row["filename"] for row in conn.execute(
+                "SELECT filename FROM diagrams WHERE created < ?", (cutoff,)
+            )]
+            conn.execute("DELETE FROM diagrams WHERE created < ?", (cutoff,))
+            conn.execute("DELETE FROM cache WHERE created < ?", (cutoff,))
+            conn.execute("DELETE FROM jobs WHERE updated < ? AND status != 'running'", (cutoff,))
+        self.sweep_layouts(max_age)
+        if filenames:
+            logger.info(f"Removed {len(filenames)} diagram(s) older than {max_age:.0f}s from the catalog")
+        return filenames
+
+    def sweep_layouts(self, max_age: float = STATE_RETENTION_SECONDS) -> int:
+        """Delete layouts older than max_age; their diagrams can then only be re-rendered in full."""
+        if not max_age:
+            return 0
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM layouts WHERE created < ?", (time.time() - max_age,))
+        return cursor.rowcount
+
+    def _sweep_due(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_sweep < STATE_SWEEP_INTERVAL:
+            return False
+        self._last_sweep = now
+        return True
+
+    def maybe_sweep(self) -> list:
+        """sweep() at most once every STATE_SWEEP_INTERVAL seconds in this process."""
+        return self.sweep() if self._sweep_due() else []
+
+    def maybe_sweep_layouts(self) -> int:
+        """sweep_layouts() at most once every STATE_SWEEP_INTERVAL seconds in this process."""
+        return self.sweep_layouts() if self._sweep_due() else 0
+
+    # Layouts
+
+    def put_layout(self, diagram_id: str, arch_json: dict, positions: dict) -> None:
+        """Remember the architecture and node positions (resource name -> [x, y]) of a diagram."""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO layouts (diagram_id, arch_json, positions, created) VALUES (?, ?, ?, ?)",
+                (diagram_id, json.dumps(arch_json), json.dumps(positions), time.time())
+            )
+
+    def get_layout(self, diagram_id: str) -> Optional[dict]:
+        """Return {"arch_json": ..., "positions": ...} for a diagram id, or None."""
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT arch_json, positions FROM layouts WHERE diagram_id = ?", (diagram_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"arch_json": json.loads(row["arch_json"]), "positions": json.loads(row["positions"])}
+
+
+def make_cache_key(**params) -> str:
+    """Build a stable cache key from request parameters."""
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
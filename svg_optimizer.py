@@ -0,0 +1,135 @@
+"""
+SVG post-processing and precompression for rendered diagrams.
+
+Graphviz writes one <image> element per node pointing at the icon file on the
+server, so its SVGs only display on the machine that rendered them, and the
+diagrams library's inline variant repeats the same base64 icon for every node.
+optimize_svg embeds each distinct icon once as a <symbol> in <defs> and turns
+every node image into a <use> of it, drops comments and the whitespace
+between elements, and leaves a self-contained file that is far smaller than
+the inlined original.
+
+precompress writes .gz (and .br when the brotli package is installed) copies
+next to a saved artifact so the API can serve them with Content-Encoding
+instead of compressing on every request.
+"""
+
+import os
+import re
+import gzip
+import base64
+import logging
+import mimetypes
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger("svg_optimizer")
+
+SVG_OPTIMIZE = os.getenv("SVG_OPTIMIZE", "true").lower() == "true"
+PRECOMPRESS_ARTIFACTS = os.getenv("PRECOMPRESS_ARTIFACTS", "true").lower() == "true"
+# Files smaller than this are not worth a compressed copy
+PRECOMPRESS_MIN_BYTES = int(os.getenv("PRECOMPRESS_MIN_BYTES", 1024))
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Encodings in order of preference, with the suffix of their precompressed copy
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")] if BROTLI_AVAILABLE else [("gzip", ".gz")]
+
+_IMAGE_RE = re.compile(r"<image\b([^>]*?)/>")
+_ATTR_RE = re.compile(r'([\w:-]+)="([^"]*)"')
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_BETWEEN_TAGS_RE = re.compile(r">\s+<")
+_SVG_OPEN_RE = re.compile(r"<svg\b[^>]*>")
+
+
+def _data_uri(href: str) -> str:
+    """Inline a local icon file as a data URI; other references are kept as they are."""
+    if href.startswith("data:") or "://" in href or not os.path.isfile(href):
+        return href
+    mime_type = mimetypes.guess_type(href)[0] or "image/png"
+    with open(href, "rb") as f:
+        return f"data:{mime_type};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+
+def optimize_svg(svg: bytes) -> Tuple[bytes, dict]:
+    """
+    Deduplicate node icons into <symbol>/<use> definitions and strip comments
+    and inter-element whitespace. Returns the new SVG and a small report.
+    """
+    text = svg.decode("utf-8")
+    symbols: Dict[str, Tuple[str, str, str]] = {}
+    uses = 0
+
+    def replace_image(match):
+        nonlocal uses
+        attrs = dict(_ATTR_RE.findall(match.group(1)))
+        href = attrs.get("xlink:href") or attrs.get("href")
+        if not href:
+            return match.group(0)
+        width, height = attrs.get("width", "0").rstrip("px"), attrs.get("height", "0").rstrip("px")
+        if href not in symbols:
+            # The first instance's size becomes the symbol's viewBox; <use> scales the others
+            symbols[href] = (f"icon{len(symbols)}", width, height)
+        symbol_id = symbols[href][0]
+        uses += 1
+        position = "".join(f' {name}="{attrs[name]}"' for name in ("x", "y") if name in attrs)
+        return f'<use xlink:href="#{symbol_id}"{position} width="{width}" height="{height}"/>'
+
+    text = _COMMENT_RE.sub("", text)
+    text = _IMAGE_RE.sub(replace_image, text)
+    text = _BETWEEN_TAGS_RE.sub("><", text).strip()
+
+    if symbols:
+        definitions: List[str] = []
+        for href, (symbol_id, width, height) in symbols.items():
+            definitions.append(
+                f'<symbol id="{symbol_id}" viewBox="0 0 {width} {height}" preserveAspectRatio="xMinYMin meet">'
+                f'<image xlink:href="{_data_uri(href)}" width="{width}" height="{height}"/></symbol>'
+            )
+        opening = _SVG_OPEN_RE.search(text)
+        if opening is not None:
+            svg_tag = opening.group(0)
+            if "xmlns:xlink" not in svg_tag:
+                svg_tag = svg_tag[:-1] + ' xmlns:xlink="http://www.w3.org/1999/xlink">'
+            text = text[:opening.start()] + svg_tag + "<defs>" + "".join(definitions) + "</defs>" + text[opening.end():]
+
+    optimized = text.encode("utf-8")
+    return optimized, {"bytes_before": len(svg), "bytes_after": len(optimized), "icons": len(symbols), "uses": uses}
+
+
+def precompress(path: str) -> List[str]:
+    """Write compressed copies of a file next to it; returns the encodings written."""
+    if not PRECOMPRESS_ARTIFACTS or os.path.getsize(path) < PRECOMPRESS_MIN_BYTES:
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    for encoding, suffix in ENCODINGS:
+        compressed = brotli.compress(data, quality=11) if encoding == "br" else gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) >= len(data):
+            continue
+        temp_path = f"{path}{suffix}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(temp_path, path + suffix)
+        written.append(encoding)
+    return written
+
+
+def choose_encoding(path: str, accept_encoding: str) -> Tuple[str, str]:
+    """
+    Pick the best precompressed copy of path the client accepts.
+    Returns (path to serve, Content-Encoding or "" for the original).
+    """
+    accepted = {
+        token.split(";")[0].strip().lower()
+        for token in (accept_encoding or "").split(",")
+        if not token.strip().endswith(";q=0")
+    }
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.exists(path + suffix):
+            return path + suffix, encoding
+    return path, ""
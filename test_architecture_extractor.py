@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+import architecture_extractor
+from architecture_extractor import IncrementalArchitectureParser, apply_json_patch
+from llm_router import DeploymentRouter
+from llm_stub_server import STUB_ARCHITECTURE
+
+DOCUMENT = {
+    "diagram_label": "Shop {v2} \"beta\"",
+    "resources": [
+        {"name": "Web App", "type": "Azure.WebApp", "attributes": {"location": "East US", "sku": "S1"}},
+        {"name": "Orders DB", "type": "Azure.SQLDatabase", "attributes": {"location": "", "sku": "}]"}}
+    ],
+    "relationships": [{"source": "Web App", "target": "Orders DB", "type": "connects_to"}],
+    "clusters": [{"name": "rg-shop", "parent": None, "resources": ["Web App", "Orders DB"]}]
+}
+
+
+def _feed(text: str, size: int) -> IncrementalArchitectureParser:
+    parser = IncrementalArchitectureParser()
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+    return parser
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 10000])
+def test_any_chunking_gives_the_whole_document(size):
+    parser = _feed(json.dumps(DOCUMENT, indent=2), size)
+    assert parser.done
+    assert parser.result == DOCUMENT
+    assert parser.rejected == []
+
+
+def test_text_around_the_document_is_ignored():
+    parser = _feed("```json\n" + json.dumps(DOCUMENT) + "\n```\nThat is the architecture.", 5)
+    assert parser.done
+    assert parser.result == DOCUMENT
+
+
+def test_feed_reports_completion_and_ignores_later_text():
+    parser = IncrementalArchitectureParser()
+    text = json.dumps({"diagram_label": "x", "resources": []})
+    assert parser.feed(text[:-1]) is False
+    assert parser.feed(text[-1]) is True
+    assert parser.feed('{"resources": [1]}') is True
+    assert parser.result == {"diagram_label": "x", "resources": []}
+
+
+def test_incomplete_document_is_not_done():
+    parser = _feed(json.dumps(DOCUMENT)[:-3], 3)
+    assert not parser.done
+    assert parser.result["resources"] == DOCUMENT["resources"]
+
+
+def test_invalid_entries_are_dropped_by_the_schema_models():
+    document = {
+        "resources": [{"name": "Web App", "type": "Azure.WebApp"}, {"name": ""}, {"type": "Azure.WebApp"}, "Redis"],
+        "relationships": [{"source": "Web App"}, {"source": "Web App", "target": "Web App"}],
+        "clusters": [{"name": "rg", "resources": "Web App"}, {"name": "rg", "parent": 3}]
+    }
+    parser = _feed(json.dumps(document), 11)
+    assert parser.done
+    assert parser.result["resources"] == [{"name": "Web App", "type": "Azure.WebApp"}]
+    assert parser.result["relationships"] == [{"source": "Web App", "target": "Web App"}]
+    assert parser.result["clusters"] == []
+    assert [entry["section"] for entry in parser.rejected] == [
+        "resources", "resources", "relationships", "clusters", "clusters"
+    ]
+
+
+ARCH = {
+    "diagram_label": "Shop",
+    "resources": [{"name": "Web App", "type": "Azure.WebApp"}, {"name": "DB", "type": "Azure.SQLDatabase"}],
+    "relationships": [{"source": "Web App", "target": "DB", "type": "connects_to"}],
+    "clusters": [{"name": "rg/prod", "resources": ["Web App", "DB"]}]
+}
+
+
+def test_patch_operations():
+    patched = apply_json_patch(ARCH, [
+        {"op": "add", "path": "/resources/-", "value": {"name": "Cache", "type": "Azure.RedisCache"}},
+        {"op": "add", "path": "/relationships/0", "value": {"source": "Web App", "target": "Cache", "type": "reads"}},
+        {"op": "replace", "path": "/diagram_label", "value": "Shop v2"},
+        {"op": "remove", "path": "/resources/1"},
+        {"op": "copy", "from": "/resources/0/type", "path": "/resources/1/copied_type"},
+        {"op": "move", "from": "/resources/1/copied_type", "path": "/resources/1/origin"},
+        {"op": "test", "path": "/clusters/0/name", "value": "rg/prod"},
+    ])
+    assert patched["diagram_label"] == "Shop v2"
+    assert patched["resources"] == [
+        {"name": "Web App", "type": "Azure.WebApp"},
+        {"name": "Cache", "type": "Azure.RedisCache", "origin": "Azure.WebApp"}
+    ]
+    assert [r["target"] for r in patched["relationships"]] == ["Cache", "DB"]
+
+
+def test_patch_leaves_the_original_untouched():
+    original = json.dumps(ARCH, sort_keys=True)
+    value = {"name": "Vault", "type": "Azure.KeyVault"}
+    patched = apply_json_patch(ARCH, [{"op": "add", "path": "/resources/-", "value": value}])
+    value["name"] = "changed"
+    assert json.dumps(ARCH, sort_keys=True) == original
+    assert patched["resources"][-1]["name"] == "Vault"
+
+
+def test_patch_pointer_escapes():
+    document = {"a/b": {"~c": 1}}
+    assert apply_json_patch(document, [{"op": "replace", "path": "/a~1b/~0c", "value": 2}]) == {"a/b": {"~c": 2}}
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "remove", "path": "/resources/5"},
+    {"op": "remove", "path": "/missing"},
+    {"op": "replace", "path": "", "value": {}},
+    {"op": "test", "path": "/diagram_label", "value": "Other"},
+    {"op": "rename", "path": "/diagram_label"},
+    {"op": "add", "path": "/resources/x", "value": {}},
+])
+def test_invalid_patch_operations_fail(operation):
+    with pytest.raises(Exception):
+        apply_json_patch(ARCH, [operation])
+
+
+def test_streamed_extraction_collects_usage(stub, monkeypatch):
+    deployment = stub("stream")
+    monkeypatch.setattr(architecture_extractor, "router", DeploymentRouter([deployment]))
+    usage = {}
+    result = architecture_extractor._stream_chat_completion([{"role": "user", "content": "web app"}], 100, None, usage)
+    assert result == STUB_ARCHITECTURE
+    assert usage["prompt_tokens"] == 200
+    assert usage["deployment"] == deployment.name
@@ -0,0 +1,141 @@
+import pytest
+
+import architecture_schema
+from architecture_schema import ArchitectureValidationError, normalize_architecture
+
+
+def _resource(name, resource_type="Azure.WebApp", **attributes):
+    return {"name": name, "type": resource_type, "attributes": attributes}
+
+
+def test_repeats_of_a_resource_are_merged():
+    arch, report = normalize_architecture({"resources": [
+        _resource("Web App", sku="S1"), _resource(" web  app ", location="East US", sku="P1")
+    ]})
+    assert arch["resources"] == [_resource("Web App", sku="S1", location="East US")]
+    assert report["merged_resources"] == ["web  app"]
+
+
+def test_distinct_resources_with_the_same_name_are_renamed():
+    arch, report = normalize_architecture({
+        "resources": [_resource("Data"), _resource("Data", "Azure.SQLDatabase"), _resource("Data", "Azure.CosmosDB")],
+        "relationships": [{"source": "data", "target": "Data (2)"}]
+    })
+    assert [r["name"] for r in arch["resources"]] == ["Data", "Data (2)", "Data (3)"]
+    assert report["renamed_resources"] == [["Data", "Data (2)"], ["Data", "Data (3)"]]
+    assert arch["relationships"] == [{"source": "Data", "target": "Data (2)", "type": "connects_to"}]
+
+
+def test_relationships_resolve_names_and_drop_unknown_and_repeated_edges():
+    arch, report = normalize_architecture({
+        "resources": [_resource("Web App"), _resource("DB", "Azure.SQLDatabase")],
+        "relationships": [
+            {"source": "WEB APP", "target": "db"},
+            {"source": "Web App", "target": "DB"},
+            {"source": "Web App", "target": "Cache"}
+        ]
+    })
+    assert arch["relationships"] == [{"source": "Web App", "target": "DB", "type": "connects_to"}]
+    assert report["dropped_relationships"] == [["Web App", "Cache"]]
+
+
+def test_defaults_fill_missing_fields():
+    arch, _ = normalize_architecture({"resources": [{"name": "Thing"}], "clusters": None})
+    assert arch == {"diagram_label": "Azure Architecture", "resources": [_resource("Thing")],
+                    "relationships": [], "clusters": []}
+
+
+@pytest.mark.parametrize("arch_json, message", [
+    ([], "must be an object"),
+    ({"resources": {"name": "x"}}, "'resources' must be a list"),
+    ({"resources": [{"type": "Azure.WebApp"}]}, "Invalid architecture JSON"),
+    ({"resources": [{"name": "   "}]}, "Invalid architecture JSON"),
+    ({"resources": [{"name": "x" * 201}]}, "Invalid architecture JSON"),
+])
+def test_invalid_architectures_are_refused(arch_json, message):
+    with pytest.raises(ArchitectureValidationError, match=message):
+        normalize_architecture(arch_json)
+
+
+def test_oversized_architectures_are_refused_before_validation(monkeypatch):
+    monkeypatch.setattr(architecture_schema, "ARCH_MAX_RESOURCES", 3)
+    with pytest.raises(ArchitectureValidationError, match="Too many resources: 4"):
+        # Entries that would fail validation show the size check runs first
+        normalize_architecture({"resources": [None] * 4})
+
+
+RESOURCES = [_resource("Web App"), _resource("DB", "Azure.SQLDatabase"), _resource("Vault", "Azure.KeyVault")]
+
+
+def _clusters(clusters):
+    arch, report = normalize_architecture({"resources": RESOURCES, "clusters": clusters})
+    return arch["clusters"], report
+
+
+def test_nested_arrays_and_parent_names_flatten_alike():
+    nested, _ = _clusters([{"name": "sub", "clusters": [{"name": "rg", "resources": ["Web App"]}]}])
+    by_parent, _ = _clusters([{"name": "sub"}, {"name": "rg", "parent": "SUB", "resources": ["web app"]}])
+    expected = [{"name": "sub", "resources": []}, {"name": "rg", "resources": ["Web App"], "parent": "sub"}]
+    assert nested == expected
+    assert by_parent == expected
+
+
+def test_a_resource_in_several_clusters_goes_to_the_deepest():
+    clusters, report = _clusters([
+        {"name": "rg", "resources": ["Web App", "DB"]},
+        {"name": "vnet", "parent": "rg", "resources": ["DB"]},
+        {"name": "other", "resources": ["Web App", "Ghost"]}
+    ])
+    assert {c["name"]: c["resources"] for c in clusters} == {"rg": ["Web App"], "vnet": ["DB"], "other": []}
+    assert sorted(report["multi_cluster_members"]) == ["DB", "Web App"]
+    assert report["dropped_cluster_members"] == [["other", "Ghost"]]
+
+
+def test_clusters_with_the_same_name_are_merged():
+    clusters, _ = _clusters([{"name": "rg", "resources": ["Web App"]}, {"name": " RG ", "resources": ["DB"]}])
+    assert clusters == [{"name": "rg", "resources": ["Web App", "DB"]}]
+
+
+def test_unknown_and_self_parents_are_detached():
+    clusters, report = _clusters([{"name": "a", "parent": "missing"}, {"name": "b", "parent": "b"}])
+    assert clusters == [{"name": "a", "resources": []}, {"name": "b", "resources": []}]
+    assert report["detached_clusters"] == [["a", "missing"], ["b", "b"]]
+
+
+def test_parent_cycles_are_cut():
+    clusters, report = _clusters([
+        {"name": "a", "parent": "c", "resources": ["Web App"]},
+        {"name": "b", "parent": "a"},
+        {"name": "c", "parent": "b"}
+    ])
+    parents = {c["name"]: c.get("parent") for c in clusters}
+    assert list(parents.values()).count(None) == 1
+    assert len(report["detached_clusters"]) == 1
+    # What is left is a chain, so every cluster reaches the top
+    for name in parents:
+        seen = set()
+        while name is not None:
+            assert name not in seen
+            seen.add(name)
+            name = parents[name]
+
+
+def test_nesting_depth_is_limited(monkeypatch):
+    monkeypatch.setattr(architecture_schema, "ARCH_MAX_CLUSTER_DEPTH", 4)
+    chain = [{"name": f"level {i}", "parent": f"level {i - 1}" if i else None} for i in range(4)]
+    assert len(_clusters(chain)[0]) == 4
+    with pytest.raises(ArchitectureValidationError, match="nested deeper than 4 levels at 'level 4'"):
+        _clusters(chain + [{"name": "level 4", "parent": "level 3"}])
+
+
+def test_deep_chains_resolve_in_one_pass():
+    chain = [{"name": f"c{i}", "parent": f"c{i - 1}" if i else None} for i in range(15)]
+    clusters, _ = _clusters(list(reversed(chain)))
+    assert len(clusters) == 15
+
+
+def test_nested_clusters_count_towards_the_cluster_limit(monkeypatch):
+    monkeypatch.setattr(architecture_schema, "ARCH_MAX_CLUSTERS", 3)
+    nested = {"name": "a", "clusters": [{"name": "b", "clusters": [{"name": "c", "clusters": [{"name": "d"}]}]}]}
+    with pytest.raises(ArchitectureValidationError, match="Too many clusters: 4"):
+        _clusters([nested])
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from graphviz_pool import GraphvizPool, GraphvizTimeoutError
+
+
+class FakeWorker:
+    """Stands in for a warm libgvc worker process."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.renders = 0
+        self.last_used = time.monotonic()
+        self.calls = []
+        self.killed = False
+
+    def alive(self) -> bool:
+        return True
+
+    def call(self, message, timeout):
+        self.calls.append(timeout)
+        return "ok", {"png": b"png"}
+
+    def exit_code(self):
+        return None
+
+    def kill(self):
+        self.killed = True
+
+
+@pytest.fixture
+def pool():
+    pool = GraphvizPool(size=1)
+    pool.enabled = True
+    worker = FakeWorker()
+    pool._idle.append(worker)
+    pool._count = 1
+    return pool, worker
+
+
+def test_render_uses_an_idle_worker(pool):
+    pool, worker = pool
+    assert pool.render("digraph { a }", "dot", ["png"], 5) == {"png": b"png"}
+    assert worker.calls and 0 < worker.calls[0] <= 5
+    assert pool._idle == [worker]
+
+
+@pytest.mark.parametrize("timeout", [0, -1.5])
+def test_no_budget_left_leaves_the_worker_alone(pool, timeout):
+    pool, worker = pool
+    with pytest.raises(GraphvizTimeoutError):
+        pool.render("digraph { a }", "dot", ["png"], timeout)
+    assert worker.calls == []
+    assert not worker.killed
+    assert pool._idle == [worker]
+
+
+def test_budget_spent_waiting_for_a_worker_leaves_it_alone(pool, monkeypatch):
+    pool, worker = pool
+    checkout = pool._checkout
+
+    def slow_checkout(timeout):
+        checked_out = checkout(timeout)
+        time.sleep(0.05)
+        return checked_out
+
+    monkeypatch.setattr(pool, "_checkout", slow_checkout)
+    with pytest.raises(GraphvizTimeoutError):
+        pool.render("digraph { a }", "dot", ["png"], 0.01)
+    assert worker.calls == []
+    assert not worker.killed
+    assert pool._idle == [worker]
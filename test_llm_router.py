@@ -0,0 +1,40 @@
+from collections import Counter
+
+import llm_router
+from llm_router import Deployment, DeploymentRouter
+
+BODY = {"messages": [{"role": "user", "content": "web app"}], "max_tokens": 10}
+
+
+def test_hedge_winner_is_reported(stub, monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DEFAULT_DELAY", 0.2)
+    slow, fast = stub("slow", latency=2.0), stub("fast", latency=0.05)
+    router = DeploymentRouter([slow, fast], hedging=True)
+    stats = {}
+    response = router.post(BODY, stats=stats)
+    assert response.status_code == 200
+    assert stats["deployment"] == fast.name
+
+
+def test_throttled_deployment_fails_over(stub):
+    throttled, healthy = stub("throttled", throttle=1.0), stub("healthy")
+    router = DeploymentRouter([throttled, healthy])
+    stats = {}
+    assert router.post(BODY, stats=stats).status_code == 200
+    assert stats["deployment"] == healthy.name
+    assert throttled.blocked_until > 0
+
+
+def test_burst_spreads_over_untried_deployments():
+    deployments = [Deployment(f"http://127.0.0.1:{port}", "d", "key", "v") for port in (1, 2, 3)]
+    router = DeploymentRouter(deployments)
+    picked = Counter(router._pick().name for _ in range(6))
+    assert sorted(picked.values()) == [2, 2, 2]
+
+
+def test_measured_latency_wins_once_known():
+    fast, slow = (Deployment(f"http://127.0.0.1:{port}", "d", "key", "v") for port in (1, 2))
+    fast.record_latency(0.1, False)
+    slow.record_latency(2.0, False)
+    router = DeploymentRouter([slow, fast])
+    assert router._pick() is fast
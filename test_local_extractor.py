@@ -0,0 +1,85 @@
+import pytest
+
+import architecture_extractor
+from local_extractor import LOCAL_EXTRACTOR_CONFIDENCE, extract_architecture_locally
+
+
+def _types(arch_json: dict) -> list:
+    return [resource["type"] for resource in arch_json["resources"]]
+
+
+@pytest.mark.parametrize("description", [
+    "web app with sql database",
+    "A web app that stores files in blob storage and reads secrets from key vault",
+    "web app with a key vault in resource group rg-prod",
+])
+def test_fully_understood_descriptions_are_accepted(description):
+    _, confidence = extract_architecture_locally(description)
+    assert confidence >= LOCAL_EXTRACTOR_CONFIDENCE
+
+
+@pytest.mark.parametrize("description", [
+    "web app on AKS with a sql database",
+    "web app with sql database and redis",
+    "frontend and cosmos db",
+])
+def test_an_unknown_service_defers_to_the_llm(description):
+    arch_json, confidence = extract_architecture_locally(description)
+    assert arch_json["resources"]
+    assert confidence < LOCAL_EXTRACTOR_CONFIDENCE
+
+
+@pytest.mark.parametrize("description", [
+    "web app without a database",
+    "a web app but no storage",
+    "web app that doesn't use service bus",
+])
+def test_negations_defer_to_the_llm(description):
+    _, confidence = extract_architecture_locally(description)
+    assert confidence == 0.0
+
+
+def test_descriptive_words_only_lower_the_confidence():
+    arch_json, confidence = extract_architecture_locally("a highly available web app with a sql database and blob storage")
+    assert _types(arch_json) == ["Azure.WebApp", "Azure.SQLDatabase", "Azure.BlobStorage"]
+    assert 0.0 < confidence < 1.0
+
+
+def test_relationships_and_resource_group():
+    arch_json, _ = extract_architecture_locally("web app with sql database in resource group named rg-shop")
+    assert {"source": "Web App", "target": "SQL Database", "type": "connects_to"} in arch_json["relationships"]
+    assert arch_json["clusters"] == [{"name": "rg-shop", "resources": ["Web App", "SQL Database"]}]
+
+
+def test_nothing_recognized_scores_zero():
+    arch_json, confidence = extract_architecture_locally("something entirely different")
+    assert arch_json["resources"] == []
+    assert confidence == 0.0
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Pretend a deployment is configured and record the descriptions sent to it."""
+    sent = []
+
+    def fake_completion(messages, max_tokens, response_format, usage):
+        sent.append(messages[-1]["content"])
+        return {"diagram_label": "LLM", "resources": [], "relationships": [], "clusters": []}
+
+    monkeypatch.setattr(architecture_extractor.router, "deployments", [object()])
+    monkeypatch.setattr(architecture_extractor, "AZURE_OPENAI_STREAM", True)
+    monkeypatch.setattr(architecture_extractor, "_stream_chat_completion", fake_completion)
+    return sent
+
+
+def test_extraction_with_an_unknown_service_calls_the_llm(llm):
+    _, report = architecture_extractor.extract_architecture("web app on AKS with a sql database")
+    assert report["source"] == "azure_openai"
+    assert llm == ["web app on AKS with a sql database"]
+
+
+def test_extraction_of_known_services_stays_local(llm):
+    arch_json, report = architecture_extractor.extract_architecture("web app with sql database")
+    assert report["source"] == "local"
+    assert _types(arch_json) == ["Azure.WebApp", "Azure.SQLDatabase"]
+    assert llm == []
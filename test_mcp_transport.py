@@ -0,0 +1,88 @@
+import socket
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.server.fastmcp import FastMCP
+
+from mcp_transport import SessionLimits
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(max_sessions: int, idle_timeout: float):
+    mcp = FastMCP("test")
+
+    @mcp.tool()
+    def ping() -> str:
+        return "pong"
+
+    app = SessionLimits(mcp.sse_app(), max_sessions=max_sessions, idle_timeout=idle_timeout)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "test server did not start"
+        time.sleep(0.05)
+    return app, server, f"http://127.0.0.1:{port}/sse"
+
+
+@pytest.fixture
+def limited_server():
+    servers = []
+
+    def start(max_sessions: int, idle_timeout: float = 0):
+        app, server, url = _serve(max_sessions, idle_timeout)
+        servers.append(server)
+        return app, url
+
+    yield start
+    for server in servers:
+        server.should_exit = True
+
+
+async def _call_ping(url: str) -> str:
+    async with sse_client(url) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            result = await session.call_tool("ping", {})
+            return result.content[0].text
+
+
+def _wait_for_sessions(app: SessionLimits, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while app.status()["sessions"] != count:
+        assert time.monotonic() < deadline, f"sessions stayed at {app.status()['sessions']}, expected {count}"
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize("idle_timeout", [0, 600])
+def test_disconnected_sessions_free_their_slot(limited_server, idle_timeout):
+    limit = 2
+    app, url = limited_server(limit, idle_timeout)
+    for _ in range(limit + 1):
+        assert asyncio.run(_call_ping(url)) == "pong"
+        _wait_for_sessions(app, 0)
+    assert app.status()["rejected"] == 0
+
+
+def test_sessions_over_the_limit_are_refused(limited_server):
+    app, url = limited_server(1)
+    with httpx.stream("GET", url, timeout=5) as first:
+        assert first.status_code == 200
+        _wait_for_sessions(app, 1)
+        second = httpx.get(url, timeout=5)
+        assert second.status_code == 503
+        assert second.headers["retry-after"] == "5"
+    _wait_for_sessions(app, 0)
+    assert app.status()["rejected"] == 1
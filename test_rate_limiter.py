@@ -0,0 +1,81 @@
+import threading
+import time
+
+from rate_limiter import RateLimiter, estimate_tokens
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter(0, 0, shares=1)
+    assert not limiter.enabled
+    assert limiter.acquire(10 ** 6) == 0.0
+    assert limiter.try_acquire(10 ** 6)
+
+
+def test_request_bucket_empties_and_refills():
+    limiter = RateLimiter(rpm=600, tpm=0, shares=1)
+    assert all(limiter.try_acquire(1) for _ in range(600))
+    assert not limiter.try_acquire(1)
+    # 600 rpm refills one request every 0.1s
+    waited = limiter.acquire(1)
+    assert 0.03 < waited < 0.5
+
+
+def test_token_bucket_waits_for_the_shortfall():
+    limiter = RateLimiter(rpm=0, tpm=6000, shares=1)
+    assert limiter.acquire(6000) < 0.05
+    # 6000 tpm refills 100 tokens a second
+    waited = limiter.acquire(50)
+    assert 0.35 < waited < 1.0
+    assert limiter.status()["delayed"] == 1
+
+
+def test_oversized_request_is_clamped_to_the_bucket():
+    limiter = RateLimiter(rpm=0, tpm=600, shares=1)
+    assert limiter.acquire(10 ** 6) < 0.05
+    assert limiter.status()["available_tokens"] == 0
+
+
+def test_waiting_requests_are_served_in_arrival_order():
+    limiter = RateLimiter(rpm=0, tpm=6000, shares=1)
+    limiter.acquire(6000)
+    order = []
+
+    def request(name, tokens):
+        limiter.acquire(tokens)
+        order.append(name)
+
+    large = threading.Thread(target=request, args=("large", 60))
+    large.start()
+    while limiter.status()["queued"] < 1:
+        time.sleep(0.005)
+    # The small request would fit sooner, but it queued behind the large one
+    small = threading.Thread(target=request, args=("small", 1))
+    small.start()
+    assert not limiter.try_acquire(1)
+    large.join(5)
+    small.join(5)
+    assert order == ["large", "small"]
+
+
+def test_estimate_wait_counts_the_queue():
+    limiter = RateLimiter(rpm=0, tpm=6000, shares=1)
+    assert limiter.estimate_wait(100) == 0.0
+    limiter.acquire(6000)
+    assert 0.9 < limiter.estimate_wait(100) <= 1.0
+
+
+def test_shares_split_the_quota():
+    limiter = RateLimiter(rpm=100, tpm=1000, shares=4)
+    assert (limiter.rpm, limiter.tpm) == (25, 250)
+    limiter.share(2)
+    status = limiter.status()
+    assert (status["rpm"], status["tpm"], status["shares"]) == (50, 500, 2)
+    # A larger share does not hand out more than the old bucket held
+    assert status["available_requests"] <= 25.1
+    limiter.share(1000)
+    assert (limiter.rpm, limiter.tpm) == (1, 1)
+
+
+def test_estimate_tokens_counts_prompt_and_completion():
+    body = {"messages": [{"role": "user", "content": "x" * 398}], "max_tokens": 100}
+    assert estimate_tokens(body) == 200
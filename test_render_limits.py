@@ -0,0 +1,57 @@
+import signal
+import subprocess
+import sys
+
+import pytest
+
+import render_limits
+from mcp_remote import _parse_tool_error, tool_error_text
+from render_limits import RenderLimitError, describe_exit, is_limit_exit
+
+
+@pytest.mark.parametrize("returncode, stderr", [
+    (-signal.SIGXCPU, ""),
+    (-signal.SIGKILL, ""),
+    (1, "Error: out of memory"),
+    (-signal.SIGABRT, "terminate called after throwing an instance of 'std::bad_alloc'"),
+])
+def test_limit_breaches(returncode, stderr):
+    assert is_limit_exit(returncode, stderr)
+    assert describe_exit(returncode, stderr).startswith("Render limit exceeded")
+
+
+@pytest.mark.parametrize("returncode, message", [
+    (-signal.SIGSEGV, "The render process crashed with SIGSEGV"),
+    (-signal.SIGABRT, "The render process crashed with SIGABRT"),
+    (1, "The render process exited with code 1"),
+])
+def test_other_crashes_are_not_limit_breaches(returncode, message):
+    assert not is_limit_exit(returncode, "syntax error in line 1")
+    assert describe_exit(returncode) == message
+
+
+@pytest.mark.skipif(not render_limits.PRLIMIT_AVAILABLE, reason="needs prlimit")
+def test_child_limits_are_set_from_outside(monkeypatch):
+    monkeypatch.setattr(render_limits, "RENDER_MAX_CPU_SECONDS", 7)
+    monkeypatch.setattr(render_limits, "RENDER_MAX_MEMORY_MB", 512)
+    child = subprocess.Popen([sys.executable, "-c", "import sys; sys.stdin.read()"], stdin=subprocess.PIPE)
+    try:
+        render_limits.limit_child_process(child.pid)
+        assert render_limits.resource.prlimit(child.pid, render_limits.resource.RLIMIT_CPU)[0] == 7
+        assert render_limits.resource.prlimit(child.pid, render_limits.resource.RLIMIT_AS)[0] == 512 * 1024 * 1024
+    finally:
+        child.communicate(b"")
+
+
+def test_error_code_survives_the_tool_result():
+    error = RenderLimitError("Render limit exceeded: more than 30 CPU seconds")
+    text = "Error executing tool generate_azure_diagram_from_text: " + tool_error_text(str(error), error.code)
+    parsed = _parse_tool_error(text)
+    assert parsed.code == "render_limit"
+    assert str(parsed) == "MCP tool error: Render limit exceeded: more than 30 CPU seconds"
+
+
+def test_tool_errors_without_a_code():
+    parsed = _parse_tool_error("Error executing tool x: Graphviz dot failed: {bad graph}")
+    assert parsed.code is None
+    assert str(parsed) == "MCP tool error: Error executing tool x: Graphviz dot failed: {bad graph}"
@@ -33,13 +33,13 @@ async def test_simple_web_app():
             layout_direction="TB"
         )
         
-        if result and result.data:
+        if result and result[0].data:
             # Save the diagram to a file
             diagram_path = Path("./diagrams/simple_web_app_test.png")
             diagram_path.parent.mkdir(exist_ok=True)
             
             with open(diagram_path, "wb") as f:
-                f.write(base64.b64decode(result.data))
+                f.write(result[0].data)
             
             print(f"✅ Simple Web App diagram generated successfully: {diagram_path}")
             return True
@@ -70,13 +70,13 @@ async def test_microservices_architecture():
             layout_direction="LR"
         )
         
-        if result and result.data:
+        if result and result[0].data:
             # Save the diagram to a file
             diagram_path = Path("./diagrams/microservices_test.png")
             diagram_path.parent.mkdir(exist_ok=True)
             
             with open(diagram_path, "wb") as f:
-                f.write(base64.b64decode(result.data))
+                f.write(result[0].data)
             
             print(f"✅ Microservices diagram generated successfully: {diagram_path}")
             return True
@@ -108,13 +108,13 @@ async def test_multi_tier_application():
             layout_direction="TB"
         )
         
-        if result and result.data:
+        if result and result[0].data:
             # Save the diagram to a file
             diagram_path = Path("./diagrams/multi_tier_test.svg")
             diagram_path.parent.mkdir(exist_ok=True)
             
             with open(diagram_path, "wb") as f:
-                f.write(base64.b64decode(result.data))
+                f.write(result[0].data)
             
             print(f"✅ Multi-tier diagram generated successfully: {diagram_path}")
             return True